@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Union, Dict, Any
+from typing import List, Union, Dict, Any, Optional
 
 class DocumentChunk(BaseModel):
     content: Union[str, bytes]
@@ -20,4 +20,32 @@ class UploadRequest(BaseModel):
 class ChatRequest(BaseModel):
     question: str
     session_id: str
-    history: List[Dict[str, str]] = [] 
\ No newline at end of file
+    history: List[Dict[str, str]] = []
+
+class DocumentInfo(BaseModel):
+    doc_id: str
+    filename: str
+    status: str  # "processing" -> "active" | "failed"; "removing" while being deleted
+    content_hash: Optional[str] = None
+    chunk_count: int = 0
+    pages_total: int = 0
+    pages_parsed: int = 0
+    chunks_embedded: int = 0
+    chunks_indexed: int = 0
+    error: Optional[str] = None
+
+class SessionInfo(BaseModel):
+    session_id: str
+    filename: str
+    created_at: float
+    chunk_count: int
+    status: str  # "processing" -> "active" | "failed"
+    pages_total: int = 0
+    pages_parsed: int = 0
+    chunks_embedded: int = 0
+    chunks_indexed: int = 0
+    error: Optional[str] = None
+    content_hash: Optional[str] = None  # sha256 of the uploaded file, computed while spooling
+    last_access: Optional[float] = None  # Last chat against the session
+    collection_name: Optional[str] = None  # Index holding the session's chunks; shared by identical uploads
+    documents: Dict[str, DocumentInfo] = {}  # Per-document progress; the fields above are their totals
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+class AnswerCache:
+    """LRU cache of completed LLM answers, bounded by entry count and total size"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """Key on everything that determines the completion: model, sampling settings and messages"""
+        material = json.dumps({
+            "model": payload.get("model"),
+            "messages": payload.get("messages"),
+            "temperature": payload.get("temperature"),
+            "top_p": payload.get("top_p"),
+            "max_tokens": payload.get("max_tokens"),
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_cacheable(payload: Dict[str, Any]) -> bool:
+        """Only near-deterministic sampling settings produce answers worth replaying"""
+        return payload.get("temperature", 1.0) <= Config.ANSWER_CACHE_MAX_TEMPERATURE
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the cached answer tokens, in streaming order"""
+        with self._lock:
+            tokens = self._entries.get(key)
+            if tokens is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tokens
+
+    def put(self, key: str, tokens: List[str]) -> None:
+        size = sum(len(token.encode("utf-8")) for token in tokens)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= sum(len(token.encode("utf-8")) for token in previous)
+            self._entries[key] = list(tokens)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(len(token.encode("utf-8")) for token in evicted)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Return the process-wide answer cache, or None when disabled"""
+    global _answer_cache
+    if not Config.ANSWER_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache(
+                    max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+                    max_bytes=Config.ANSWER_CACHE_MAX_MB * 1024 * 1024
+                )
+    return _answer_cache
@@ -1,66 +1,169 @@
 import chromadb
-from chromadb.utils import embedding_functions
-import requests
-import json
-from typing import List
+from collections import OrderedDict
+import fcntl
+import logging
+import os
+import threading
+from typing import Any, List, Optional
 
+from app.services.embedding_cache import CachedEmbeddingFunction, get_embedding_cache
+from app.services.embedding_provider import (
+    GoogleEmbeddingFunction, create_embedding_function, embedding_tag, same_embedding_space
+)
+from app.services.quantized_store import QuantizedVectorStore, get_quantized_vector_store
 from config import Config
 
-class GoogleEmbeddingFunction:
-    """Custom embedding function for Google Embedding models via direct API"""
-    
-    def __init__(self, api_key: str, model_name: str):
-        self.api_key = api_key
-        # Clean model name - remove 'models/' prefix if present
-        self.model_name = model_name.replace('models/', '') if model_name.startswith('models/') else model_name
-        self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_name}:embedContent"
-        
-    def __call__(self, input: List[str]) -> List[List[float]]:
-        """Generate embeddings using Google AI API"""
-        try:
-            embeddings = []
-            for text in input:
-                response = requests.post(
-                    self.api_url,
-                    headers={
-                        "Content-Type": "application/json",
-                    },
-                    params={"key": self.api_key},
-                    data=json.dumps({
-                        "content": {
-                            "parts": [{"text": text}]
-                        },
-                        "taskType": "RETRIEVAL_DOCUMENT"
-                    })
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    embeddings.append(result['embedding']['values'])
-                else:
-                    raise Exception(f"API request failed: {response.status_code} - {response.text}")
-                    
-            return embeddings
-        except Exception as e:
-            raise Exception(f"Error generating embeddings with Google AI: {str(e)}")
+logger = logging.getLogger(__name__)
+
+# Collection metadata key holding the embedding tag of the vectors inside
+EMBEDDING_TAG_KEY = "embedding"
+
+class EmbeddingMismatchError(Exception):
+    """A collection was built by a different embedding provider than the one configured"""
+
+    def __init__(self, collection_name: str, stored: Optional[str], configured: str):
+        super().__init__(
+            f"Collection {collection_name[:8]}... holds {stored or 'untagged legacy'} embeddings, "
+            f"but {configured} is configured"
+        )
+        self.stored = stored
+        self.configured = configured
 
 class ChromaDB:
     def __init__(self):
         self.client = chromadb.PersistentClient(path=Config.CHROMA_PATH)
-        self.embedding_fn = GoogleEmbeddingFunction(
-            api_key=Config.GOOGLE_API_KEY,
-            model_name=Config.EMBEDDING_MODEL
-        )
+        self.provider = create_embedding_function(Config.EMBEDDING_MODEL)
+        self.embedding_fn = self.provider
+        self._embedding_tag: Optional[str] = None
+        embedding_cache = get_embedding_cache()
+        if embedding_cache is not None:
+            self.embedding_fn = CachedEmbeddingFunction(self.embedding_fn, embedding_cache)
+
+        # LRU of collection handles so hot sessions skip get_or_create_collection
+        self.collection_cache_size = max(1, Config.CHROMA_COLLECTION_CACHE_SIZE)
+        self._collections: "OrderedDict[str, Any]" = OrderedDict()
+        self._collections_lock = threading.Lock()
+
+        # Quantized collections stay readable after switching VECTOR_STORE back to chroma
+        self.quantized: Optional[QuantizedVectorStore] = None
+        if Config.VECTOR_STORE == "quantized" or os.path.isdir(Config.VECTOR_STORE_PATH):
+            self.quantized = get_quantized_vector_store()
+
+    @property
+    def embedding_tag(self) -> str:
+        if self._embedding_tag is None:
+            tag = embedding_tag(self.provider)
+            if self.provider.dimension is None:
+                return tag  # Settled once the first embedding response reveals the dimension
+            self._embedding_tag = tag
+        return self._embedding_tag
+
+    def _check_embedding_tag(self, collection) -> None:
+        """Refuse collections whose vectors another provider produced; stamp untagged legacy ones"""
+        metadata = collection.metadata or {}
+        stored = metadata.get(EMBEDDING_TAG_KEY)
+        if stored is not None and same_embedding_space(stored, self.embedding_tag):
+            return
+        # Collections created before tagging were all embedded by the Google provider
+        if stored is None and isinstance(self.provider, GoogleEmbeddingFunction):
+            collection.modify(metadata={**metadata, EMBEDDING_TAG_KEY: self.embedding_tag})
+            return
+        raise EmbeddingMismatchError(collection.name, stored, self.embedding_tag)
 
     def get_collection(self, collection_name: str):
-        return self.client.get_or_create_collection(
-            name=collection_name, 
-            embedding_function=self.embedding_fn
-        )
-    
+        """Return a collection, creating it tagged with the configured provider
+
+        Raises EmbeddingMismatchError for a collection built by another provider.
+        """
+        with self._collections_lock:
+            collection = self._collections.get(collection_name)
+            if collection is not None:
+                self._collections.move_to_end(collection_name)
+                return collection
+
+        if self._uses_quantized(collection_name):
+            collection = self.quantized.open(
+                collection_name, embedding_fn=self.embedding_fn, metadata={EMBEDDING_TAG_KEY: self.embedding_tag}
+            )
+        else:
+            collection = self.client.get_or_create_collection(
+                name=collection_name,
+                embedding_function=self.embedding_fn,
+                metadata={EMBEDDING_TAG_KEY: self.embedding_tag}
+            )
+        self._check_embedding_tag(collection)
+
+        with self._collections_lock:
+            self._collections[collection_name] = collection
+            self._collections.move_to_end(collection_name)
+            while len(self._collections) > self.collection_cache_size:
+                self._collections.popitem(last=False)
+        return collection
+
+    def _uses_quantized(self, collection_name: str) -> bool:
+        """Existing collections stay in their store; new ones go where VECTOR_STORE says"""
+        if self.quantized is None:
+            return False
+        if self.quantized.exists(collection_name):
+            return True
+        if Config.VECTOR_STORE != "quantized":
+            return False
+        try:
+            self.client.get_collection(collection_name)
+            return False
+        except Exception:
+            return True
+
+    def list_collection_names(self) -> List[str]:
+        # Older clients return names, newer ones collection objects
+        names = [getattr(collection, "name", collection) for collection in self.client.list_collections()]
+        if self.quantized is not None:
+            names.extend(self.quantized.names())
+        return names
+
     def delete_collection(self, collection_name: str):
         """Delete a collection by name"""
+        with self._collections_lock:
+            self._collections.pop(collection_name, None)
+        if self.quantized is not None and self.quantized.delete(collection_name):
+            return
         try:
             self.client.delete_collection(collection_name)
         except Exception as e:
-            raise Exception(f"Error deleting collection {collection_name}: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error deleting collection {collection_name}: {str(e)}")
+
+_chroma_path_lock = None  # Held open for the life of the process
+
+def claim_chroma_path() -> None:
+    """Take CHROMA_PATH for this process; raise if another server process already serves it
+
+    Chroma's PersistentClient keeps collection state in memory and is not safe to share
+    between processes, so the API must run as a single worker (uvicorn --workers 1) per
+    CHROMA_PATH. Scale with INGESTION_WORKERS and PDF_PARSE_WORKERS instead.
+    """
+    global _chroma_path_lock
+    if _chroma_path_lock is not None:
+        return
+    os.makedirs(Config.CHROMA_PATH, exist_ok=True)
+    lock_file = open(os.path.join(Config.CHROMA_PATH, "server.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise RuntimeError(
+            f"Another process is already serving {Config.CHROMA_PATH}. ChromaDB's persistent client "
+            "is not safe across processes; run a single worker (uvicorn --workers 1) per CHROMA_PATH"
+        )
+    _chroma_path_lock = lock_file
+
+_chroma_db: Optional[ChromaDB] = None
+_chroma_db_lock = threading.Lock()
+
+def get_chroma() -> ChromaDB:
+    """Return the process-wide ChromaDB instance, creating it on first use"""
+    global _chroma_db
+    if _chroma_db is None:
+        with _chroma_db_lock:
+            if _chroma_db is None:
+                _chroma_db = ChromaDB()
+    return _chroma_db
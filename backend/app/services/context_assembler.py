@@ -0,0 +1,158 @@
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from config import Config
+from processing.chunking import WordTokenizer, get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Shorter suffix/prefix matches between neighbouring chunks are treated as coincidence
+MIN_OVERLAP_CHARS = 20
+
+class ContextPiece(NamedTuple):
+    chunk_id: str
+    text: str
+    source: str  # Citation label shown to the model
+
+class AssembledContext(NamedTuple):
+    text: str
+    sources: List[str]  # Labels of the chunks that made it in, best first
+    tokens: int
+    chunks: int
+    tokens_trimmed: int  # Overlap between neighbouring chunks that was not repeated
+
+def chunk_position(chunk_id: str) -> Optional[Tuple[str, int]]:
+    """(doc_id, n) for chunk ids of the form "<doc_id>_<n>"; None for anything else"""
+    doc_id, _, index = chunk_id.rpartition("_")
+    return (doc_id, int(index)) if doc_id and index.isdigit() else None
+
+def overlap_length(previous: str, following: str) -> int:
+    """Length of the longest suffix of previous that following starts with"""
+    if len(previous) < MIN_OVERLAP_CHARS or len(following) < MIN_OVERLAP_CHARS:
+        return 0
+    probe = following[:MIN_OVERLAP_CHARS]
+    # Leftmost match first: it is the longest overlap
+    position = previous.find(probe, max(0, len(previous) - len(following)))
+    while position != -1:
+        if following.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(probe, position + 1)
+    return 0
+
+class ContextAssembler:
+    """Packs retrieved chunks, best first, into a token budget for the prompt
+
+    Chunks are taken in rank order while they fit; one that does not fit is
+    skipped so a shorter, lower-ranked chunk can still use the space. Neighbouring
+    chunks of a document are joined into one passage and the overlap the chunker
+    gave them is sent once, so it neither costs budget nor repeats in the prompt.
+    """
+
+    def __init__(self, tokenizer, budget: int):
+        self.tokenizer = tokenizer
+        self.budget = budget
+        self._separator_tokens = tokenizer.count("\n\n")
+
+    def count(self, text: str) -> int:
+        return self.tokenizer.count(text)
+
+    def assemble(self, pieces: Sequence[ContextPiece]) -> AssembledContext:
+        selected: List[int] = []  # Indexes into pieces, in rank order
+        by_position: Dict[Tuple[str, int], int] = {}
+        texts: Dict[int, str] = {}  # Selected text, truncated if it alone exceeded the budget
+        used = trimmed = 0
+
+        for i, piece in enumerate(pieces):
+            position = chunk_position(piece.chunk_id)
+            previous = next_ = None
+            if position is not None:
+                previous = by_position.get((position[0], position[1] - 1))
+                next_ = by_position.get((position[0], position[1] + 1))
+            head = overlap_length(texts[previous], piece.text) if previous is not None else 0
+            tail = overlap_length(piece.text, texts[next_]) if next_ is not None else 0
+            new_text = piece.text[head:max(head, len(piece.text) - tail)]
+            cost = self.count(new_text)
+            if previous is None and next_ is None:
+                cost += self.count(f"[{piece.source}]\n") + self._separator_tokens
+
+            text = piece.text
+            if used + cost > self.budget:
+                if selected:
+                    continue
+                # Even the best chunk is over budget: send as much of it as fits
+                text = self._truncate(piece, self.budget)
+                if not text:
+                    break
+                cost = self.budget
+            elif head or tail:
+                trimmed += self.count(piece.text) - self.count(new_text)
+
+            selected.append(i)
+            texts[i] = text
+            if position is not None:
+                by_position[position] = i
+            used += cost
+
+        passages, sources, rendered = [], [], set()
+        for i in selected:
+            if pieces[i].source not in sources:
+                sources.append(pieces[i].source)
+            if i in rendered:
+                continue
+            run = self._run(pieces, by_position, i)
+            rendered.update(run)
+            passage = texts[run[0]]
+            for previous, current in zip(run, run[1:]):
+                head = overlap_length(texts[previous], texts[current])
+                passage += texts[current][head:] if head else "\n" + texts[current]
+            labels = list(dict.fromkeys(pieces[j].source for j in run))
+            passages.append(f"[{'; '.join(labels)}]\n{passage.strip()}")
+
+        text = "\n\n".join(passages)
+        return AssembledContext(text, sources, self.count(text), len(selected), trimmed)
+
+    @staticmethod
+    def _run(pieces: Sequence[ContextPiece], by_position: Dict[Tuple[str, int], int], i: int) -> List[int]:
+        """Selected chunks adjacent to chunk i in its document, in document order"""
+        position = chunk_position(pieces[i].chunk_id)
+        if position is None:
+            return [i]
+        doc_id, start = position
+        while (doc_id, start - 1) in by_position:
+            start -= 1
+        run = []
+        while (doc_id, start) in by_position:
+            run.append(by_position[(doc_id, start)])
+            start += 1
+        return run
+
+    def _truncate(self, piece: ContextPiece, budget: int) -> str:
+        room = budget - self.count(f"[{piece.source}]\n")
+        if room <= 0:
+            return ""
+        _, ends = self.tokenizer.spans(piece.text)
+        return piece.text[:ends[min(room, len(ends)) - 1]] if len(ends) else ""
+
+_context_assembler: Optional[ContextAssembler] = None
+_context_assembler_lock = threading.Lock()
+
+def get_context_assembler() -> ContextAssembler:
+    """Return the assembler configured by CONTEXT_TOKENIZER and CONTEXT_TOKEN_BUDGET"""
+    global _context_assembler
+    if _context_assembler is None:
+        with _context_assembler_lock:
+            if _context_assembler is None:
+                try:
+                    tokenizer = get_tokenizer(Config.CONTEXT_TOKENIZER)
+                except ImportError:
+                    logger.warning(f"Context tokenizer {Config.CONTEXT_TOKENIZER} needs 'tiktoken', "
+                                   "which is not installed; approximating tokens with words")
+                    tokenizer = WordTokenizer()
+                except Exception as e:
+                    # tiktoken fetches encodings on first use, which fails on offline hosts
+                    logger.warning(f"Failed to load context tokenizer {Config.CONTEXT_TOKENIZER}: {e}; "
+                                   "approximating tokens with words")
+                    tokenizer = WordTokenizer()
+                _context_assembler = ContextAssembler(tokenizer, Config.CONTEXT_TOKEN_BUDGET)
+    return _context_assembler
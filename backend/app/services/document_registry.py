@@ -0,0 +1,118 @@
+import threading
+from contextlib import nullcontext
+from typing import List, Optional, Set, Tuple
+
+from app.services.session_store import SessionStore, SessionTransaction, get_session_store
+from config import Config
+
+class DocumentRegistry:
+    """Reference-counted mapping from uploaded file content to the index built for it
+
+    Lives in the session store's database, so references survive restarts and
+    callers can combine registry changes with session writes in one transaction.
+    """
+
+    def __init__(self, store: SessionStore, dedup_enabled: bool, index_version: str = ""):
+        self.store = store
+        self.dedup_enabled = dedup_enabled
+        # Indexes are only shared between uploads embedded the same way
+        self.index_version = index_version
+        with store.transaction() as tx:
+            tx.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "collection_name TEXT PRIMARY KEY, content_hash TEXT, reusable INTEGER NOT NULL)"
+            )
+            tx.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(content_hash)")
+            tx.execute(
+                "CREATE TABLE IF NOT EXISTS document_refs ("
+                "collection_name TEXT NOT NULL, session_id TEXT NOT NULL, "
+                "PRIMARY KEY (collection_name, session_id))"
+            )
+
+    def _transaction(self, tx: Optional[SessionTransaction]):
+        return nullcontext(tx) if tx is not None else self.store.transaction()
+
+    def acquire(self, content_hash: Optional[str], session_id: str,
+                tx: Optional[SessionTransaction] = None) -> Tuple[str, bool]:
+        """Reference the index for this content; returns (collection name, whether it must be ingested)
+
+        When no reusable index exists the session's own id becomes the new collection.
+        """
+        reusable = self.dedup_enabled and bool(content_hash)
+        if content_hash and self.index_version:
+            content_hash = f"{self.index_version}:{content_hash}"
+        with self._transaction(tx) as tx:
+            row = tx.execute(
+                "SELECT collection_name FROM documents WHERE content_hash = ? AND reusable = 1 LIMIT 1",
+                (content_hash,)
+            ).fetchone() if reusable else None
+            if row is not None:
+                tx.execute("INSERT OR IGNORE INTO document_refs VALUES (?, ?)", (row[0], session_id))
+                return row[0], False
+
+            tx.execute("INSERT INTO documents VALUES (?, ?, ?)", (session_id, content_hash, int(reusable)))
+            tx.execute("INSERT INTO document_refs VALUES (?, ?)", (session_id, session_id))
+            return session_id, True
+
+    def release(self, session_id: str, collection_name: str, tx: Optional[SessionTransaction] = None) -> bool:
+        """Drop a session's reference; True when it was the last one and the index can be deleted"""
+        with self._transaction(tx) as tx:
+            tx.execute(
+                "DELETE FROM document_refs WHERE collection_name = ? AND session_id = ?",
+                (collection_name, session_id)
+            )
+            if tx.execute(
+                "SELECT 1 FROM document_refs WHERE collection_name = ? LIMIT 1", (collection_name,)
+            ).fetchone():
+                return False
+            tx.execute("DELETE FROM documents WHERE collection_name = ?", (collection_name,))
+            return True
+
+    def create(self, collection_name: str, session_id: str, tx: Optional[SessionTransaction] = None) -> None:
+        """Register a private index, e.g. a session's copy-on-write fork; never offered for reuse"""
+        with self._transaction(tx) as tx:
+            tx.execute("INSERT OR REPLACE INTO documents VALUES (?, NULL, 0)", (collection_name,))
+            tx.execute("INSERT OR IGNORE INTO document_refs VALUES (?, ?)", (collection_name, session_id))
+
+    def withdraw(self, collection_name: str, tx: Optional[SessionTransaction] = None) -> None:
+        """Stop offering an index for reuse once it failed or no longer matches its upload
+
+        Existing references stay until they are released.
+        """
+        with self._transaction(tx) as tx:
+            tx.execute("UPDATE documents SET reusable = 0 WHERE collection_name = ?", (collection_name,))
+
+    def sessions(self, collection_name: str, tx: Optional[SessionTransaction] = None) -> List[str]:
+        sql, params = "SELECT session_id FROM document_refs WHERE collection_name = ?", (collection_name,)
+        rows = tx.execute(sql, params).fetchall() if tx is not None else self.store.query(sql, params)
+        return [row[0] for row in rows]
+
+    def collections(self) -> Set[str]:
+        return {row[0] for row in self.store.query("SELECT collection_name FROM documents")}
+
+    def prune(self) -> List[str]:
+        """Drop references held by sessions the store no longer has; returns indexes left unreferenced"""
+        with self._transaction(None) as tx:
+            tx.execute("DELETE FROM document_refs WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+            orphans = [row[0] for row in tx.execute(
+                "SELECT collection_name FROM documents "
+                "WHERE collection_name NOT IN (SELECT collection_name FROM document_refs)"
+            )]
+            tx.execute(
+                "DELETE FROM documents WHERE collection_name NOT IN (SELECT collection_name FROM document_refs)"
+            )
+        return orphans
+
+_document_registry: Optional[DocumentRegistry] = None
+_document_registry_lock = threading.Lock()
+
+def get_document_registry() -> DocumentRegistry:
+    """Return the process-wide document registry"""
+    global _document_registry
+    if _document_registry is None:
+        with _document_registry_lock:
+            if _document_registry is None:
+                _document_registry = DocumentRegistry(
+                    get_session_store(), Config.DOCUMENT_DEDUP_ENABLED, index_version=Config.EMBEDDING_MODEL
+                )
+    return _document_registry
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from chromadb import EmbeddingFunction
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_SQLITE_BATCH = 500
+
+class EmbeddingCache:
+    """Persistent, size-bounded LRU cache of embeddings keyed by content hash"""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model_name: str, task_type: str, text: str) -> str:
+        """Content address for one (model, task type, text) triple"""
+        digest = hashlib.sha256()
+        for part in (model_name, task_type, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the keys that are present and refresh their recency"""
+        found: Dict[str, List[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique_keys), _SQLITE_BATCH):
+                batch = unique_keys[i:i + _SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Store vectors and evict least recently used entries beyond max_entries"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+            )
+            self._size += len(items)
+            if self._size > self.max_entries:
+                self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                excess = self._size - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE key IN ("
+                        "SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                        (excess,)
+                    )
+                    self.evictions += excess
+                    self._size -= excess
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """Embedding function that consults the shared cache before calling the wrapped provider"""
+
+    def __init__(self, embedding_fn, cache: EmbeddingCache):
+        self.embedding_fn = embedding_fn
+        self.cache = cache
+
+    @staticmethod
+    def name() -> str:
+        return "cached-embedding-function"
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        if not input:
+            return []
+
+        keys = [
+            EmbeddingCache.make_key(self.embedding_fn.model_name, self.embedding_fn.task_type, text)
+            for text in input
+        ]
+        cached = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, even if it repeats within the input
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, input):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            fresh = self.embedding_fn(list(missing.values()))
+            new_entries = {
+                key: [float(x) for x in vector]
+                for key, vector in zip(missing.keys(), fresh)
+            }
+            self.cache.put_many(new_entries)
+            cached.update(new_entries)
+
+        logger.debug(f"Embedding cache: {len(input) - len(missing)} hits, {len(missing)} misses")
+        return [cached[key] for key in keys]
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache, or None when caching is disabled"""
+    global _embedding_cache
+    if not Config.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    Config.EMBEDDING_CACHE_PATH,
+                    Config.EMBEDDING_CACHE_MAX_ENTRIES
+                )
+    return _embedding_cache
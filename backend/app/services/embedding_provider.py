@@ -0,0 +1,211 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import requests
+from chromadb import EmbeddingFunction
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.services.metrics import EMBEDDED_TEXTS, EMBEDDING_REQUESTS
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# EMBEDDING_MODEL values with this prefix run a sentence-transformers model in-process
+LOCAL_PREFIX = "local:"
+
+class EmbeddingError(Exception):
+    """The embedding provider could not embed a request"""
+
+class GoogleEmbeddingFunction(EmbeddingFunction):
+    """Custom embedding function for Google Embedding models via direct API"""
+
+    def __init__(self, api_key: str, model_name: str, task_type: str = "RETRIEVAL_DOCUMENT"):
+        self.api_key = api_key
+        # Clean model name - remove 'models/' prefix if present
+        self.model_name = model_name.replace('models/', '') if model_name.startswith('models/') else model_name
+        self.task_type = task_type
+        self.api_url = f"{Config.GOOGLE_API_BASE}models/{self.model_name}:batchEmbedContents"
+        self.batch_size = max(1, Config.EMBEDDING_BATCH_SIZE)
+        self.max_concurrency = max(1, Config.EMBEDDING_MAX_CONCURRENCY)
+        self.session = self._create_session()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="embedding"
+        )
+        self._dimension: Optional[int] = None
+
+    @staticmethod
+    def name() -> str:
+        return "google-generative-ai"
+
+    @property
+    def dimension(self) -> Optional[int]:
+        """Vector size from the first response, else EMBEDDING_DIMENSION; None until either is known"""
+        return self._dimension or Config.EMBEDDING_DIMENSION or None
+
+    def _create_session(self) -> requests.Session:
+        """Create a keep-alive session that retries throttled and failed batches"""
+        retry = Retry(
+            total=Config.EMBEDDING_MAX_RETRIES,
+            backoff_factor=Config.EMBEDDING_BACKOFF_FACTOR,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),  # Embedding requests are idempotent
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.max_concurrency,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Content-Type": "application/json"})
+        return session
+
+    def _embed_batch(self, batch_index: int, texts: List[str]) -> List[List[float]]:
+        """Embed one batch of texts with a single batchEmbedContents request"""
+        start_time = time.perf_counter()
+        response = self.session.post(
+            self.api_url,
+            params={"key": self.api_key},
+            data=json.dumps({
+                "requests": [
+                    {
+                        "model": f"models/{self.model_name}",
+                        "content": {"parts": [{"text": text}]},
+                        "taskType": self.task_type
+                    }
+                    for text in texts
+                ]
+            }),
+            timeout=Config.EMBEDDING_TIMEOUT
+        )
+
+        if response.status_code != 200:
+            EMBEDDING_REQUESTS.labels("error").inc()
+            raise Exception(f"API request failed: {response.status_code} - {response.text}")
+        EMBEDDING_REQUESTS.labels("ok").inc()
+        EMBEDDED_TEXTS.inc(len(texts))
+
+        embeddings = [item['values'] for item in response.json()['embeddings']]
+        if len(embeddings) != len(texts):
+            raise Exception(f"API returned {len(embeddings)} embeddings for {len(texts)} texts")
+        if embeddings and self._dimension is None:
+            self._dimension = len(embeddings[0])
+
+        logger.debug(
+            f"Embedding batch {batch_index}: {len(texts)} texts in "
+            f"{time.perf_counter() - start_time:.3f}s"
+        )
+        return embeddings
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        """Generate embeddings using Google AI API"""
+        try:
+            if not input:
+                return []
+
+            start_time = time.perf_counter()
+            batches = [
+                input[i:i + self.batch_size]
+                for i in range(0, len(input), self.batch_size)
+            ]
+
+            if len(batches) == 1:
+                embeddings = self._embed_batch(0, batches[0])
+            else:
+                # Bounded fan-out: at most max_concurrency batches are in flight
+                embeddings = []
+                for batch_embeddings in self.executor.map(self._embed_batch, range(len(batches)), batches):
+                    embeddings.extend(batch_embeddings)
+
+            logger.info(
+                f"Embedded {len(input)} texts in {len(batches)} batch(es) "
+                f"in {time.perf_counter() - start_time:.2f}s"
+            )
+            return embeddings
+        except Exception as e:
+            raise EmbeddingError(f"Error generating embeddings with Google AI: {str(e)}") from e
+
+class LocalEmbeddingFunction(EmbeddingFunction):
+    """Sentence-embedding model run in-process on CPU (optional dependency: sentence-transformers)
+
+    Inputs are encoded in batches of LOCAL_EMBEDDING_BATCH_SIZE; large inputs fan
+    batches out over a small thread pool, since inference releases the GIL.
+    """
+
+    def __init__(self, model_name: str, device: str = "cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                f"EMBEDDING_MODEL={LOCAL_PREFIX}{model_name} needs 'sentence-transformers', which is not installed"
+            ) from e
+        self.model_name = model_name
+        self.task_type = "local"  # Part of the embedding cache key, like Google's task type
+        self.model = SentenceTransformer(model_name, device=device)
+        self.batch_size = max(1, Config.LOCAL_EMBEDDING_BATCH_SIZE)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, Config.LOCAL_EMBEDDING_WORKERS),
+            thread_name_prefix="local-embedding"
+        )
+
+    @staticmethod
+    def name() -> str:
+        return "sentence-transformers"
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(
+            texts, batch_size=len(texts), normalize_embeddings=True,
+            convert_to_numpy=True, show_progress_bar=False
+        )
+        EMBEDDING_REQUESTS.labels("ok").inc()
+        EMBEDDED_TEXTS.inc(len(texts))
+        return vectors.tolist()
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        if not input:
+            return []
+        batches = [input[i:i + self.batch_size] for i in range(0, len(input), self.batch_size)]
+        try:
+            if len(batches) == 1:
+                return self._embed_batch(batches[0])
+            embeddings = []
+            for batch_embeddings in self.executor.map(self._embed_batch, batches):
+                embeddings.extend(batch_embeddings)
+            return embeddings
+        except Exception as e:
+            raise EmbeddingError(f"Error generating embeddings with {self.model_name}: {e}") from e
+
+def create_embedding_function(model: str) -> EmbeddingFunction:
+    """Provider for an EMBEDDING_MODEL setting: local:<sentence-transformers model>, else a Google model"""
+    if model.startswith(LOCAL_PREFIX):
+        return LocalEmbeddingFunction(model[len(LOCAL_PREFIX):], Config.LOCAL_EMBEDDING_DEVICE)
+    return GoogleEmbeddingFunction(api_key=Config.GOOGLE_API_KEY, model_name=model)
+
+def embedding_tag(embedding_fn) -> str:
+    """Identifies the vector space a provider produces; indexes built by different tags never mix
+
+    The dimension is left out while it is unknown, rather than spending a request to learn it.
+    """
+    dimension = embedding_fn.dimension
+    return f"{embedding_fn.name()}/{embedding_fn.model_name}" + (f"/{dimension}" if dimension else "")
+
+def _split_tag(tag: str) -> Tuple[str, Optional[int]]:
+    head, _, last = tag.rpartition("/")
+    return (head, int(last)) if head and last.isdigit() else (tag, None)
+
+def same_embedding_space(stored: str, configured: str) -> bool:
+    """Whether two tags name the same provider and model, and the same dimension where both know it"""
+    (stored_model, stored_dimension), (model, dimension) = _split_tag(stored), _split_tag(configured)
+    return stored_model == model and (stored_dimension is None or dimension is None or stored_dimension == dimension)
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[None]]  # Raises when the dependency is unavailable
+
+class HealthProber:
+    """Checks dependencies on an interval in the background and caches the results
+
+    Readiness requests read the cache, so their cost does not depend on upstream
+    latency and a fleet of probes never multiplies upstream calls.
+    """
+
+    def __init__(self, checks: Dict[str, Check], critical: Iterable[str], interval: float, timeout: float):
+        self.checks = checks
+        self.critical = set(critical)  # Checks that must pass for the instance to be ready
+        self.interval = interval
+        self.timeout = timeout
+        self.results: Dict[str, Dict[str, Any]] = {
+            name: {"status": "unknown", "latency_ms": None, "checked_at": None, "error": None}
+            for name in checks
+        }
+        self.last_probe_at: Optional[float] = None
+
+    async def _probe(self, name: str, check: Check) -> None:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=self.timeout)
+            status, error = "connected", None
+        except asyncio.TimeoutError:
+            status, error = "error", f"Timed out after {self.timeout}s"
+        except Exception as e:
+            status, error = "error", type(e).__name__
+        if status != self.results[name]["status"] and self.results[name]["status"] != "unknown":
+            logger.warning(f"Health of {name} changed to {status}" + (f": {error}" if error else ""))
+        # Replaced whole so readers never see a half-updated entry
+        self.results[name] = {
+            "status": status,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "checked_at": time.time(),
+            "error": error,
+        }
+
+    async def probe(self) -> None:
+        """Run every check concurrently once"""
+        await asyncio.gather(*(self._probe(name, check) for name, check in self.checks.items()))
+        self.last_probe_at = time.time()
+
+    async def run(self) -> None:
+        """Probe every interval until cancelled"""
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Health probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def status(self) -> str:
+        """"starting" before the first probe, then "ready", "degraded" or "unavailable" """
+        if self.last_probe_at is None:
+            return "starting"
+        failing = {name for name, result in self.results.items() if result["status"] != "connected"}
+        if failing & self.critical:
+            return "unavailable"
+        return "degraded" if failing else "ready"
@@ -0,0 +1,311 @@
+import logging
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens of at least two characters"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1]
+
+class BM25Index:
+    """Incrementally updatable BM25 index with array-backed postings"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Per document (internal doc number)
+        self.doc_ids: List[str] = []
+        self.doc_numbers: Dict[str, int] = {}
+        self.doc_lengths = array("I")
+        self.doc_terms: List[array] = []  # Distinct term ids, used to update document frequencies on removal
+        self.live = bytearray()
+        # Per term (term id)
+        self.vocab: Dict[str, int] = {}
+        self.doc_freqs = array("I")
+        self.postings_docs: List[array] = []
+        self.postings_tfs: List[array] = []
+        # Collection statistics over live documents
+        self.live_count = 0
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return self.live_count
+
+    def add(self, ids: List[str], texts: List[str]) -> None:
+        """Index documents; re-adding an existing id replaces it"""
+        self.remove([doc_id for doc_id in ids if doc_id in self.doc_numbers])
+        for doc_id, text in zip(ids, texts):
+            doc_number = len(self.doc_ids)
+            term_counts = Counter(tokenize(text or ""))
+            length = sum(term_counts.values())
+
+            self.doc_ids.append(doc_id)
+            self.doc_numbers[doc_id] = doc_number
+            self.doc_lengths.append(length)
+            self.live.append(1)
+            term_ids = array("I")
+            for term, tf in term_counts.items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = len(self.vocab)
+                    self.vocab[term] = term_id
+                    self.doc_freqs.append(0)
+                    self.postings_docs.append(array("I"))
+                    self.postings_tfs.append(array("I"))
+                self.doc_freqs[term_id] += 1
+                self.postings_docs[term_id].append(doc_number)
+                self.postings_tfs[term_id].append(tf)
+                term_ids.append(term_id)
+            self.doc_terms.append(term_ids)
+
+            self.live_count += 1
+            self.total_length += length
+
+    def remove(self, ids: List[str]) -> None:
+        """Tombstone documents; their postings are skipped at query time"""
+        for doc_id in ids:
+            doc_number = self.doc_numbers.pop(doc_id, None)
+            if doc_number is None or not self.live[doc_number]:
+                continue
+            self.live[doc_number] = 0
+            for term_id in self.doc_terms[doc_number]:
+                self.doc_freqs[term_id] -= 1
+            self.live_count -= 1
+            self.total_length -= self.doc_lengths[doc_number]
+
+    def search(self, query: str, limit: int,
+               accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """Top documents by BM25 score for the query; only documents with a positive score
+
+        accept optionally restricts results to ids it returns True for.
+        """
+        if not self.live_count or limit <= 0:
+            return []
+        term_ids = [self.vocab[term] for term in dict.fromkeys(tokenize(query)) if term in self.vocab]
+        if not term_ids:
+            return []
+
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+        average_length = self.total_length / self.live_count
+        length_norm = self.k1 * (1.0 - self.b + self.b * doc_lengths / max(average_length, 1.0))
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term_id in term_ids:
+            df = self.doc_freqs[term_id]
+            if not df:
+                continue
+            idf = math.log(1.0 + (self.live_count - df + 0.5) / (df + 0.5))
+            docs = np.frombuffer(self.postings_docs[term_id], dtype=np.uint32)
+            tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint32).astype(np.float32)
+            # Each document appears at most once per posting list, so fancy-index accumulation is safe
+            scores[docs] += idf * tfs * (self.k1 + 1.0) / (tfs + length_norm[docs])
+
+        scores[np.frombuffer(self.live, dtype=np.uint8) == 0] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if accept is not None:
+            # Walk candidates best-first and stop once enough are accepted
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+            results = []
+            for i in ranked:
+                if accept(self.doc_ids[i]):
+                    results.append((self.doc_ids[i], float(scores[i])))
+                    if len(results) == limit:
+                        break
+            return results
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.doc_ids[i], float(scores[i])) for i in ranked]
+
+    def save(self, path: str) -> None:
+        """Persist live documents as compact CSR arrays (tombstones are compacted away)"""
+        live_numbers = [n for n in range(len(self.doc_ids)) if self.live[n]]
+        renumber = np.full(len(self.doc_ids), -1, dtype=np.int64)
+        renumber[live_numbers] = np.arange(len(live_numbers))
+
+        terms = sorted(self.vocab, key=self.vocab.get)
+        offsets = [0]
+        postings_docs, postings_tfs = [], []
+        for term in terms:
+            term_id = self.vocab[term]
+            docs = np.frombuffer(self.postings_docs[term_id], dtype=np.uint32)
+            tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint32)
+            mapped = renumber[docs]
+            keep = mapped >= 0
+            postings_docs.append(mapped[keep].astype(np.uint32))
+            postings_tfs.append(tfs[keep])
+            offsets.append(offsets[-1] + int(keep.sum()))
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            doc_ids=np.array([self.doc_ids[n] for n in live_numbers], dtype=str),
+            doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.uint32)[live_numbers],
+            terms=np.array(terms, dtype=str),
+            offsets=np.array(offsets, dtype=np.uint64),
+            postings_docs=np.concatenate(postings_docs) if postings_docs else np.zeros(0, dtype=np.uint32),
+            postings_tfs=np.concatenate(postings_tfs) if postings_tfs else np.zeros(0, dtype=np.uint32),
+            params=np.array([self.k1, self.b], dtype=np.float64),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+            index.doc_ids = data["doc_ids"].tolist()
+            index.doc_numbers = {doc_id: n for n, doc_id in enumerate(index.doc_ids)}
+            index.doc_lengths = array("I", data["doc_lengths"].astype(np.uint32).tobytes())
+            index.live = bytearray(b"\x01" * len(index.doc_ids))
+            index.live_count = len(index.doc_ids)
+            index.total_length = int(data["doc_lengths"].sum())
+
+            offsets = data["offsets"].astype(np.int64)
+            all_docs = data["postings_docs"].astype(np.uint32)
+            all_tfs = data["postings_tfs"].astype(np.uint32)
+            doc_terms = [array("I") for _ in index.doc_ids]
+            for term_id, term in enumerate(data["terms"].tolist()):
+                docs = all_docs[offsets[term_id]:offsets[term_id + 1]]
+                index.vocab[term] = term_id
+                index.doc_freqs.append(len(docs))
+                index.postings_docs.append(array("I", docs.tobytes()))
+                index.postings_tfs.append(array("I", all_tfs[offsets[term_id]:offsets[term_id + 1]].tobytes()))
+                for doc_number in docs.tolist():
+                    doc_terms[doc_number].append(term_id)
+            index.doc_terms = doc_terms
+        return index
+
+class _StoredIndex:
+    """A cached index, its lock, and whether it holds changes not yet saved"""
+
+    def __init__(self, index: BM25Index):
+        self.index = index
+        self.lock = threading.Lock()
+        self.dirty = False
+
+class LexicalIndexStore:
+    """Per-collection BM25 indexes persisted under LEXICAL_INDEX_PATH with an in-memory LRU
+
+    Updates made with persist=False stay in memory until flush(); ingestion uses this
+    to write each document's index once instead of once per batch.
+    """
+
+    def __init__(self, directory: str, cache_size: int):
+        self.directory = directory
+        self.cache_size = max(1, cache_size)
+        self._indexes: "OrderedDict[str, _StoredIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, collection_name: str) -> str:
+        return os.path.join(self.directory, f"{collection_name}.npz")
+
+    def _entry(self, collection_name: str, create: bool) -> Optional[_StoredIndex]:
+        evicted = []
+        with self._lock:
+            entry = self._indexes.get(collection_name)
+            if entry is not None:
+                self._indexes.move_to_end(collection_name)
+                return entry
+
+            path = self._path(collection_name)
+            if os.path.exists(path):
+                try:
+                    entry = _StoredIndex(BM25Index.load(path))
+                except Exception as e:
+                    logger.warning(f"Failed to load lexical index {collection_name}: {e}")
+            if entry is None:
+                if not create:
+                    return None
+                entry = _StoredIndex(BM25Index())
+
+            self._indexes[collection_name] = entry
+            while len(self._indexes) > self.cache_size:
+                evicted.append(self._indexes.popitem(last=False))
+
+        # Unsaved changes must reach disk before the only copy leaves the cache
+        for name, stale in evicted:
+            self._save(name, stale)
+        return entry
+
+    def _save(self, collection_name: str, entry: _StoredIndex) -> None:
+        with entry.lock:
+            if entry.dirty:
+                entry.index.save(self._path(collection_name))
+                entry.dirty = False
+
+    def has_index(self, collection_name: str) -> bool:
+        return self._entry(collection_name, create=False) is not None
+
+    def add_documents(self, collection_name: str, ids: List[str], texts: List[str], persist: bool = True) -> None:
+        """Add documents to a collection's index; persist=False defers saving to flush()"""
+        entry = self._entry(collection_name, create=True)
+        with entry.lock:
+            entry.index.add(ids, texts)
+            entry.dirty = True
+        if persist:
+            self._save(collection_name, entry)
+
+    def remove_documents(self, collection_name: str, ids: List[str], persist: bool = True) -> None:
+        """Remove documents from a collection's index; persist=False defers saving to flush()"""
+        entry = self._entry(collection_name, create=False)
+        if entry is None:
+            return
+        with entry.lock:
+            entry.index.remove(ids)
+            entry.dirty = True
+        if persist:
+            self._save(collection_name, entry)
+
+    def flush(self, collection_name: str) -> None:
+        """Save a collection's index if it has deferred changes"""
+        with self._lock:
+            entry = self._indexes.get(collection_name)
+        if entry is not None:
+            self._save(collection_name, entry)
+
+    def search(self, collection_name: str, query: str, limit: int,
+               accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        entry = self._entry(collection_name, create=False)
+        if entry is None:
+            return []
+        with entry.lock:
+            return entry.index.search(query, limit, accept)
+
+    def delete(self, collection_name: str) -> None:
+        """Drop a collection's index from memory and disk"""
+        with self._lock:
+            self._indexes.pop(collection_name, None)
+        try:
+            os.remove(self._path(collection_name))
+        except FileNotFoundError:
+            pass
+
+_lexical_index_store: Optional[LexicalIndexStore] = None
+_lexical_index_store_lock = threading.Lock()
+
+def get_lexical_index_store() -> LexicalIndexStore:
+    """Return the process-wide lexical index store"""
+    global _lexical_index_store
+    if _lexical_index_store is None:
+        with _lexical_index_store_lock:
+            if _lexical_index_store is None:
+                _lexical_index_store = LexicalIndexStore(
+                    Config.LEXICAL_INDEX_PATH,
+                    Config.LEXICAL_INDEX_CACHE_SIZE
+                )
+    return _lexical_index_store
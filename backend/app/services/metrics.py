@@ -0,0 +1,71 @@
+import logging
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Seconds; request-scale stages
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds; document-scale stages
+INGEST_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+TOKEN_RATE_BUCKETS = (5, 10, 25, 50, 100, 200, 400, 800)
+
+LabelValues = Tuple[str, ...]
+
+class CallbackMetric(Collector):
+    """Values read from elsewhere at scrape time, such as the counters a cache already keeps
+
+    The callback returns one value, or a mapping of label values to values.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, callback: Callable[[], Union[float, Dict[LabelValues, float]]],
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.family = CounterMetricFamily if kind == "counter" else GaugeMetricFamily
+        self.callback = callback
+        self.labelnames = list(labelnames)
+        REGISTRY.register(self)
+
+    def describe(self) -> List:
+        return []
+
+    def collect(self) -> Iterator:
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.warning(f"Skipping metric {self.name}: {e}")
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        family = self.family(self.name, self.help, labels=self.labelnames)
+        for label_values, value in sorted(values.items()):
+            family.add_metric(list(label_values), value)
+        yield family
+
+def render() -> bytes:
+    """Prometheus text exposition of every metric in the default registry"""
+    return generate_latest(REGISTRY)
+
+# Stage timings shared by the ingestion and chat paths
+INGEST_STAGE_SECONDS = Histogram(
+    "rag_ingest_stage_seconds", "Seconds a document spent in each ingestion stage, summed over page ranges and batches",
+    ["stage"], buckets=INGEST_BUCKETS
+)
+INGEST_DOCUMENTS = Counter("rag_ingest_documents_total", "Documents ingested, by final status", ["status"])
+CHAT_STAGE_SECONDS = Histogram(
+    "rag_chat_stage_seconds", "Seconds spent in each stage of a chat request", ["stage"], buckets=LATENCY_BUCKETS
+)
+CHAT_TOKENS_PER_SECOND = Histogram(
+    "rag_chat_tokens_per_second", "Answer tokens per second after the first token", buckets=TOKEN_RATE_BUCKETS
+)
+ACTIVE_STREAMS = Gauge("rag_active_streams", "Chat SSE streams currently open")
+EMBEDDING_REQUESTS = Counter(
+    "rag_embedding_requests_total", "Embedding API requests or local inference batches, by outcome", ["status"]
+)
+EMBEDDED_TEXTS = Counter("rag_embedded_texts_total", "Texts embedded by the embedding provider")
@@ -0,0 +1,90 @@
+import importlib.util
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class OpenRouterAPIError(Exception):
+    """Non-200 response from the OpenRouter API"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"OpenRouter API error: {status_code} - {message}")
+        self.status_code = status_code
+        self.message = message
+
+class OpenRouterClient:
+    """Shared async client for OpenRouter; one connection pool multiplexes all chat streams"""
+
+    def __init__(self):
+        http2 = Config.OPENROUTER_HTTP2 and importlib.util.find_spec("h2") is not None
+        if Config.OPENROUTER_HTTP2 and not http2:
+            logger.warning("HTTP/2 requested for OpenRouter but 'h2' is not installed, using HTTP/1.1")
+
+        self.client = httpx.AsyncClient(
+            base_url=Config.OPENROUTER_API_BASE,
+            headers={
+                "Authorization": f"Bearer {Config.OPENROUTER_API_KEY}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": Config.SITE_URL,
+                "X-Title": Config.SITE_NAME,
+            },
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=Config.OPENROUTER_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.OPENROUTER_MAX_KEEPALIVE,
+                keepalive_expiry=Config.OPENROUTER_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(60.0, connect=10.0)  # 10s to connect, 60s between reads
+        )
+
+    async def stream_chat(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream a chat completion, yielding content deltas as they arrive"""
+        async with self.client.stream("POST", "chat/completions", json=payload) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise OpenRouterAPIError(response.status_code, body.decode("utf-8", errors="replace"))
+
+            async for line in response.aiter_lines():
+                if not line or not line.startswith("data: "):
+                    continue
+                data = line[6:]  # Remove "data: " prefix
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk_data = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                if "choices" in chunk_data and len(chunk_data["choices"]) > 0:
+                    delta = chunk_data["choices"][0].get("delta", {})
+                    if delta.get("content"):
+                        yield delta["content"]
+
+    async def ping(self) -> None:
+        """Check that the API answers; only the status line is read, not the model list"""
+        async with self.client.stream("GET", "models") as response:
+            if response.status_code != 200:
+                raise OpenRouterAPIError(response.status_code, "models endpoint unavailable")
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+_openrouter_client: Optional[OpenRouterClient] = None
+
+def get_openrouter_client() -> OpenRouterClient:
+    """Return the process-wide OpenRouter client, creating it on first use"""
+    global _openrouter_client
+    if _openrouter_client is None:
+        _openrouter_client = OpenRouterClient()
+    return _openrouter_client
+
+async def close_openrouter_client() -> None:
+    """Close the shared client and its pooled connections"""
+    global _openrouter_client
+    if _openrouter_client is not None:
+        await _openrouter_client.aclose()
+        _openrouter_client = None
@@ -0,0 +1,447 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per NumPy block; bounds the float32 copy a search makes of quantized codes
+BLOCK_ROWS = 4096
+
+DTYPES = {"int8": np.int8, "float16": np.float16}
+
+_directory_locks: Dict[str, threading.RLock] = {}
+_directory_locks_lock = threading.Lock()
+
+def _directory_lock(directory: str) -> threading.RLock:
+    """One lock per collection directory, shared by every handle opened on it"""
+    with _directory_locks_lock:
+        return _directory_locks.setdefault(os.path.abspath(directory), threading.RLock())
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(codes, per-row scales); int8 is symmetric per row, float16 needs no scale"""
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def doc_ids_of_filter(where: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """Document ids selected by the Chroma filters this backend uses: {"doc_id": x} or {"doc_id": {"$in": [...]}}"""
+    if not where:
+        return None
+    if set(where) != {"doc_id"}:
+        raise ValueError(f"Unsupported filter for quantized collections: {where}")
+    condition = where["doc_id"]
+    if isinstance(condition, dict):
+        if set(condition) != {"$in"}:
+            raise ValueError(f"Unsupported filter for quantized collections: {where}")
+        return list(condition["$in"])
+    return [condition]
+
+class QuantizedCollection:
+    """One collection's vectors as int8 or float16 rows in a memory-mapped file
+
+    Quacks like the parts of a Chroma collection this backend uses (add, query, get,
+    delete, count, metadata). Searches are exact scans with blocked NumPy dot
+    products over the quantized rows, returning Chroma's squared L2 distances; with
+    rescoring, the best candidates are re-ranked against a float32 copy on disk of
+    which only the candidate rows are read. Ids, documents and metadata live in a
+    small SQLite table keyed by row. Deleted rows stay in the vector files until
+    they exceed compact_ratio of all rows; the live rows are then rewritten to new
+    files of the next layout generation, which the records switch to in one commit.
+    """
+
+    def __init__(self, name: str, directory: str, dtype: str, rescore: bool, rescore_factor: int,
+                 embedding_fn=None, metadata: Optional[Dict[str, Any]] = None, compact_ratio: float = 0.25):
+        self.name = name
+        self.directory = directory
+        self.embedding_fn = embedding_fn
+        self.rescore_factor = max(1, rescore_factor)
+        self.compact_ratio = compact_ratio
+        self._lock = _directory_lock(directory)
+        self._maps: Dict[str, Tuple[int, np.memmap]] = {}  # File -> (size mapped, memmap)
+        self._generation = 0  # Layout generation the vector file names belong to
+
+        os.makedirs(directory, exist_ok=True)
+        self._meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self._meta = json.load(f)
+        else:
+            # Storage settings are fixed at creation so later config changes cannot misread the files
+            self._meta = {"dtype": dtype, "rescore": rescore, "dimension": None, "metadata": metadata or {}}
+            self._save_meta()
+        self.dtype = self._meta["dtype"]
+        self.rescore = self._meta["rescore"]
+
+        self._conn = sqlite3.connect(os.path.join(directory, "records.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, doc_id TEXT, document TEXT, metadata TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_doc ON records(doc_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS layout (generation INTEGER NOT NULL)")
+        self._conn.execute("INSERT INTO layout SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM layout)")
+        self._conn.commit()
+        with self._lock:
+            self._sync_generation()
+            self._remove_stale_files()
+
+    # Chroma collection surface
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return dict(self._meta["metadata"])
+
+    def modify(self, metadata: Optional[Dict[str, Any]] = None, **kwargs) -> None:
+        if metadata is not None:
+            with self._lock:
+                self._meta["metadata"] = dict(metadata)
+                self._save_meta()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def add(self, ids: Sequence[str], embeddings=None, documents: Optional[Sequence[str]] = None,
+            metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        if not ids:
+            return
+        if embeddings is None:
+            embeddings = self.embedding_fn(list(documents))
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock:
+            if self._meta["dimension"] is None:
+                self._meta["dimension"] = int(vectors.shape[1])
+                self._save_meta()
+            if vectors.shape[1] != self._meta["dimension"]:
+                raise ValueError(f"Expected {self._meta['dimension']}-dimensional embeddings, got {vectors.shape[1]}")
+
+            self._sync_generation()
+            codes, scales = quantize(vectors, self.dtype)
+            rows = np.zeros(len(vectors), dtype=self._row_dtype())
+            rows["norm"] = (vectors * vectors).sum(axis=1)
+            rows["scale"] = scales
+            rows["code"] = codes
+            start = self._row_count()
+            # Writes land at the row offset, so a crash between files never misaligns them
+            self._write_at(self._path(self._file("vectors")), start * rows.itemsize, rows.tobytes())
+            if self.rescore:
+                self._write_at(self._path(self._file("full")), start * vectors.shape[1] * 4, vectors.tobytes())
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)",
+                [
+                    (start + i, chunk_id, (metadata or {}).get("doc_id"), document, json.dumps(metadata or {}))
+                    for i, (chunk_id, document, metadata) in enumerate(zip(ids, documents, metadatas))
+                ]
+            )
+            self._conn.commit()
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        sql, params = self._select("DELETE FROM records", ids, where)
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+        self.compact()
+
+    def compact(self, force: bool = False) -> bool:
+        """Rewrite the vector files without deleted rows once they pass compact_ratio; True if rewritten
+
+        New files are written under the next generation's names, then the renumbered
+        rows and the generation are committed together, so a crash at any point leaves
+        the records pointing at complete files. Files of other generations are removed
+        afterwards, or on the next open.
+        """
+        with self._lock:
+            self._sync_generation()
+            total = self._row_count()
+            live = np.array([record[0] for record in self._conn.execute("SELECT row FROM records ORDER BY row")],
+                            dtype=np.int64)
+            if not total or len(live) == total or (not force and total - len(live) <= total * self.compact_ratio):
+                return False
+
+            generation = self._generation + 1
+            files = [("vectors", self._row_dtype())]
+            if self.rescore:
+                files.append(("full", np.dtype((np.float32, self._meta["dimension"]))))
+            for kind, dtype in files:
+                source = self._map(self._file(kind), dtype)
+                with open(self._path(self._file(kind, generation)), "wb") as target:
+                    for start in range(0, len(live), BLOCK_ROWS):
+                        source[live[start:start + BLOCK_ROWS]].tofile(target)
+                    target.flush()
+                    os.fsync(target.fileno())
+
+            # Ascending rows only ever move down onto rows already moved, so no two collide
+            self._conn.executemany(
+                "UPDATE records SET row = ? WHERE row = ?",
+                [(new, int(old)) for new, old in enumerate(live) if new != old]
+            )
+            self._conn.execute("UPDATE layout SET generation = ?", (generation,))
+            self._conn.commit()
+            self._sync_generation()
+            self._remove_stale_files()
+            logger.info(f"Compacted {self.name[:8]}...: {total} rows to {len(live)}")
+            return True
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, Any]:
+        sql, params = self._select("SELECT row, id, document, metadata FROM records", ids, where)
+        sql += " ORDER BY row"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset or 0]
+        with self._lock:
+            self._sync_generation()
+            records = self._conn.execute(sql, params).fetchall()
+            if "embeddings" in include:
+                # Read under the lock: compaction renumbers rows
+                embeddings = self._embeddings(np.array([record[0] for record in records], dtype=np.int64))
+
+        result: Dict[str, Any] = {"ids": [record[1] for record in records]}
+        if "documents" in include:
+            result["documents"] = [record[2] for record in records]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(record[3]) for record in records]
+        if "embeddings" in include:
+            result["embeddings"] = embeddings
+        return result
+
+    def query(self, query_embeddings=None, query_texts: Optional[Sequence[str]] = None, n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        if query_embeddings is None:
+            query_embeddings = self.embedding_fn(list(query_texts))
+        sql, params = self._select("SELECT row FROM records", None, where)
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        while True:
+            with self._lock:
+                generation = self._sync_generation()
+                rows = np.array([record[0] for record in self._conn.execute(sql + " ORDER BY row", params)],
+                                dtype=np.int64)
+                vectors = self._map(self._file("vectors"), self._row_dtype()) \
+                    if self._meta["dimension"] is not None else None
+                full = self._map(self._file("full"), np.dtype((np.float32, self._meta["dimension"]))) \
+                    if self.rescore and vectors is not None else None
+            # The scan runs unlocked over maps that stay valid even if the files are replaced
+            hits = [self._search(query, rows, n_results, vectors, full) for query in queries]
+            records = self._records(sorted({row for query_hits in hits for row, _ in query_hits}), generation)
+            if records is not None:
+                break
+            # Compacted mid-search: the rows found are numbered for the old files
+
+        result: Dict[str, List[Any]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query_hits in hits:
+            kept = [(records[row], distance) for row, distance in query_hits if row in records]
+            result["ids"].append([record[0] for record, _ in kept])
+            result["documents"].append([record[1] for record, _ in kept])
+            result["metadatas"].append([json.loads(record[2]) for record, _ in kept])
+            result["distances"].append([distance for _, distance in kept])
+        return {key: value for key, value in result.items() if key == "ids" or key in include}
+
+    # Search
+
+    def _search(self, query: np.ndarray, rows: np.ndarray, n_results: int, vectors: Optional[np.memmap],
+                full: Optional[np.memmap]) -> List[Tuple[int, float]]:
+        """(row, squared L2 distance) of the nearest rows among the given ones, best first"""
+        if vectors is None or not len(rows) or n_results <= 0:
+            return []
+        rows = rows[rows < len(vectors)]
+        query_norm = float(query @ query)
+        distances = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = vectors[rows[start:start + BLOCK_ROWS]]
+            dots = block["code"].astype(np.float32) @ query * block["scale"]
+            distances[start:start + len(block)] = query_norm + block["norm"] - 2 * dots
+        candidates = min(len(rows), n_results * self.rescore_factor if full is not None else n_results)
+        best = np.argpartition(distances, candidates - 1)[:candidates] if candidates < len(rows) else np.arange(len(rows))
+        best_rows = rows[best]
+        if full is not None:
+            exact = full[best_rows] - query
+            best_distances = (exact * exact).sum(axis=1)
+        else:
+            best_distances = distances[best]
+        order = np.argsort(best_distances, kind="stable")[:n_results]
+        return [(int(best_rows[i]), float(best_distances[i])) for i in order]
+
+    def _embeddings(self, rows: np.ndarray) -> np.ndarray:
+        """Full-precision vectors when kept, otherwise dequantized ones"""
+        dimension = self._meta["dimension"] or 0
+        if not len(rows):
+            return np.empty((0, dimension), dtype=np.float32)
+        if self.rescore:
+            full = self._map(self._file("full"), np.dtype((np.float32, dimension)))
+            return np.asarray(full[rows], dtype=np.float32)
+        block = self._map(self._file("vectors"), self._row_dtype())[rows]
+        return block["code"].astype(np.float32) * block["scale"][:, None]
+
+    # Storage
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _file(self, kind: str, generation: Optional[int] = None) -> str:
+        """Name of a vector file ("vectors" or "full") in a layout generation, by default the current one"""
+        generation = self._generation if generation is None else generation
+        return f"{kind}.bin" if not generation else f"{kind}.{generation}.bin"
+
+    def _sync_generation(self) -> int:
+        """Pick up a compaction committed through another handle on this collection; call with _lock held"""
+        generation = self._conn.execute("SELECT generation FROM layout").fetchone()[0]
+        if generation != self._generation:
+            self._generation = generation
+            self._maps.clear()
+        return generation
+
+    def _remove_stale_files(self) -> None:
+        """Delete vector files of other generations, left by a finished or interrupted compaction"""
+        current = {self._file("vectors"), self._file("full")}
+        for filename in os.listdir(self.directory):
+            if filename.startswith(("vectors.", "full.")) and filename.endswith(".bin") and filename not in current:
+                os.remove(self._path(filename))
+
+    def _save_meta(self) -> None:
+        tmp_path = f"{self._meta_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _row_dtype(self) -> np.dtype:
+        return np.dtype([
+            ("norm", np.float32),  # Squared norm of the original vector, for exact L2 from a dot product
+            ("scale", np.float32),
+            ("code", DTYPES[self.dtype], (self._meta["dimension"],)),
+        ])
+
+    def _row_count(self) -> int:
+        try:
+            return os.path.getsize(self._path(self._file("vectors"))) // self._row_dtype().itemsize
+        except FileNotFoundError:
+            return 0
+
+    def _map(self, filename: str, dtype: np.dtype) -> Optional[np.memmap]:
+        """Read-only memmap of a vector file, remapped when it has grown, possibly through another handle"""
+        if self._meta["dimension"] is None:
+            return None
+        path = self._path(filename)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        count = size // dtype.itemsize
+        with self._lock:
+            mapped = self._maps.get(filename)
+            if mapped is not None and mapped[0] == count:
+                return mapped[1]
+            if not count:
+                return None
+            array = np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+            self._maps[filename] = (count, array)
+            return array
+
+    @staticmethod
+    def _write_at(path: str, offset: int, data: bytes) -> None:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _select(prefix: str, ids: Optional[Sequence[str]], where: Optional[Dict[str, Any]]) -> Tuple[str, list]:
+        conditions, params = [], []
+        if ids is not None:
+            conditions.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        doc_ids = doc_ids_of_filter(where)
+        if doc_ids is not None:
+            conditions.append(f"doc_id IN ({','.join('?' * len(doc_ids))})")
+            params.extend(doc_ids)
+        return (f"{prefix} WHERE {' AND '.join(conditions)}" if conditions else prefix), params
+
+    def _records(self, rows: Sequence[int], generation: int) -> Optional[Dict[int, Tuple[str, str, str]]]:
+        """Records of rows numbered in a layout generation; None if the collection was compacted since"""
+        with self._lock:
+            if self._sync_generation() != generation:
+                return None
+            if not rows:
+                return {}
+            records = self._conn.execute(
+                f"SELECT row, id, document, metadata FROM records WHERE row IN ({','.join('?' * len(rows))})",
+                list(rows)
+            ).fetchall()
+        return {record[0]: record[1:] for record in records}
+
+class QuantizedVectorStore:
+    """Directory of quantized collections, one subdirectory each"""
+
+    def __init__(self, directory: str, dtype: str, rescore: bool, rescore_factor: int, compact_ratio: float = 0.25):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown vector store dtype: {dtype}")
+        self.directory = directory
+        self.dtype = dtype
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor
+        self.compact_ratio = compact_ratio
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self._path(name), "meta.json"))
+
+    def names(self) -> List[str]:
+        return [name for name in os.listdir(self.directory) if self.exists(name)]
+
+    def open(self, name: str, embedding_fn=None, metadata: Optional[Dict[str, Any]] = None) -> QuantizedCollection:
+        """Open a collection, creating it with the given metadata if it does not exist"""
+        return QuantizedCollection(
+            name, self._path(name), self.dtype, self.rescore, self.rescore_factor, embedding_fn, metadata,
+            self.compact_ratio
+        )
+
+    def delete(self, name: str) -> bool:
+        """Delete a collection's files; False if there was none"""
+        if not self.exists(name):
+            return False
+        shutil.rmtree(self._path(name), ignore_errors=True)
+        with _directory_locks_lock:
+            _directory_locks.pop(os.path.abspath(self._path(name)), None)
+        return True
+
+    def disk_bytes(self, name: str) -> int:
+        directory = self._path(name)
+        return sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+
+_quantized_store: Optional[QuantizedVectorStore] = None
+_quantized_store_lock = threading.Lock()
+
+def get_quantized_vector_store() -> QuantizedVectorStore:
+    """Return the process-wide quantized vector store configured by VECTOR_STORE_*"""
+    global _quantized_store
+    if _quantized_store is None:
+        with _quantized_store_lock:
+            if _quantized_store is None:
+                _quantized_store = QuantizedVectorStore(
+                    Config.VECTOR_STORE_PATH,
+                    Config.VECTOR_STORE_DTYPE,
+                    Config.VECTOR_STORE_RESCORE,
+                    Config.VECTOR_STORE_RESCORE_CANDIDATES,
+                    Config.VECTOR_STORE_COMPACT_RATIO
+                )
+    return _quantized_store
@@ -0,0 +1,144 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from config import Config
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+class CachedRetrieval(NamedTuple):
+    context_str: str
+    sources: List[str]
+    embedding: Optional[np.ndarray]  # Unit-normalised question embedding for semantic lookup
+    created_at: float
+
+def normalize_question(question: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive cache key for a question"""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+class QueryResultCache:
+    """Per-session cache of retrieved context and sources, bounded by TTL and LRU"""
+
+    def __init__(self, max_entries_per_session: int, max_sessions: int, ttl: float,
+                 similarity_threshold: float):
+        self.max_entries_per_session = max(1, max_entries_per_session)
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._sessions: "OrderedDict[str, OrderedDict[str, CachedRetrieval]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, entry: CachedRetrieval) -> bool:
+        return time.time() - entry.created_at < self.ttl
+
+    def get(self, session_id: str, question: str) -> Optional[CachedRetrieval]:
+        """Exact lookup on the normalised question"""
+        key = normalize_question(question)
+        with self._lock:
+            entries = self._sessions.get(session_id)
+            entry = entries.get(key) if entries else None
+            if entry is not None and not self._is_fresh(entry):
+                del entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return entry
+
+    def get_similar(self, session_id: str, embedding: Sequence[float]) -> Optional[CachedRetrieval]:
+        """Nearest cached question by cosine similarity, if above the configured threshold"""
+        query = _unit(embedding)
+        with self._lock:
+            entries = self._sessions.get(session_id)
+            if not entries:
+                return None
+            candidates = [
+                (key, entry) for key, entry in entries.items()
+                if entry.embedding is not None and self._is_fresh(entry)
+            ]
+            if not candidates:
+                return None
+            similarities = np.stack([entry.embedding for _, entry in candidates]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            key, entry = candidates[best]
+            entries.move_to_end(key)
+            self.semantic_hits += 1
+            # The exact lookup already counted this request as a miss
+            self.misses -= 1
+            return entry
+
+    def put(self, session_id: str, question: str, context_str: str, sources: List[str],
+            embedding: Optional[Sequence[float]] = None) -> None:
+        entry = CachedRetrieval(
+            context_str=context_str,
+            sources=list(sources),
+            embedding=_unit(embedding) if embedding is not None else None,
+            created_at=time.time()
+        )
+        key = normalize_question(question)
+        with self._lock:
+            entries = self._sessions.get(session_id)
+            if entries is None:
+                entries = OrderedDict()
+                self._sessions[session_id] = entries
+            entries[key] = entry
+            entries.move_to_end(key)
+            self._sessions.move_to_end(session_id)
+            while len(entries) > self.max_entries_per_session:
+                entries.popitem(last=False)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def invalidate(self, session_id: str) -> None:
+        """Forget everything cached for a session, including its document-filtered scopes"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            for scope in [scope for scope in self._sessions if scope.startswith(f"{session_id}|")]:
+                del self._sessions[scope]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "entries": sum(len(entries) for entries in self._sessions.values()),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm else array
+
+_query_cache: Optional[QueryResultCache] = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache() -> Optional[QueryResultCache]:
+    """Return the process-wide query result cache, or None when disabled"""
+    global _query_cache
+    if not Config.QUERY_CACHE_ENABLED:
+        return None
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryResultCache(
+                    max_entries_per_session=Config.QUERY_CACHE_MAX_ENTRIES,
+                    max_sessions=Config.QUERY_CACHE_MAX_SESSIONS,
+                    ttl=Config.QUERY_CACHE_TTL,
+                    similarity_threshold=Config.QUERY_CACHE_SIMILARITY
+                )
+    return _query_cache
@@ -0,0 +1,195 @@
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from app.services.lexical_index import LexicalIndexStore
+from app.services.metrics import CHAT_STAGE_SECONDS
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+STOP_WORDS = frozenset([
+    'what', 'when', 'where', 'which', 'about', 'does', 'have', 'this', 'that', 'with',
+    'from', 'they', 'them', 'were', 'been', 'said', 'each', 'then', 'their'
+])
+
+# Constant from the original reciprocal rank fusion paper; dampens the weight of top ranks
+RRF_K = 60
+
+class RetrievedChunks(NamedTuple):
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Dict[str, Any]]
+    distances: List[float]
+    keyword_matches: List[bool]  # True where the lexical strategy found the chunk
+    keywords: List[str]
+
+def extract_keywords(question: str) -> List[str]:
+    """Important words of a question for the keyword strategy"""
+    return [
+        word for word in question.lower().split()
+        if len(word) > 3 and word not in STOP_WORDS
+    ]
+
+def doc_id_of(chunk_id: str) -> str:
+    """Chunk ids are "<doc_id>_<n>"; recover the document a chunk belongs to"""
+    return chunk_id.rsplit("_", 1)[0]
+
+def doc_filter(doc_ids: Optional[Sequence[str]]) -> Optional[Dict[str, Any]]:
+    """Chroma metadata filter restricting a query to some documents of a collection"""
+    return {"doc_id": {"$in": list(doc_ids)}} if doc_ids else None
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[str]:
+    """Fuse several ranked id lists into one ordering by summed 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda item_id: scores[item_id], reverse=True)
+
+class HybridRetriever:
+    """Semantic + keyword retrieval over one session collection"""
+
+    def __init__(self, embedding_fn, lexical_store: LexicalIndexStore):
+        self.embedding_fn = embedding_fn
+        self.lexical_store = lexical_store
+
+    def retrieve(self, collection, question: str, doc_ids: Optional[Sequence[str]] = None,
+                 query_embedding: Optional[Sequence[float]] = None) -> RetrievedChunks:
+        """Retrieve from the whole collection, or only from the given documents
+
+        A question embedding the caller already computed is reused instead of embedding again.
+        """
+        if Config.RETRIEVAL_MODE == "dual_query":
+            return self._retrieve_dual_query(collection, question, doc_ids)
+        return self._retrieve_fused(collection, question, doc_ids, query_embedding)
+
+    def _retrieve_fused(self, collection, question: str, doc_ids: Optional[Sequence[str]] = None,
+                        query_embedding: Optional[Sequence[float]] = None) -> RetrievedChunks:
+        """Embed the question once; run the keyword strategy locally and fuse both rankings"""
+        keywords = extract_keywords(question)
+        if query_embedding is None:
+            with CHAT_STAGE_SECONDS.labels("query_embedding").time():
+                query_embedding = self.embedding_fn([question])[0]
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+
+        # Strategy 1: Direct semantic search with higher recall
+        with CHAT_STAGE_SECONDS.labels("chroma_query").time():
+            vector_results = collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=Config.RETRIEVAL_TOP_K,
+                where=doc_filter(doc_ids),
+                include=["documents", "metadatas", "distances"]
+            )
+        chunks: Dict[str, Dict[str, Any]] = {}
+        vector_ranking: List[str] = []
+        if vector_results and vector_results.get("ids") and vector_results["ids"][0]:
+            for chunk_id, document, metadata, distance in zip(
+                vector_results["ids"][0],
+                vector_results["documents"][0],
+                vector_results["metadatas"][0],
+                vector_results["distances"][0]
+            ):
+                chunks[chunk_id] = {"document": document, "metadata": metadata or {}, "distance": distance}
+                vector_ranking.append(chunk_id)
+
+        # Strategy 2: BM25 over the session's local inverted index, no second embedding or ANN query
+        keyword_ranking: List[str] = []
+        if keywords:
+            self._ensure_lexical_index(collection)
+            allowed_docs = set(doc_ids) if doc_ids else None
+            keyword_ranking = [
+                chunk_id for chunk_id, _ in self.lexical_store.search(
+                    collection.name, question, Config.RETRIEVAL_TOP_K // 2,
+                    accept=(lambda chunk_id: doc_id_of(chunk_id) in allowed_docs) if allowed_docs else None
+                )
+            ]
+            self._load_keyword_hits(collection, query_embedding, keyword_ranking, chunks)
+
+        keyword_hits = set(keyword_ranking)
+        ids, documents, metadatas, distances, keyword_matches = [], [], [], [], []
+        seen_documents = set()
+        # Keyword hits the collection no longer holds were not fetched; leave them out
+        fused = [
+            chunk_id for chunk_id in reciprocal_rank_fusion([vector_ranking, keyword_ranking]) if chunk_id in chunks
+        ]
+        for chunk_id in fused[:Config.RETRIEVAL_TOP_K]:
+            chunk = chunks[chunk_id]
+            if chunk["document"] in seen_documents:
+                continue
+            seen_documents.add(chunk["document"])
+            ids.append(chunk_id)
+            documents.append(chunk["document"])
+            metadatas.append(chunk["metadata"])
+            distances.append(chunk["distance"])
+            keyword_matches.append(chunk_id in keyword_hits)
+
+        return RetrievedChunks(ids, documents, metadatas, distances, keyword_matches, keywords)
+
+    def _ensure_lexical_index(self, collection) -> None:
+        """Build the BM25 index for collections ingested before lexical indexing existed"""
+        if self.lexical_store.has_index(collection.name):
+            return
+        corpus = collection.get(include=["documents"])
+        if corpus["ids"]:
+            logger.info(f"Building lexical index for {collection.name} ({len(corpus['ids'])} chunks)")
+            self.lexical_store.add_documents(collection.name, corpus["ids"], corpus["documents"])
+
+    def _load_keyword_hits(self, collection, query_embedding: np.ndarray, ranking: List[str],
+                           chunks: Dict[str, Dict[str, Any]]) -> None:
+        """Fetch keyword-only hits and score them against the question embedding"""
+        missing = [chunk_id for chunk_id in ranking if chunk_id not in chunks]
+        if not missing:
+            return
+        results = collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+        if len(results["ids"]) < len(missing):
+            logger.warning(
+                f"Lexical index for {collection.name} lists {len(missing) - len(results['ids'])} chunks "
+                "missing from the collection"
+            )
+        if results["embeddings"] is None or len(results["embeddings"]) == 0:
+            return
+        embeddings = np.asarray(results["embeddings"], dtype=np.float32)
+        # Chroma's default space is squared L2; keep distances comparable with vector hits
+        distances = ((embeddings - query_embedding) ** 2).sum(axis=1)
+        for chunk_id, document, metadata, distance in zip(
+            results["ids"], results["documents"], results["metadatas"], distances
+        ):
+            chunks[chunk_id] = {"document": document, "metadata": metadata or {}, "distance": float(distance)}
+
+    def _retrieve_dual_query(self, collection, question: str,
+                             doc_ids: Optional[Sequence[str]] = None) -> RetrievedChunks:
+        """Legacy retrieval: a semantic query plus a second semantic query over the keywords"""
+        keywords = extract_keywords(question)
+        queries = [(question, Config.RETRIEVAL_TOP_K)]
+        if keywords:
+            queries.append((" ".join(keywords), Config.RETRIEVAL_TOP_K // 2))
+
+        ids, documents, metadatas, distances = [], [], [], []
+        seen_documents = set()
+        for query_text, n_results in queries:
+            # Chroma embeds query_texts itself, so this includes the query embedding
+            with CHAT_STAGE_SECONDS.labels("chroma_query").time():
+                results = collection.query(
+                    query_texts=[query_text],
+                    n_results=n_results,
+                    where=doc_filter(doc_ids),
+                    include=["documents", "metadatas", "distances"]
+                )
+            if not (results and results.get("documents") and results["documents"][0]):
+                continue
+            for chunk_id, document, metadata, distance in zip(
+                results["ids"][0],
+                results["documents"][0],
+                results.get("metadatas", [[]])[0],
+                results.get("distances", [[]])[0]
+            ):
+                if document not in seen_documents and len(documents) < Config.RETRIEVAL_TOP_K:
+                    ids.append(chunk_id)
+                    documents.append(document)
+                    metadatas.append(metadata or {})
+                    distances.append(distance)
+                    seen_documents.add(document)
+
+        return RetrievedChunks(ids, documents, metadatas, distances, [False] * len(documents), keywords)
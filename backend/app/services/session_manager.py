@@ -0,0 +1,214 @@
+import threading
+import time
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+from app.schemas.schemas import DocumentInfo, SessionInfo
+from app.services.document_registry import DocumentRegistry, get_document_registry
+from app.services.session_store import SessionStore, SessionTransaction, get_session_store
+
+# Session progress fields that total the same fields of the session's documents
+TOTAL_FIELDS = ("pages_total", "pages_parsed", "chunk_count", "chunks_embedded", "chunks_indexed")
+
+# Allowed document status changes; "removing" rolls back to where it came from if removal fails
+DOCUMENT_TRANSITIONS = {
+    "processing": {"active", "failed"},
+    "active": {"removing"},
+    "failed": {"removing"},
+    "removing": {"active", "failed"},
+}
+
+class InvalidTransition(ValueError):
+    """A document status change the state machine does not allow"""
+
+    def __init__(self, doc_id: str, current: str, requested: str):
+        super().__init__(f"Document {doc_id[:8]}... cannot go from {current} to {requested}")
+        self.current = current
+        self.requested = requested
+
+def session_collection(session_info: SessionInfo) -> str:
+    return session_info.collection_name or session_info.session_id
+
+def refresh_session_totals(session_info: SessionInfo) -> None:
+    """Recompute a session's progress fields and status from its documents"""
+    documents = list(session_info.documents.values())
+    for field in TOTAL_FIELDS:
+        setattr(session_info, field, sum(getattr(document, field) for document in documents))
+    statuses = {document.status for document in documents}
+    if "processing" in statuses:
+        session_info.status = "processing"
+    elif statuses & {"active", "removing"} or not documents:
+        session_info.status = "active"
+    else:
+        session_info.status = "failed"
+    errors = [document.error for document in documents if document.error]
+    session_info.error = errors[-1] if errors else None
+
+class StripedLocks:
+    """A fixed pool of locks picked by key hash: per-key mutual exclusion without a lock per key"""
+
+    def __init__(self, stripes: int):
+        self._locks = [threading.Lock() for _ in range(max(1, stripes))]
+
+    def __call__(self, key: str) -> threading.Lock:
+        return self._locks[zlib.crc32(key.encode()) % len(self._locks)]
+
+class SessionManager:
+    """Session state on top of the store: snapshot reads and per-session transitions
+
+    Reads return a decoded snapshot and never take a lock. Every change is one
+    read-modify-write transaction on the store, and document status changes follow
+    DOCUMENT_TRANSITIONS. Multi-step operations on one session (forking its index,
+    removing a document) hold that session's stripe lock, so different sessions
+    never wait on each other; callers take it off the event loop.
+    """
+
+    def __init__(self, store: SessionStore, registry: DocumentRegistry, lock_stripes: int = 64):
+        self.store = store
+        self.registry = registry
+        self.lock = StripedLocks(lock_stripes)
+
+    def get(self, session_id: str) -> Optional[SessionInfo]:
+        record = self.store.get(session_id)
+        return SessionInfo.model_validate(record) if record else None
+
+    def list(self, limit: int, offset: int = 0) -> List[SessionInfo]:
+        return [SessionInfo.model_validate(record) for record in self.store.list(limit, offset)]
+
+    def count(self) -> int:
+        return self.store.count()
+
+    def touch(self, session_id: str) -> None:
+        self.store.touch(session_id)
+
+    def create(self, session_id: str, filename: str, content_hash: Optional[str]) -> Tuple[str, bool]:
+        """Register a session for an upload; returns (collection name, whether it must be ingested)
+
+        The index reference, the session and its ingestion job are recorded in one
+        transaction. A session reusing an identical upload's index copies that upload's
+        progress in the same transaction, so no ingestion update is missed.
+        """
+        with self.store.transaction() as tx:
+            collection_name, needs_ingestion = self.registry.acquire(content_hash, session_id, tx)
+            session_info = SessionInfo(
+                session_id=session_id,
+                filename=filename,
+                created_at=time.time(),
+                chunk_count=0,
+                status="processing",
+                content_hash=content_hash,
+                collection_name=collection_name,
+                # The document that founded a collection shares its id, so its chunks are "<collection>_<n>"
+                documents={collection_name: DocumentInfo(
+                    doc_id=collection_name, filename=filename, status="processing", content_hash=content_hash
+                )}
+            )
+            if needs_ingestion:
+                tx.add_job(collection_name, collection_name)
+            else:
+                for sibling_id in self.registry.sessions(collection_name, tx):
+                    sibling = self._load(tx, sibling_id)
+                    if sibling is not None:
+                        session_info.documents = sibling.documents
+                        refresh_session_totals(session_info)
+                        break
+            tx.put(session_info.model_dump())
+        return collection_name, needs_ingestion
+
+    def update_document(self, session_id: str, doc_id: str, tx: Optional[SessionTransaction] = None,
+                        **fields) -> bool:
+        """Update one document and the session totals; False if either is gone
+
+        Raises InvalidTransition for a status change the state machine does not allow.
+        """
+        if tx is None:
+            with self.store.transaction() as tx:
+                return self.update_document(session_id, doc_id, tx, **fields)
+        session_info = self._load(tx, session_id)
+        document = session_info.documents.get(doc_id) if session_info else None
+        if document is None:
+            return False
+        requested = fields.get("status", document.status)
+        if requested != document.status and requested not in DOCUMENT_TRANSITIONS.get(document.status, ()):
+            raise InvalidTransition(doc_id, document.status, requested)
+        for field, value in fields.items():
+            setattr(document, field, value)
+        refresh_session_totals(session_info)
+        tx.put(session_info.model_dump())
+        return True
+
+    def update_document_sessions(self, collection_name: str, doc_id: str, **fields) -> bool:
+        """Update a document in every session referencing its index; returns False if none is left"""
+        updated = False
+        with self.store.transaction() as tx:
+            for session_id in self.registry.sessions(collection_name, tx):
+                updated = self.update_document(session_id, doc_id, tx, **fields) or updated
+        return updated
+
+    def add_document(self, session_id: str, document: DocumentInfo, collection_name: str) -> bool:
+        """Append a document being ingested into collection_name; False if the session is gone"""
+        with self.store.transaction() as tx:
+            session_info = self._load(tx, session_id)
+            if session_info is None:
+                return False
+            session_info.documents[document.doc_id] = document
+            refresh_session_totals(session_info)
+            tx.put(session_info.model_dump())
+            tx.add_job(collection_name, document.doc_id)
+            return True
+
+    def drop_document(self, session_id: str, doc_id: str) -> None:
+        with self.store.transaction() as tx:
+            session_info = self._load(tx, session_id)
+            if session_info is not None and session_info.documents.pop(doc_id, None) is not None:
+                refresh_session_totals(session_info)
+                tx.put(session_info.model_dump())
+
+    def move(self, session_id: str, old_collection: str, new_collection: str) -> Optional[bool]:
+        """Point a session at another index and drop its reference to the old one
+
+        Returns whether the old index lost its last reference, or None if the session
+        is gone, in which case its reference to the new index is dropped instead.
+        """
+        with self.store.transaction() as tx:
+            session_info = self._load(tx, session_id)
+            if session_info is None:
+                self.registry.release(session_id, new_collection, tx)
+                return None
+            session_info.collection_name = new_collection
+            tx.put(session_info.model_dump())
+            return self.registry.release(session_id, old_collection, tx)
+
+    def remove(self, session_ids: Sequence[str]) -> Tuple[List[str], List[str]]:
+        """Delete sessions in one transaction; returns (ids removed, indexes left without references)
+
+        Deleting the indexes themselves is slow and left to the caller, outside the transaction.
+        """
+        removed, orphaned = [], []
+        with self.store.transaction() as tx:
+            for session_id in session_ids:
+                record = tx.delete(session_id)
+                if record is None:
+                    continue
+                removed.append(session_id)
+                collection_name = session_collection(SessionInfo.model_validate(record))
+                if self.registry.release(session_id, collection_name, tx):
+                    orphaned.append(collection_name)
+        return removed, orphaned
+
+    @staticmethod
+    def _load(tx: SessionTransaction, session_id: str) -> Optional[SessionInfo]:
+        record = tx.get(session_id)
+        return SessionInfo.model_validate(record) if record else None
+
+_session_manager: Optional[SessionManager] = None
+_session_manager_lock = threading.Lock()
+
+def get_session_manager() -> SessionManager:
+    """Return the process-wide session manager"""
+    global _session_manager
+    if _session_manager is None:
+        with _session_manager_lock:
+            if _session_manager is None:
+                _session_manager = SessionManager(get_session_store(), get_document_registry())
+    return _session_manager
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.services.session_store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+# Removes a batch of sessions; returns (ids removed, indexes deleted)
+RemoveSessions = Callable[[Sequence[str]], Tuple[List[str], int]]
+
+class SessionReaper:
+    """Background expiry and eviction of sessions
+
+    Candidates come straight off the store's created_at and last_access indexes in
+    expiry order, so a pass touches only what it removes. Three policies apply:
+    a fixed TTL from creation, an optional idle TTL, and least-recently-used
+    eviction down to MAX_SESSIONS. Removal happens in batches, each one short store
+    transaction followed by the slow index deletes outside it.
+    """
+
+    def __init__(self, store: SessionStore, remove_sessions: RemoveSessions, ttl: float,
+                 idle_ttl: float, max_sessions: int, interval: float, batch_size: int,
+                 clock: Callable[[], float] = time.time):
+        self.store = store
+        self.remove_sessions = remove_sessions
+        self.ttl = ttl
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.clock = clock  # Wall time, the scale of the store's created_at and last_access
+        self.runs = 0
+        self.expired = 0
+        self.idle = 0
+        self.evicted = 0
+        self.indexes_deleted = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _drain(self, candidates: Callable[[int], List[str]], limit: Optional[int] = None) -> int:
+        """Remove batches of candidates until none are left or limit sessions are gone"""
+        removed_total = 0
+        while limit is None or removed_total < limit:
+            size = self.batch_size if limit is None else min(self.batch_size, limit - removed_total)
+            session_ids = candidates(size)
+            if not session_ids:
+                break
+            removed, indexes_deleted = self.remove_sessions(session_ids)
+            with self._stats_lock:
+                self.indexes_deleted += indexes_deleted
+            removed_total += len(removed)
+            if not removed:
+                break  # A request removed them first; the next pass sees a fresh view
+        return removed_total
+
+    def reap(self) -> Dict[str, int]:
+        """One pass over every policy; returns how many sessions each removed"""
+        start = self.clock()
+        started = time.perf_counter()
+        expired = self._drain(lambda n: self.store.oldest(n, created_before=start - self.ttl))
+        idle = 0
+        if self.idle_ttl > 0:
+            idle = self._drain(lambda n: self.store.least_recent(n, accessed_before=start - self.idle_ttl))
+        evicted = 0
+        excess = self.store.count() - self.max_sessions
+        if excess > 0:
+            evicted = self._drain(self.store.least_recent, limit=excess)
+
+        with self._stats_lock:
+            self.runs += 1
+            self.expired += expired
+            self.idle += idle
+            self.evicted += evicted
+            self.last_run_at = start
+            self.last_run_seconds = time.perf_counter() - started
+        if expired or idle or evicted:
+            logger.info(f"Reaped sessions: {expired} expired, {idle} idle, {evicted} evicted")
+        return {"expired": expired, "idle": idle, "evicted": evicted}
+
+    def wake(self) -> None:
+        """Run the next pass now, e.g. when an upload finds the store full"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def run(self) -> None:
+        """Reap every interval until cancelled; passes run off the event loop"""
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.reap)
+            except Exception as e:
+                logger.error(f"Session reaper pass failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return {
+                "runs": self.runs,
+                "expired": self.expired,
+                "idle": self.idle,
+                "evicted": self.evicted,
+                "indexes_deleted": self.indexes_deleted,
+                "last_run_at": self.last_run_at,
+                "last_run_seconds": round(self.last_run_seconds, 4),
+            }
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+Record = Dict[str, Any]  # A serialised SessionInfo
+
+# Identifies this process's ingestion jobs; jobs recorded under another token predate it
+WORKER_TOKEN = uuid.uuid4().hex
+
+class SessionTransaction:
+    """Session reads and writes inside one write transaction of the store"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self.conn.execute(sql, params)
+
+    def get(self, session_id: str) -> Optional[Record]:
+        row = self.conn.execute(
+            "SELECT data, last_access FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return _decode(row) if row else None
+
+    def put(self, record: Record) -> None:
+        """Insert or replace a session; last_access is kept unless the record sets it"""
+        data = dict(record)
+        last_access = data.pop("last_access", None)
+        self.conn.execute(
+            "INSERT INTO sessions (session_id, collection_name, created_at, last_access, data) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET collection_name = excluded.collection_name, "
+            "data = excluded.data, last_access = COALESCE(?, sessions.last_access)",
+            (
+                data["session_id"], data.get("collection_name"), data["created_at"],
+                last_access or data["created_at"], json.dumps(data), last_access
+            )
+        )
+
+    def delete(self, session_id: str) -> Optional[Record]:
+        record = self.get(session_id)
+        if record is not None:
+            self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return record
+
+    def add_job(self, collection_name: str, doc_id: str) -> None:
+        """Claim a document's ingestion for this process"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ingestion_jobs (collection_name, doc_id, worker, started_at) "
+            "VALUES (?, ?, ?, ?)",
+            (collection_name, doc_id, WORKER_TOKEN, time.time())
+        )
+
+def _decode(row) -> Record:
+    record = json.loads(row[0])
+    record["last_access"] = row[1]
+    return record
+
+class SessionStore:
+    """Durable session registry in SQLite that survives restarts
+
+    Sessions are stored as JSON with indexed created_at, last_access and collection
+    columns. Writes that read first run in BEGIN IMMEDIATE transactions on one shared
+    connection. Reads go through a per-thread connection and see the last committed
+    snapshot (WAL), so they never wait for writers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()  # Guards the shared write connection
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; transactions are opened explicitly
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, collection_name TEXT, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL, data TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);"
+            "CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access);"
+            "CREATE INDEX IF NOT EXISTS idx_sessions_collection ON sessions(collection_name);"
+            "CREATE TABLE IF NOT EXISTS ingestion_jobs ("
+            "collection_name TEXT NOT NULL, doc_id TEXT NOT NULL, "
+            "worker TEXT NOT NULL, started_at REAL NOT NULL, PRIMARY KEY (collection_name, doc_id));"
+        )
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+        return conn
+
+    def query(self, sql: str, params=()) -> List[tuple]:
+        """Run a read against the latest committed snapshot"""
+        return self._reader().execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self) -> Iterator[SessionTransaction]:
+        """Write transaction; nested use on the same thread joins the outer one"""
+        with self._lock:
+            if self._conn.in_transaction:
+                yield SessionTransaction(self._conn)
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield SessionTransaction(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get(self, session_id: str) -> Optional[Record]:
+        return SessionTransaction(self._reader()).get(session_id)
+
+    def touch(self, session_id: str) -> None:
+        """Record an access; only the indexed column is written"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id)
+            )
+
+    def count(self) -> int:
+        return self.query("SELECT COUNT(*) FROM sessions")[0][0]
+
+    def list(self, limit: int, offset: int = 0) -> List[Record]:
+        """Sessions, newest first"""
+        rows = self.query(
+            "SELECT data, last_access FROM sessions ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        )
+        return [_decode(row) for row in rows]
+
+    def oldest(self, limit: int, created_before: Optional[float] = None) -> List[str]:
+        """Ids of the oldest sessions, optionally only those created before a cutoff"""
+        rows = self.query(
+            "SELECT session_id FROM sessions WHERE created_at < ? ORDER BY created_at LIMIT ?",
+            (created_before if created_before is not None else float("inf"), limit)
+        )
+        return [row[0] for row in rows]
+
+    def least_recent(self, limit: int, accessed_before: Optional[float] = None) -> List[str]:
+        """Ids of the least recently used sessions, optionally only those idle since a cutoff"""
+        rows = self.query(
+            "SELECT session_id FROM sessions WHERE last_access < ? ORDER BY last_access LIMIT ?",
+            (accessed_before if accessed_before is not None else float("inf"), limit)
+        )
+        return [row[0] for row in rows]
+
+    def scan(self, batch_size: int = 500) -> Iterator[Record]:
+        """Every session, in batches of fresh snapshots"""
+        last_id = ""
+        while True:
+            rows = self.query(
+                "SELECT data, last_access, session_id FROM sessions WHERE session_id > ? "
+                "ORDER BY session_id LIMIT ?",
+                (last_id, batch_size)
+            )
+            if not rows:
+                return
+            for row in rows:
+                yield _decode(row)
+            last_id = rows[-1][2]
+
+    def finish_job(self, collection_name: str, doc_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM ingestion_jobs WHERE collection_name = ? AND doc_id = ?", (collection_name, doc_id)
+            )
+
+    def stale_jobs(self) -> List[tuple]:
+        """(collection name, doc id) of ingestions an earlier run of the server left unfinished"""
+        rows = self.query("SELECT collection_name, doc_id FROM ingestion_jobs WHERE worker != ?", (WORKER_TOKEN,))
+        return [(collection_name, doc_id) for collection_name, doc_id in rows]
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide session store"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore(Config.SESSION_STORE_PATH)
+    return _session_store
@@ -0,0 +1,68 @@
+"""Chunking throughput micro-benchmark
+
+Usage (from backend/):
+    python -m benchmarks.bench_chunking --size-mb 8 --tokenizers chars words
+"""
+import argparse
+import random
+import time
+
+from processing.chunking import Chunker, get_tokenizer
+
+VOCABULARY = [
+    "attention", "model", "the", "of", "transformer", "layer", "encoder", "decoder",
+    "sequence", "token", "we", "and", "results", "table", "training", "is", "a", "in",
+]
+
+def synthetic_text(size_bytes: int, seed: int = 0) -> str:
+    """Paragraphs of sentences of random words, roughly like extracted PDF text"""
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < size_bytes:
+        sentences = []
+        for _ in range(rng.randint(2, 12)):
+            words = [rng.choice(VOCABULARY) for _ in range(rng.randint(6, 30))]
+            sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"]))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:size_bytes]
+
+def run(tokenizer_name: str, text: str, chunk_size: int, overlap: int, repeat: int) -> dict:
+    chunker = Chunker(get_tokenizer(tokenizer_name), chunk_size, overlap)
+    best = float("inf")
+    chunk_count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunk_count = len(chunker.split(text))
+        best = min(best, time.perf_counter() - started)
+    megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+    return {
+        "tokenizer": tokenizer_name,
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "chunks": chunk_count,
+        "seconds": round(best, 4),
+        "mb_per_s": round(megabytes / best, 2),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tokenizers", nargs="+", default=["chars", "words"],
+                        help="chars, words or tiktoken:<encoding>")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Defaults to 2000 chars or 400 tokens")
+    parser.add_argument("--overlap", type=int, default=None, help="Defaults to a fifth of the chunk size")
+    args = parser.parse_args()
+
+    text = synthetic_text(int(args.size_mb * 1024 * 1024))
+    print(f"{'tokenizer':<24}{'chunks':>10}{'seconds':>10}{'MB/s':>10}")
+    for tokenizer_name in args.tokenizers:
+        chunk_size = args.chunk_size or (2000 if tokenizer_name == "chars" else 400)
+        overlap = args.overlap if args.overlap is not None else chunk_size // 5
+        result = run(tokenizer_name, text, chunk_size, overlap, args.repeat)
+        print(f"{result['tokenizer']:<24}{result['chunks']:>10}{result['seconds']:>10}{result['mb_per_s']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Session store concurrency stress test: reads must not queue behind slow deletes
+
+Readers run on an asyncio event loop, as the API handlers do, listing and fetching
+sessions while writer threads update ingestion progress and deleter threads remove
+sessions and then spend --delete-ms on each (standing in for Chroma deletes). The
+"manager" mode is the SessionManager; "global-lock" puts every operation and the
+slow delete under one lock, as the original in-process registry did.
+
+Usage (from backend/):
+    python -m benchmarks.bench_sessions --sessions 2000 --duration 5 --delete-ms 200
+"""
+import argparse
+import asyncio
+import contextlib
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from app.services.document_registry import DocumentRegistry
+from app.services.session_manager import SessionManager
+from app.services.session_store import SessionStore
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def seed(manager: SessionManager, count: int) -> list:
+    session_ids = []
+    for i in range(count):
+        session_id = str(uuid.uuid4())
+        manager.create(session_id, f"doc-{i}.pdf", f"hash-{i}")
+        session_ids.append(session_id)
+    return session_ids
+
+def run(mode: str, args) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench-sessions-")
+    store = SessionStore(f"{directory}/sessions.sqlite3")
+    manager = SessionManager(store, DocumentRegistry(store, dedup_enabled=True))
+    session_ids = seed(manager, args.sessions)
+    guard = threading.Lock() if mode == "global-lock" else contextlib.nullcontext()
+
+    stop = threading.Event()
+    counts = {"updates": 0, "deleted": 0}
+    counts_lock = threading.Lock()
+
+    def writer(seed_value: int) -> None:
+        rng = random.Random(seed_value)
+        progress = 0
+        while not stop.is_set():
+            session_id = rng.choice(session_ids)
+            progress += 1
+            with guard:
+                manager.update_document(session_id, session_id, chunks_indexed=progress)
+            with counts_lock:
+                counts["updates"] += 1
+
+    def deleter() -> None:
+        while not stop.is_set():
+            with guard:
+                candidates = store.oldest(args.delete_batch)
+                removed, orphaned = manager.remove(candidates)
+                if mode == "global-lock":
+                    time.sleep(args.delete_ms / 1000 * len(orphaned))
+            if mode != "global-lock":
+                # Index deletes happen after the transaction, holding nothing
+                time.sleep(args.delete_ms / 1000 * len(orphaned))
+            with counts_lock:
+                counts["deleted"] += len(removed)
+            if not removed:
+                time.sleep(0.01)
+
+    async def readers() -> tuple:
+        read_latencies, loop_lags = [], []
+
+        async def ticker() -> None:
+            while not stop.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                loop_lags.append(time.perf_counter() - started - 0.005)
+
+        async def reader(seed_value: int) -> None:
+            rng = random.Random(seed_value)
+            while not stop.is_set():
+                started = time.perf_counter()
+                with guard:
+                    if rng.random() < 0.5:
+                        manager.list(100)
+                    else:
+                        manager.get(rng.choice(session_ids))
+                read_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(ticker())]
+        tasks += [asyncio.create_task(reader(i)) for i in range(args.readers)]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        return read_latencies, loop_lags
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=deleter) for _ in range(args.deleters)]
+    for thread in threads:
+        thread.start()
+    read_latencies, loop_lags = asyncio.run(readers())
+    for thread in threads:
+        thread.join()
+
+    return {
+        "mode": mode,
+        "reads": len(read_latencies),
+        "read_p50_ms": round(statistics.median(read_latencies) * 1000, 2),
+        "read_p99_ms": round(percentile(read_latencies, 0.99) * 1000, 2),
+        "read_max_ms": round(max(read_latencies) * 1000, 2),
+        "loop_lag_p99_ms": round(percentile(loop_lags, 0.99) * 1000, 2),
+        "updates_per_s": round(counts["updates"] / args.duration),
+        "deleted": counts["deleted"],
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per mode")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--deleters", type=int, default=2)
+    parser.add_argument("--delete-batch", type=int, default=5)
+    parser.add_argument("--delete-ms", type=float, default=200.0, help="Simulated cost of deleting one index")
+    parser.add_argument("--modes", nargs="+", default=["global-lock", "manager"])
+    args = parser.parse_args()
+
+    columns = ["reads", "read_p50_ms", "read_p99_ms", "read_max_ms", "loop_lag_p99_ms", "updates_per_s", "deleted"]
+    print(f"{'mode':<14}" + "".join(f"{column:>17}" for column in columns))
+    results = {}
+    for mode in args.modes:
+        results[mode] = run(mode, args)
+        print(f"{mode:<14}" + "".join(f"{results[mode][column]:>17}" for column in columns))
+
+    if "manager" in results:
+        # Head-of-line blocking would put whole simulated deletes into read latency
+        blocked = results["manager"]["read_p99_ms"] >= args.delete_ms / 2
+        print("head-of-line blocking:", "FOUND" if blocked else "none")
+        sys.exit(1 if blocked else 0)
+
+if __name__ == "__main__":
+    main()
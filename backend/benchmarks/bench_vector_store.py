@@ -0,0 +1,126 @@
+"""Quantized vector store against Chroma: recall@k, footprint and query latency
+
+Indexes the chunks of the suite's synthetic corpus, embedded with the fake
+embedding API's deterministic vectors, into a Chroma collection (the current
+path) and into quantized collections of each dtype with and without rescoring.
+Queries are corpus vectors with noise added, so each has a graded neighbourhood
+rather than one obvious match. Recall@k is measured against an exact float32
+scan; "resident" is what a search keeps mapped (Chroma's HNSW segment, or the
+quantized rows without the float32 copy read only for candidates).
+
+Usage (from backend/):
+    python -m benchmarks.bench_vector_store --chunks 20000 --queries 200 --k 12
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import chromadb
+import numpy as np
+
+from app.services.quantized_store import QuantizedVectorStore
+from benchmarks.bench_chunking import synthetic_text
+from benchmarks.fake_services import fake_embedding
+from processing.chunking import CharacterTokenizer, Chunker
+
+def corpus(chunks: int, dimension: int) -> tuple:
+    """(ids, documents, embeddings) of at least the requested number of chunks"""
+    chunker = Chunker(CharacterTokenizer(), 1000, 100)
+    documents: List[str] = []
+    seed = 0
+    while len(documents) < chunks:
+        documents.extend(chunker.split(synthetic_text(2 * 1024 * 1024, seed=seed)))
+        seed += 1
+    documents = documents[:chunks]
+    embeddings = np.array([fake_embedding(document, dimension) for document in documents], dtype=np.float32)
+    return [f"chunk-{i}" for i in range(chunks)], documents, embeddings
+
+def noisy_queries(embeddings: np.ndarray, count: int, noise: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = embeddings[rng.choice(len(embeddings), size=count, replace=False)]
+    queries = picks + noise * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(picks.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def exact_top_k(embeddings: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    distances = (queries * queries).sum(axis=1)[:, None] + (embeddings * embeddings).sum(axis=1) - 2 * queries @ embeddings.T
+    return [set(np.argsort(row, kind="stable")[:k].tolist()) for row in distances]
+
+def directory_bytes(path: str, names=None) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files if names is None or f in names)
+    return total
+
+def measure(collection, queries: np.ndarray, k: int, truth: List[set]) -> Dict[str, float]:
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=["distances"])
+        latencies.append(time.perf_counter() - started)
+        found = {int(chunk_id.split("-")[1]) for chunk_id in result["ids"][0]}
+        recalls.append(len(found & expected) / k)
+    return {"recall": round(statistics.mean(recalls), 4),
+            "query_p50_ms": round(statistics.median(latencies) * 1000, 2)}
+
+def add_in_batches(collection, ids, documents, embeddings, batch_size: int) -> None:
+    for start in range(0, len(ids), batch_size):
+        collection.add(ids=ids[start:start + batch_size], documents=documents[start:start + batch_size],
+                       metadatas=[{"doc_id": "bench"}] * len(ids[start:start + batch_size]),
+                       embeddings=embeddings[start:start + batch_size].tolist())
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=12, help="Results per query, as RETRIEVAL_TOP_K")
+    parser.add_argument("--noise", type=float, default=1.0, help="Query noise relative to a unit vector")
+    parser.add_argument("--rescore-candidates", type=int, default=4)
+    args = parser.parse_args()
+
+    ids, documents, embeddings = corpus(args.chunks, args.dimension)
+    queries = noisy_queries(embeddings, args.queries, args.noise)
+    truth = exact_top_k(embeddings, queries, args.k)
+    workdir = tempfile.mkdtemp(prefix="bench-vectors-")
+    rows = {}
+    try:
+        client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+        collection = client.get_or_create_collection("bench-chroma", embedding_function=None)
+        add_in_batches(collection, ids, documents, embeddings, 1000)
+        measure(collection, queries[:5], args.k, truth[:5])  # Load the HNSW index before timing
+        segments = [entry.path for entry in os.scandir(os.path.join(workdir, "chroma")) if entry.is_dir()]
+        rows["chroma"] = {
+            **measure(collection, queries, args.k, truth),
+            "disk_bytes": directory_bytes(os.path.join(workdir, "chroma")),
+            "resident_bytes": sum(directory_bytes(path, {"data_level0.bin", "link_lists.bin"}) for path in segments),
+        }
+
+        for dtype in ("float16", "int8"):
+            for rescore in (False, True):
+                store = QuantizedVectorStore(os.path.join(workdir, f"{dtype}-{rescore}"), dtype, rescore,
+                                             args.rescore_candidates)
+                quantized = store.open("bench")
+                add_in_batches(quantized, ids, documents, embeddings, 1000)
+                rows[f"{dtype}{'+rescore' if rescore else ''}"] = {
+                    **measure(quantized, queries, args.k, truth),
+                    "disk_bytes": store.disk_bytes("bench"),
+                    "resident_bytes": os.path.getsize(os.path.join(quantized.directory, "vectors.bin")),
+                }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.chunks} chunks x {args.dimension} dims, {args.queries} queries, recall@{args.k} vs exact float32")
+    columns = ["recall", "query_p50_ms", "disk_mb", "resident_mb", "resident_vs_chroma"]
+    print(f"{'store':<18}" + "".join(f"{column:>20}" for column in columns))
+    for name, row in rows.items():
+        row["disk_mb"] = round(row["disk_bytes"] / 2 ** 20, 1)
+        row["resident_mb"] = round(row["resident_bytes"] / 2 ** 20, 1)
+        row["resident_vs_chroma"] = f"{row['resident_bytes'] / rows['chroma']['resident_bytes']:.2f}x"
+        print(f"{name:<18}" + "".join(f"{row[column]:>20}" for column in columns))
+
+if __name__ == "__main__":
+    main()
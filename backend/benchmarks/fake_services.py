@@ -0,0 +1,151 @@
+"""Local stand-ins for the OpenRouter chat API and the Google embedding API
+
+Both speak just enough of the real protocols for the backend's clients:
+batchEmbedContents returns deterministic unit vectors after a configurable delay,
+and chat/completions streams SSE deltas after a configurable time to first token
+at a configurable token rate. Point GOOGLE_API_BASE at <url>/v1beta/ and
+OPENROUTER_API_BASE at <url>/ to use them.
+
+Usage (from backend/), to run them on their own:
+    python -m benchmarks.fake_services --port 18999 --ttft 0.3 --tokens-per-second 50
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ANSWER_WORDS = ["The", " document", " describes", " this", " in", " detail", ",", " see", " page", " 3", "."]
+
+def fake_embedding(text: str, dimension: int) -> list:
+    """Unit vector seeded by the text, so identical texts embed identically"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "ThreadingHTTPServer"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: str) -> None:
+        encoded = data.encode()
+        self.wfile.write(b"%x\r\n" % len(encoded) + encoded + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        self._send_json({"data": [{"id": "fake/model"}]})
+
+    def do_POST(self) -> None:
+        services: FakeServices = self.server.services
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.split("?")[0].endswith(":batchEmbedContents"):
+            services.count("embedding_requests")
+            services.count("embedded_texts", len(body.get("requests", [])))
+            time.sleep(services.embedding_latency)
+            self._send_json({"embeddings": [
+                {"values": fake_embedding(request["content"]["parts"][0]["text"], services.embedding_dimension)}
+                for request in body.get("requests", [])
+            ]})
+        elif self.path.endswith("chat/completions"):
+            services.count("chat_requests")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            time.sleep(services.ttft)
+            interval = 1 / services.tokens_per_second if services.tokens_per_second > 0 else 0
+            for i in range(services.answer_tokens):
+                if i:
+                    time.sleep(interval)
+                delta = {"choices": [{"delta": {"content": ANSWER_WORDS[i % len(ANSWER_WORDS)]}}]}
+                self._write_chunk(f"data: {json.dumps(delta)}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send_json({"error": f"Unknown path {self.path}"}, status=404)
+
+class FakeServices:
+    """Both fake APIs on one local port, served from a background thread"""
+
+    def __init__(self, port: int = 0, embedding_latency: float = 0.05, embedding_dimension: int = 768,
+                 ttft: float = 0.3, tokens_per_second: float = 50.0, answer_tokens: int = 100):
+        self.embedding_latency = embedding_latency
+        self.embedding_dimension = embedding_dimension
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.counts = {"embedding_requests": 0, "embedded_texts": 0, "chat_requests": 0}
+        self._counts_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.services = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-services", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._counts_lock:
+            self.counts[name] += amount
+
+    def environment(self) -> dict:
+        """Settings that point the backend at these services"""
+        return {
+            "GOOGLE_API_BASE": f"{self.url}/v1beta/",
+            "GOOGLE_API_KEY": "fake",
+            "OPENROUTER_API_BASE": f"{self.url}/",
+            "OPENROUTER_API_KEY": "fake",
+        }
+
+    def start(self) -> "FakeServices":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeServices":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=18999)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per embedding request")
+    parser.add_argument("--embedding-dimension", type=int, default=768)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Seconds before the first answer token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=100)
+    args = parser.parse_args()
+
+    services = FakeServices(args.port, args.embedding_latency, args.embedding_dimension,
+                            args.ttft, args.tokens_per_second, args.answer_tokens)
+    print(f"Serving fake APIs on {services.url}")
+    for name, value in services.environment().items():
+        print(f"  {name}={value}")
+    try:
+        services._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Offline end-to-end benchmark suite, written to JSON for comparison between commits
+
+Runs the backend's own code against local fake OpenRouter and embedding APIs
+(benchmarks.fake_services) and synthetic PDFs (benchmarks.synthetic_pdf):
+
+    chunk_text      PDFProcessor._chunk_text throughput in MB/s
+    process_pdf     PDFProcessor.process_pdf pages/s per document size
+    process_upload  documents and pages/s from process_upload until every upload is active
+    chat            time to first token of stream_chat_responses, against the fake's configured TTFT
+
+Every setting is fixed before the backend is imported, so caches are off and all
+state lives in a temporary directory.
+
+Usage (from backend/):
+    python -m benchmarks.run_suite --output results.json
+    python -m benchmarks.run_suite --pages 1 10 100 1000 --output results.json
+    python -m benchmarks.run_suite --compare baseline.json results.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.fake_services import FakeServices
+
+# Metrics where a larger value is better; every other timing is better smaller
+HIGHER_IS_BETTER = ("_per_s",)
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def configure_backend(services: FakeServices, workdir: str, args) -> None:
+    """Environment for the backend; must run before anything imports config"""
+    os.environ.update(services.environment())
+    os.environ.update({
+        "CHROMA_PATH": os.path.join(workdir, "chroma"),
+        "PDF_UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "QUERY_CACHE_ENABLED": "false",
+        "ANSWER_CACHE_ENABLED": "false",
+        "DOCUMENT_DEDUP_ENABLED": "false",
+        "LOG_LEVEL": args.log_level,
+        "EMBEDDING_MODEL": args.embedding_model,
+    })
+
+def bench_chunk_text(args) -> dict:
+    from benchmarks.bench_chunking import synthetic_text
+    from processing.pdf_processor import PDFProcessor
+
+    text = synthetic_text(int(args.chunk_mb * 1024 * 1024))
+    processor = PDFProcessor()
+    best, chunks = float("inf"), 0
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        chunks = len(processor._chunk_text(text))
+        best = min(best, time.perf_counter() - started)
+    megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+    return {"megabytes": round(megabytes, 2), "chunks": chunks, "seconds": round(best, 4),
+            "mb_per_s": round(megabytes / best, 2)}
+
+def bench_process_pdf(args, workdir: str) -> List[dict]:
+    from benchmarks.synthetic_pdf import write_pdf
+    from processing.pdf_processor import PDFProcessor
+
+    results = []
+    for pages in args.pages:
+        path = write_pdf(os.path.join(workdir, f"process-{pages}.pdf"), pages)
+        best, chunks = float("inf"), 0
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            chunks = len(PDFProcessor().process_pdf(path, os.path.basename(path)))
+            best = min(best, time.perf_counter() - started)
+        results.append({"pages": pages, "chunks": chunks, "seconds": round(best, 3),
+                        "pages_per_s": round(pages / best, 2)})
+    return results
+
+async def bench_process_upload(args, workdir: str) -> tuple:
+    """Upload args.uploads distinct documents at once; returns (results, ids of active sessions)"""
+    import main
+    from benchmarks.synthetic_pdf import write_pdf
+
+    spooled = []
+    for i in range(args.uploads):
+        source = write_pdf(os.path.join(workdir, f"upload-{i}.pdf"), args.upload_pages, seed=i)
+        # process_upload takes ownership of the spooled file and deletes it after parsing
+        path = shutil.copy(source, os.path.join(main.Config.PDF_UPLOAD_DIR, f"bench-{i}.pdf"))
+        with open(path, "rb") as pdf:
+            spooled.append((path, hashlib.sha256(pdf.read()).hexdigest()))
+
+    started = time.perf_counter()
+    session_ids = await asyncio.gather(*(
+        main.process_upload(path, os.path.basename(path), content_hash) for path, content_hash in spooled
+    ))
+    accepted = time.perf_counter() - started
+    pending = set(session_ids)
+    failed = 0
+    while pending:
+        await asyncio.sleep(0.05)
+        for session_id in list(pending):
+            session_info = main.session_manager.get(session_id)
+            if session_info is None or session_info.status != "processing":
+                pending.discard(session_id)
+                failed += session_info is None or session_info.status != "active"
+    elapsed = time.perf_counter() - started
+
+    results = {
+        "documents": args.uploads,
+        "pages_per_document": args.upload_pages,
+        "failed": failed,
+        "accept_seconds": round(accepted, 4),
+        "seconds": round(elapsed, 3),
+        "documents_per_s": round(args.uploads / elapsed, 3),
+        "pages_per_s": round(args.uploads * args.upload_pages / elapsed, 2),
+    }
+    return results, [session_id for session_id in session_ids if main.session_manager.get(session_id)]
+
+async def bench_chat(args, session_id: str, services: FakeServices) -> dict:
+    import main
+
+    async def first_token() -> float:
+        request = main.ChatRequest(question=args.question, session_id=session_id)
+        started = time.perf_counter()
+        ttft = None
+        async for message in main.stream_chat_responses(request):
+            if ttft is None and message.startswith("event: token"):
+                ttft = time.perf_counter() - started
+            elif message.startswith("event: error"):
+                raise RuntimeError(f"Chat failed: {message.strip()}")
+        if ttft is None:
+            raise RuntimeError("Chat stream ended without a token")
+        return ttft
+
+    await first_token()  # Warm up the connection pool and collection handle
+    ttfts = []
+    for start in range(0, args.chats, args.chat_concurrency):
+        batch = min(args.chat_concurrency, args.chats - start)
+        ttfts.extend(await asyncio.gather(*(first_token() for _ in range(batch))))
+    return {
+        "requests": len(ttfts),
+        "concurrency": args.chat_concurrency,
+        "ttft_p50_ms": round(statistics.median(ttfts) * 1000, 1),
+        "ttft_p95_ms": round(percentile(ttfts, 0.95) * 1000, 1),
+        # Time the backend adds before the upstream's own first token
+        "overhead_p50_ms": round((statistics.median(ttfts) - services.ttft) * 1000, 1),
+    }
+
+async def bench_service_paths(args, workdir: str, services: FakeServices) -> dict:
+    from app.services.openrouter_client import close_openrouter_client
+
+    results = {}
+    try:
+        results["process_upload"], session_ids = await bench_process_upload(args, workdir)
+        if session_ids and args.chats:
+            results["chat"] = await bench_chat(args, session_ids[0], services)
+    finally:
+        await close_openrouter_client()
+    return results
+
+def flatten(results: dict) -> Dict[str, float]:
+    """Numeric results by dotted name; per-size lists are keyed by their page count"""
+    flat = {}
+    for benchmark, value in results.items():
+        entries = value if isinstance(value, list) else [value]
+        for entry in entries:
+            prefix = f"{benchmark}[{entry['pages']}]" if "pages" in entry and isinstance(value, list) else benchmark
+            for name, number in entry.items():
+                if isinstance(number, (int, float)) and not isinstance(number, bool):
+                    flat[f"{prefix}.{name}"] = number
+    return flat
+
+def compare(baseline_path: str, current_path: str, tolerance: float) -> int:
+    """Print timing and throughput changes; returns the number of regressions beyond tolerance"""
+    with open(baseline_path) as baseline_file, open(current_path) as current_file:
+        baseline, current = json.load(baseline_file), json.load(current_file)
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    print(f"{baseline.get('commit', '?')} -> {current.get('commit', '?')}")
+    regressions = 0
+    for name in sorted(old.keys() & new.keys()):
+        higher_is_better = name.endswith(HIGHER_IS_BETTER)
+        if not (higher_is_better or name.endswith(("seconds", "_ms"))) or not old[name]:
+            continue
+        change = (new[name] - old[name]) / abs(old[name])
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:<40}{old[name]:>12}{new[name]:>12}{change:>+10.1%}{flag}")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two result files instead of running; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change reported as a regression")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per micro-benchmark; the best is kept")
+    parser.add_argument("--chunk-mb", type=float, default=4.0)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100], help="Document sizes for process_pdf")
+    parser.add_argument("--uploads", type=int, default=4, help="Documents uploaded concurrently")
+    parser.add_argument("--upload-pages", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--chat-concurrency", type=int, default=1)
+    parser.add_argument("--question", default="What does the document say about the encoder and decoder layers?")
+    parser.add_argument("--embedding-model", default="embedding-001",
+                        help="local:<sentence-transformers model> embeds in-process instead of via the fake API")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Fake seconds per embedding request")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Fake upstream seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake upstream token rate")
+    parser.add_argument("--answer-tokens", type=int, default=50)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.tolerance) else 0)
+
+    services = FakeServices(embedding_latency=args.embedding_latency, ttft=args.ttft,
+                            tokens_per_second=args.tokens_per_second, answer_tokens=args.answer_tokens)
+    workdir = tempfile.mkdtemp(prefix="bench-suite-")
+    configure_backend(services, workdir, args)
+    results = {}
+    with services:
+        try:
+            results["chunk_text"] = bench_chunk_text(args)
+            results["process_pdf"] = bench_process_pdf(args, workdir)
+            results.update(asyncio.run(bench_service_paths(args, workdir, services)))
+        finally:
+            from processing.pdf_processor import shutdown_parse_pool
+            shutdown_parse_pool()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        "fake_service_calls": services.counts,
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    for name, value in flatten(results).items():
+        print(f"{name:<40}{value:>12}")
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Synthetic text PDFs of any page count, written directly without a PDF library
+
+Pages hold wrapped paragraphs of the same random prose bench_chunking uses, so
+parsing and chunking see realistic sentence and paragraph breaks.
+
+Usage (from backend/):
+    python -m benchmarks.synthetic_pdf --pages 100 --output /tmp/synthetic-100.pdf
+"""
+import argparse
+import random
+import textwrap
+from typing import List
+
+from benchmarks.bench_chunking import synthetic_text
+
+LINES_PER_PAGE = 60
+LINE_WIDTH = 95  # Characters of 10pt Helvetica that fit a US Letter page with margins
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def page_lines(pages: int, seed: int = 0) -> List[List[str]]:
+    """Wrapped lines for each page, paragraphs separated by blank lines"""
+    rng = random.Random(seed)
+    # Roughly what LINES_PER_PAGE lines of LINE_WIDTH hold, generated once and wrapped
+    text = synthetic_text(pages * LINES_PER_PAGE * LINE_WIDTH, seed=rng.randrange(1 << 30))
+    lines: List[str] = []
+    for paragraph in text.split("\n\n"):
+        lines.extend(textwrap.wrap(paragraph, LINE_WIDTH))
+        lines.append("")
+    while len(lines) < pages * LINES_PER_PAGE:
+        lines.extend(lines[:pages * LINES_PER_PAGE - len(lines)])
+    return [lines[i * LINES_PER_PAGE:(i + 1) * LINES_PER_PAGE] for i in range(pages)]
+
+def write_pdf(path: str, pages: int, seed: int = 0) -> str:
+    """Write a text PDF with the given number of pages and return its path"""
+    if pages < 1:
+        raise ValueError("A PDF needs at least one page")
+    objects: List[bytes] = []  # Object n is objects[n - 1]
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page_id, lines in zip(page_ids, page_lines(pages, seed)):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        stream = "BT /F1 10 Tf 12 TL 50 750 Td\n" + "".join(f"({_escape(line)}) '\n" for line in lines) + "ET"
+        stream_bytes = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream_bytes) + stream_bytes + b"\nendstream")
+
+    with open(path, "wb") as pdf:
+        pdf.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(pdf.tell())
+            pdf.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref_offset = pdf.tell()
+        pdf.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            pdf.write(b"%010d 00000 n \n" % offset)
+        pdf.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return path
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=10, help="1 to 1000 pages are typical")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    print(write_pdf(args.output, args.pages, args.seed))
+
+if __name__ == "__main__":
+    main()
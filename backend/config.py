@@ -14,33 +14,105 @@ class Config:
     OPENROUTER_API_BASE = os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1/")
     SITE_URL = os.getenv("SITE_URL", "http://localhost:3000")
     SITE_NAME = os.getenv("SITE_NAME", "Multimodal RAG Assistant")
+    OPENROUTER_HTTP2 = os.getenv("OPENROUTER_HTTP2", "true").lower() == "true"
+    OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "200"))  # Shared pool for all chat streams
+    OPENROUTER_MAX_KEEPALIVE = int(os.getenv("OPENROUTER_MAX_KEEPALIVE", "50"))
+    OPENROUTER_KEEPALIVE_EXPIRY = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "30"))  # Seconds
     
     # Model Configuration (OpenRouter format)
     CHAT_MODEL = os.getenv("CHAT_MODEL", "google/gemini-2.5-flash-lite-preview-06-17")
     
     # For embeddings, we'll use Google's direct API (OpenRouter doesn't support embeddings)
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embedding-001")
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embedding-001")  # Google model, or local:<sentence-transformers model>
+    GOOGLE_API_BASE = os.getenv("GOOGLE_API_BASE", "https://generativelanguage.googleapis.com/v1beta/")
+    EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "0"))  # Google vector size if known; 0 learns it from the first response
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))  # Texts per batchEmbedContents request (API max 100)
+    EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))  # Batches in flight at once
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))  # Retries on 429/5xx and connection errors
+    EMBEDDING_BACKOFF_FACTOR = float(os.getenv("EMBEDDING_BACKOFF_FACTOR", "0.5"))  # Exponential backoff base (seconds)
+    EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "30"))  # Per-request timeout (seconds)
+    LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))  # Texts per in-process inference batch
+    LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "2"))  # Batches encoded at once
+    LOCAL_EMBEDDING_DEVICE = os.getenv("LOCAL_EMBEDDING_DEVICE", "cpu")
 
     # File storage
     PDF_UPLOAD_DIR = os.getenv("PDF_UPLOAD_DIR", "./uploads")
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "2000"))  # Increased from 1000 for better context
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "400"))  # Increased from 100 for better continuity
-    CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma")
+    CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "chars")  # Unit of CHUNK_SIZE/CHUNK_OVERLAP: chars, words or tiktoken:<encoding>
+    CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma")  # Served by one API process only: Chroma is not multi-process safe
+    CHROMA_COLLECTION_CACHE_SIZE = int(os.getenv("CHROMA_COLLECTION_CACHE_SIZE", "256"))  # Cached collection handles
+    VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")  # "chroma", or "quantized" for compact memory-mapped vectors
+    VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", os.path.join(CHROMA_PATH, "vectors"))
+    VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "int8")  # int8 or float16; fixed per collection at creation
+    # Re-rank against float32 copies: exact top results, but more than double the disk of an int8 collection
+    VECTOR_STORE_RESCORE = os.getenv("VECTOR_STORE_RESCORE", "false").lower() == "true"
+    VECTOR_STORE_RESCORE_CANDIDATES = int(os.getenv("VECTOR_STORE_RESCORE_CANDIDATES", "4"))  # Candidates re-ranked per result
+    VECTOR_STORE_COMPACT_RATIO = float(os.getenv("VECTOR_STORE_COMPACT_RATIO", "0.25"))  # Deleted share of rows that triggers a rewrite
+
+    # Embedding cache (shared across sessions, keyed by model/task/text hash)
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(CHROMA_PATH, "embedding_cache.sqlite3"))
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))  # LRU bound
     
     # Enhanced retrieval parameters
     RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "12"))  # Retrieve more candidates
     DISTANCE_THRESHOLD = float(os.getenv("DISTANCE_THRESHOLD", "0.75"))  # More lenient threshold
     MIN_CHUNK_LENGTH = int(os.getenv("MIN_CHUNK_LENGTH", "100"))  # Filter out very short chunks
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # Prompt tokens spent on retrieved chunks
+    CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "tiktoken:cl100k_base")  # Counts the budget: chars, words or tiktoken:<encoding>
+    LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(CHROMA_PATH, "lexical"))  # BM25 indexes
+    LEXICAL_INDEX_CACHE_SIZE = int(os.getenv("LEXICAL_INDEX_CACHE_SIZE", "256"))  # Indexes kept in memory
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "fused")  # "fused" (one query embedding) or "dual_query" (legacy)
+
+    # Query result cache (per session, keyed on the normalized question)
+    QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))  # Seconds
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "128"))  # Questions per session
+    QUERY_CACHE_MAX_SESSIONS = int(os.getenv("QUERY_CACHE_MAX_SESSIONS", "1000"))
+    QUERY_CACHE_SEMANTIC = os.getenv("QUERY_CACHE_SEMANTIC", "false").lower() == "true"  # Match similar questions
+    QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.95"))  # Cosine similarity threshold
+
+    # LLM answer cache (replayed over SSE for identical deterministic requests)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    ANSWER_CACHE_MAX_MB = int(os.getenv("ANSWER_CACHE_MAX_MB", "64"))  # Total size of cached answers
+    ANSWER_CACHE_MAX_TEMPERATURE = float(os.getenv("ANSWER_CACHE_MAX_TEMPERATURE", "0.2"))  # Only cache at or below
+    ANSWER_CACHE_REPLAY_DELAY = float(os.getenv("ANSWER_CACHE_REPLAY_DELAY", "0"))  # Seconds between replayed tokens
 
     # Server configuration
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+    # Prometheus metrics at /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Readiness probing (background; /ready serves the cached results)
+    HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))  # Seconds between probes
+    HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))  # Seconds before a check counts as failed
+
     # Rate limiting
     RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
     RATE_LIMIT_PERIOD = int(os.getenv("RATE_LIMIT_PERIOD", "60"))
 
+    # Sessions (persisted in SQLite; survive restarts)
+    SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", os.path.join(CHROMA_PATH, "sessions.sqlite3"))
+    MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000"))  # Least recently used sessions are evicted beyond this
+    SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 60 * 60)))  # Seconds from creation until a session expires
+    SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "0"))  # Seconds without a chat until expiry; 0 disables
+    SESSION_REAPER_INTERVAL = float(os.getenv("SESSION_REAPER_INTERVAL", "60"))  # Seconds between reaper passes
+    SESSION_REAPER_BATCH_SIZE = int(os.getenv("SESSION_REAPER_BATCH_SIZE", "100"))  # Sessions removed per store transaction
+
+    # Background ingestion
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))  # Concurrent document ingestion jobs
+    DOCUMENT_DEDUP_ENABLED = os.getenv("DOCUMENT_DEDUP_ENABLED", "true").lower() == "true"  # Reuse the index of identical uploads
+    MAX_DOCUMENTS_PER_SESSION = int(os.getenv("MAX_DOCUMENTS_PER_SESSION", "200"))  # Documents one session can hold
+    INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "2"))  # Parsed page ranges buffered ahead of embedding
+    PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))  # Parse processes; <=1 disables
+    PDF_PAGE_RANGE_SIZE = int(os.getenv("PDF_PAGE_RANGE_SIZE", "25"))  # Pages per parallel parse task
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50"))  # Smaller documents parse in one pass, in-process
+
     # File upload limits
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "50"))  # MB
     ALLOWED_EXTENSIONS = [".pdf"]
@@ -50,7 +122,7 @@ class Config:
         """Validate required configuration"""
         if not cls.OPENROUTER_API_KEY:
             raise ValueError("OPENROUTER_API_KEY is required")
-        if not cls.GOOGLE_API_KEY:
+        if not cls.GOOGLE_API_KEY and not cls.EMBEDDING_MODEL.startswith("local:"):
             raise ValueError("GOOGLE_API_KEY is required for embeddings")
         
         # Create directories if they don't exist
@@ -1,35 +1,59 @@
-from fastapi import FastAPI, UploadFile, BackgroundTasks, HTTPException, Depends, status, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Depends, status, Request, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from pydantic import BaseModel, Field, field_validator
-from processing.pdf_processor import PDFProcessor
-from app.services.chroma_service import ChromaDB
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+from processing.pdf_processor import PDFProcessor, shutdown_parse_pool
+from app.services.chroma_service import EmbeddingMismatchError, claim_chroma_path, get_chroma
+from app.services.retrieval import HybridRetriever
+from app.services.lexical_index import get_lexical_index_store
+from app.services.document_registry import get_document_registry
+from app.services.session_store import get_session_store
+from app.services.session_reaper import SessionReaper
+from app.services.health_prober import HealthProber
+from app.services.context_assembler import ContextPiece, get_context_assembler
+from app.services.embedding_cache import get_embedding_cache
+from app.services.embedding_provider import EmbeddingError
+from app.services.metrics import (
+    ACTIVE_STREAMS, CHAT_STAGE_SECONDS, CHAT_TOKENS_PER_SECOND, CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    INGEST_DOCUMENTS, INGEST_STAGE_SECONDS, CallbackMetric, render as render_metrics
+)
+from app.services.session_manager import InvalidTransition, get_session_manager, session_collection
+from app.schemas.schemas import DocumentChunk, DocumentInfo, SessionInfo
+from app.services.query_cache import get_query_cache
+from app.services.answer_cache import AnswerCache, get_answer_cache
+from app.services.openrouter_client import OpenRouterAPIError, get_openrouter_client, close_openrouter_client
 import uuid
 import logging
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, NamedTuple, Optional, Sequence
 import os
 import time
 import tempfile
 from config import Config
-import requests
+import httpx
 from contextlib import asynccontextmanager
 import json
 import hashlib
 import re
 from datetime import datetime, timedelta
 import threading
-import gc
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
 # Setup configuration and logging
 Config.validate_config()
 Config.setup_logging()
 logger = logging.getLogger(__name__)
 
+STARTED_AT = time.time()
+
 # Rate limiter setup
 limiter = Limiter(key_func=get_remote_address)
 
@@ -39,9 +63,21 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Document AI Assistant API")
     Config.validate_config()
     logger.info("Configuration validated successfully")
+    claim_chroma_path()
+    try:
+        await asyncio.to_thread(reconcile_sessions)
+    except Exception as e:
+        logger.error(f"Session reconciliation failed: {e}")
+    reaper_task = asyncio.create_task(session_reaper.run())
+    prober_task = asyncio.create_task(health_prober.run())
     yield
     # Shutdown logic (if any)
     logger.info("Shutting down Document AI Assistant API")
+    reaper_task.cancel()
+    prober_task.cancel()
+    ingestion_executor.shutdown(wait=False, cancel_futures=True)
+    shutdown_parse_pool()
+    await close_openrouter_client()
 
 app = FastAPI(
     title="Document AI Assistant API",
@@ -74,9 +110,12 @@ class ErrorResponse(BaseModel):
     error_code: Optional[str] = None
     timestamp: float = Field(default_factory=time.time)
 
+UUID_PATTERN = r'^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$'
+
 class ChatRequest(BaseModel):
     question: str = Field(..., min_length=1, max_length=1000, description="Question to ask about the document")
     session_id: str = Field(..., min_length=1, max_length=100, description="Session ID from document upload")
+    doc_ids: Optional[List[str]] = Field(None, max_length=200, description="Restrict retrieval to these documents of the session")
 
     @field_validator('question')
     @classmethod
@@ -93,10 +132,17 @@ class ChatRequest(BaseModel):
     @classmethod
     def validate_session_id(cls, v: str) -> str:
         # Validate UUID format to prevent injection
-        if not re.match(r'^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$', v):
+        if not re.match(UUID_PATTERN, v):
             raise ValueError('Invalid session ID format')
         return v
 
+    @field_validator('doc_ids')
+    @classmethod
+    def validate_doc_ids(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        if v is not None and not all(re.match(UUID_PATTERN, doc_id) for doc_id in v):
+            raise ValueError('Invalid document ID format')
+        return v
+
 class ChatResponse(BaseModel):
     answer: str
     sources: Optional[List[str]] = None
@@ -110,68 +156,212 @@ class UploadResponse(BaseModel):
     chunk_count: int
     processing_time: float
 
-class SessionInfo(BaseModel):
+class DocumentUploadResponse(BaseModel):
     session_id: str
+    doc_id: str
+    status: str
     filename: str
-    created_at: float
-    chunk_count: int
+    processing_time: float
+
+class IngestionStatus(BaseModel):
+    session_id: str
     status: str
+    pages_total: int
+    pages_parsed: int
+    chunk_count: int
+    chunks_embedded: int
+    chunks_indexed: int
+    error: Optional[str] = None
+    elapsed: float
+    documents: List[DocumentInfo] = []
 
-# Session management with thread-safe operations and automatic cleanup
-active_sessions: Dict[str, SessionInfo] = {}
-session_lock = threading.Lock()
-MAX_SESSIONS = 100  # Prevent memory exhaustion
-
-def cleanup_old_sessions():
-    """Clean up sessions older than 24 hours"""
-    cutoff_time = time.time() - (24 * 60 * 60)  # 24 hours ago
-    with session_lock:
-        sessions_to_remove = [
-            session_id for session_id, session_info in active_sessions.items()
-            if session_info.created_at < cutoff_time
-        ]
-        for session_id in sessions_to_remove:
-            try:
-                chroma = ChromaDB()
-                chroma.delete_collection(session_id)
-                del active_sessions[session_id]
-                logger.info(f"Cleaned up old session: {session_id}")
-            except Exception as e:
-                logger.warning(f"Failed to cleanup session {session_id}: {e}")
-    
-    # Force garbage collection
-    gc.collect()
-
-def add_session(session_info: SessionInfo):
-    """Add session with automatic cleanup if needed"""
-    with session_lock:
-        # If we're at max capacity, clean up old sessions
-        if len(active_sessions) >= MAX_SESSIONS:
-            cleanup_old_sessions()
-        
-        # If still at capacity, remove oldest session
-        if len(active_sessions) >= MAX_SESSIONS:
-            oldest_session = min(active_sessions.items(), key=lambda x: x[1].created_at)
-            try:
-                chroma = ChromaDB()
-                chroma.delete_collection(oldest_session[0])
-                del active_sessions[oldest_session[0]]
-                logger.info(f"Removed oldest session: {oldest_session[0]}")
-            except Exception as e:
-                logger.warning(f"Failed to remove oldest session: {e}")
-        
-        active_sessions[session_info.session_id] = session_info
+# Sessions live in a SQLite store so they survive restarts; the session manager
+# owns their state changes. One server process serves a CHROMA_PATH (claim_chroma_path).
+# Expiry and eviction are left to the background session reaper.
+session_manager = get_session_manager()
+
+# Document ingestion runs off the event loop so one large PDF cannot stall other requests
+ingestion_executor = ThreadPoolExecutor(
+    max_workers=Config.INGESTION_WORKERS,
+    thread_name_prefix="ingestion"
+)
+
+def delete_session_data(collection_name: str) -> None:
+    """Drop a document's vector collection, lexical index and cached query results"""
+    try:
+        get_chroma().delete_collection(collection_name)
+    finally:
+        get_lexical_index_store().delete(collection_name)
+        query_cache = get_query_cache()
+        if query_cache is not None:
+            query_cache.invalidate(collection_name)
+
+def remove_sessions(session_ids: Sequence[str]) -> tuple[List[str], int]:
+    """Delete a batch of sessions and the indexes they held the last reference to
+
+    Returns the ids that were removed and the number of indexes deleted. The store
+    rows go in one short transaction; the slow index deletes happen after it.
+    """
+    removed, orphaned = session_manager.remove(session_ids)
+    deleted = 0
+    for collection_name in orphaned:
+        try:
+            delete_session_data(collection_name)
+            deleted += 1
+        except Exception as e:
+            # Left for startup reconciliation, which deletes unreferenced indexes
+            logger.warning(f"Failed to delete index {collection_name[:8]}...: {e}")
+    return removed, deleted
+
+def remove_session(session_id: str) -> bool:
+    """Delete one session; False if it did not exist"""
+    removed, _ = remove_sessions([session_id])
+    return bool(removed)
+
+# Expires and evicts sessions in the background; started by lifespan
+session_reaper = SessionReaper(
+    get_session_store(),
+    remove_sessions,
+    ttl=Config.SESSION_TTL,
+    idle_ttl=Config.SESSION_IDLE_TTL,
+    max_sessions=Config.MAX_SESSIONS,
+    interval=Config.SESSION_REAPER_INTERVAL,
+    batch_size=Config.SESSION_REAPER_BATCH_SIZE
+)
 
 # Utility functions
-def validate_file_size(file_bytes: bytes) -> None:
+def validate_file_size(size_bytes: int) -> None:
     """Validate file size"""
-    size_mb = len(file_bytes) / (1024 * 1024)
+    size_mb = size_bytes / (1024 * 1024)
     if size_mb > Config.MAX_FILE_SIZE:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             detail=f"File size ({size_mb:.1f}MB) exceeds maximum allowed size ({Config.MAX_FILE_SIZE}MB)"
         )
 
+class SpooledUpload(NamedTuple):
+    path: str
+    filename: str
+    size: int
+    content_hash: str
+
+# Bytes allowed in a request beyond the file itself, for multipart framing and other fields
+MULTIPART_OVERHEAD = 64 * 1024
+
+# The handlers parse the body themselves, so the file field is declared here for the docs
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+async def spool_upload(request: Request) -> SpooledUpload:
+    """Stream the "file" field of a multipart request into a spool file under PDF_UPLOAD_DIR
+
+    The body is parsed as it arrives rather than through UploadFile, which Starlette
+    would first buffer whole into its own temporary file. The size limit is enforced
+    and the content hashed per received chunk, so an oversized upload is cut off at
+    the limit and a valid one is written to disk exactly once.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a multipart/form-data upload")
+
+    # Reject oversized bodies up front when the client declares their length
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        validate_file_size(int(content_length) - MULTIPART_OVERHEAD)
+
+    spool_dir = os.path.join(Config.PDF_UPLOAD_DIR, "spool")
+    os.makedirs(spool_dir, exist_ok=True)
+    max_bytes = Config.MAX_FILE_SIZE * 1024 * 1024
+    digest = hashlib.sha256()
+    state = {"size": 0, "filename": None, "in_file": False, "done": False}
+    headers: Dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    pending: List[bytes] = []  # File bytes parsed from the current network chunk
+
+    def on_part_begin() -> None:
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished() -> None:
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        # Only the first "file" field is the upload; anything else is read past and dropped
+        state["in_file"] = disposition.get(b"name") == b"file" and not state["done"]
+        if state["in_file"]:
+            state["filename"] = disposition.get(b"filename", b"").decode("utf-8", "replace")
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if state["in_file"]:
+            pending.append(data[start:end])
+
+    def on_part_end() -> None:
+        if state["in_file"]:
+            state["in_file"] = False
+            state["done"] = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    spool_file = tempfile.NamedTemporaryFile(dir=spool_dir, suffix=".pdf", delete=False)
+    received = 0
+    validated = False
+    try:
+        with spool_file:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > max_bytes + MULTIPART_OVERHEAD:
+                    validate_file_size(received - MULTIPART_OVERHEAD)
+                try:
+                    parser.write(chunk)
+                except MultipartParseError as e:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Malformed upload: {e}")
+                if state["filename"] is not None and not validated:
+                    # Reject a bad name before writing any of its content
+                    validate_file_type(state["filename"])
+                    validated = True
+                if pending:
+                    data = b"".join(pending)
+                    pending.clear()
+                    state["size"] += len(data)
+                    if state["size"] > max_bytes:
+                        validate_file_size(state["size"])
+                    digest.update(data)
+                    await asyncio.to_thread(spool_file.write, data)
+            parser.finalize()
+        if state["filename"] is None or not state["filename"]:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file provided")
+    except BaseException:
+        os.unlink(spool_file.name)
+        raise
+
+    return SpooledUpload(spool_file.name, state["filename"], state["size"], digest.hexdigest())
+
 def validate_file_type(filename: str) -> None:
     """Validate file extension and name"""
     # Sanitize filename to prevent path traversal
@@ -203,107 +393,370 @@ def validate_file_type(filename: str) -> None:
             detail="Filename too long"
         )
 
-async def process_upload(file_bytes: bytes, filename: str) -> tuple[str, int]:
-    """Process document upload with enhanced error handling"""
-    start_time = time.time()
-    session_id = str(uuid.uuid4())
-    
+def remove_document_chunks(collection_name: str, doc_id: str) -> None:
+    """Delete one document's chunks from an index and its lexical index"""
+    collection = get_chroma().get_collection(collection_name)
+    chunk_ids = collection.get(where={"doc_id": doc_id}, include=[])["ids"]
+    if chunk_ids:
+        collection.delete(ids=chunk_ids)
+        get_lexical_index_store().remove_documents(collection_name, chunk_ids)
+    query_cache = get_query_cache()
+    if query_cache is not None:
+        query_cache.invalidate(collection_name)
+
+def copy_collection_data(source_name: str, target_name: str) -> None:
+    """Copy chunks, stored embeddings and the lexical index from one index to another without re-embedding"""
+    chroma = get_chroma()
+    source = chroma.get_collection(source_name)
+    target = chroma.get_collection(target_name)
+    batch_size = max(1, Config.EMBEDDING_BATCH_SIZE * Config.EMBEDDING_MAX_CONCURRENCY)
+    for offset in range(0, source.count(), batch_size):
+        batch = source.get(limit=batch_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+        if not batch["ids"]:
+            break
+        target.add(
+            ids=batch["ids"],
+            documents=batch["documents"],
+            metadatas=batch["metadatas"],
+            embeddings=batch["embeddings"]
+        )
+        get_lexical_index_store().add_documents(target_name, batch["ids"], batch["documents"], persist=False)
+    get_lexical_index_store().flush(target_name)
+
+def ensure_private_collection(session_id: str) -> str:
+    """Return a collection only this session references, forking a shared one (copy-on-write)
+
+    The caller holds the session's lock, so one session never forks twice at once
+    while other sessions fork in parallel.
+    """
+    registry = get_document_registry()
+    session_info = session_manager.get(session_id)
+    if session_info is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    collection_name = session_collection(session_info)
+    busy = session_info.status == "processing"
+
+    shared = len(registry.sessions(collection_name)) > 1
+    if shared and busy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document is still being processed. Please try again shortly."
+        )
+    if not shared:
+        # The index is about to stop matching the upload it was built from
+        registry.withdraw(collection_name)
+        return collection_name
+
+    fork_name = str(uuid.uuid4())
+    # Registered before it exists so startup reconciliation never takes it for an orphan
+    registry.create(fork_name, session_id)
     try:
-        logger.info(f"Processing upload for file: {filename}, session: {session_id}")
-        
-        # Process PDF
-        processor = PDFProcessor()
-        chunks = processor.process_pdf(file_bytes, filename)
+        copy_collection_data(collection_name, fork_name)
+    except Exception:
+        registry.release(session_id, fork_name)
+        delete_session_data(fork_name)
+        raise
 
-        if not chunks:
-            raise ValueError("Failed to extract text from document")
+    last_reference = session_manager.move(session_id, collection_name, fork_name)
+    if last_reference is None:
+        delete_session_data(fork_name)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    if last_reference:
+        delete_session_data(collection_name)
+    logger.info(f"Forked shared index {collection_name[:8]}... for session {session_id[:8]}...")
+    return fork_name
 
-        logger.info(f"Extracted {len(chunks)} chunks from {filename}")
+async def check_openrouter() -> None:
+    await get_openrouter_client().ping()
 
-        # Store in vector database
-        chroma = ChromaDB()
-        collection = chroma.get_collection(session_id)
-        
-        # Add chunks with metadata
-        chunk_ids = [f"{session_id}_{i}" for i in range(len(chunks))]
-        metadatas = [
-            {
-                "filename": filename, 
-                "chunk_id": i, 
-                "session_id": session_id,
-                "page": i // 3 + 1,  # Estimate page number (3 chunks per page average)
-                "document_type": "pdf"
-            } 
-            for i in range(len(chunks))
-        ]
-        
-        collection.add(
-            documents=chunks, 
-            ids=chunk_ids,
-            metadatas=metadatas
+async def check_chromadb() -> None:
+    await asyncio.to_thread(lambda: get_chroma().client.heartbeat())
+
+async def check_session_store() -> None:
+    await asyncio.to_thread(session_manager.count)
+
+# Dependency status for /ready, refreshed in the background; started by lifespan.
+# Without OpenRouter uploads and status still work, so it only degrades readiness.
+health_prober = HealthProber(
+    {"openrouter": check_openrouter, "chromadb": check_chromadb, "session_store": check_session_store},
+    critical=("chromadb", "session_store"),
+    interval=Config.HEALTH_PROBE_INTERVAL,
+    timeout=Config.HEALTH_PROBE_TIMEOUT
+)
+
+def attach_document(session_id: str, document: DocumentInfo) -> str:
+    """Add a document to a session's private collection; returns the collection to ingest into"""
+    with session_manager.lock(session_id):
+        collection_name = ensure_private_collection(session_id)
+        if not session_manager.add_document(session_id, document, collection_name):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    return collection_name
+
+def detach_document(session_id: str, doc_id: str, previous_status: str) -> None:
+    """Remove a document and its chunks from a session, restoring its status if that fails"""
+    with session_manager.lock(session_id):
+        try:
+            if not session_manager.update_document(session_id, doc_id, status="removing"):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+        except InvalidTransition:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Document is still being processed. Please try again shortly."
+            )
+        try:
+            collection_name = ensure_private_collection(session_id)
+            remove_document_chunks(collection_name, doc_id)
+        except BaseException:
+            session_manager.update_document(session_id, doc_id, status=previous_status)
+            raise
+        session_manager.drop_document(session_id, doc_id)
+
+def reconcile_sessions() -> Dict[str, int]:
+    """Bring the session store in line with the collections on disk after a (re)start
+
+    Ingestions the previous run left unfinished are marked failed, sessions whose index
+    is gone are dropped and indexes no session references are deleted.
+    """
+    store = get_session_store()
+    registry = get_document_registry()
+    chroma = get_chroma()
+    existing = set(chroma.list_collection_names())
+    reconciled = {"interrupted": 0, "lost": 0, "orphaned": 0}
+
+    for collection_name, doc_id in store.stale_jobs():
+        registry.withdraw(collection_name)
+        updated = session_manager.update_document_sessions(
+            collection_name, doc_id, status="failed",
+            error="Processing was interrupted by a restart. Please upload the document again."
         )
+        if updated and collection_name in existing:
+            try:
+                remove_document_chunks(collection_name, doc_id)
+            except Exception as e:
+                logger.warning(f"Failed to remove partial chunks of {doc_id[:8]}...: {e}")
+        store.finish_job(collection_name, doc_id)
+        reconciled["interrupted"] += 1
 
-        # Store session info using thread-safe method
-        session_info = SessionInfo(
-            session_id=session_id,
-            filename=filename,
-            created_at=time.time(),
-            chunk_count=len(chunks),
-            status="active"
+    for record in store.scan():
+        session_info = SessionInfo.model_validate(record)
+        if session_collection(session_info) in existing \
+                or not any(document.status == "active" for document in session_info.documents.values()):
+            continue
+        remove_session(session_info.session_id)
+        reconciled["lost"] += 1
+
+    for collection_name in (existing - registry.collections()) | set(registry.prune()):
+        try:
+            delete_session_data(collection_name)
+        except Exception as e:
+            logger.debug(f"Orphaned index {collection_name[:8]}... was only partly present: {e}")
+        reconciled["orphaned"] += 1
+
+    logger.info(
+        f"Rehydrated {store.count()} sessions: {reconciled['interrupted']} interrupted ingestions, "
+        f"{reconciled['lost']} sessions without an index, {reconciled['orphaned']} orphaned indexes"
+    )
+    return reconciled
+
+def _parse_into_queue(processor: PDFProcessor, file_path: str, filename: str,
+                      chunk_queue: "queue.Queue", stop: threading.Event) -> None:
+    """Producer side of ingestion: push parsed page ranges, blocking while the queue is full"""
+    def offer(item) -> bool:
+        while not stop.is_set():
+            try:
+                chunk_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for item in processor.iter_chunks(file_path, filename):
+            if not offer(item):
+                return
+        offer(None)
+    except Exception as e:
+        offer(e)
+
+def run_ingestion(collection_name: str, doc_id: str, file_path: str, filename: str) -> None:
+    """Parse, embed and index a document into collection_name; runs on the ingestion pool, never on the event loop"""
+    start_time = time.time()
+    stop_parsing = threading.Event()
+
+    try:
+        logger.info(f"Processing upload for file: {filename}, collection: {collection_name}, document: {doc_id}")
+
+        processor = PDFProcessor()
+        pages_total = processor.count_pages(file_path)
+        session_manager.update_document_sessions(collection_name, doc_id, pages_total=pages_total)
+
+        chroma = get_chroma()
+        collection = chroma.get_collection(collection_name)
+        lexical_store = get_lexical_index_store()
+
+        # Parsing runs ahead in its own thread; the bounded queue holds it back when
+        # embedding falls behind, so memory stays flat regardless of document size
+        chunk_queue: "queue.Queue" = queue.Queue(maxsize=max(1, Config.INGESTION_QUEUE_SIZE))
+        parser = threading.Thread(
+            target=_parse_into_queue,
+            args=(processor, file_path, filename, chunk_queue, stop_parsing),
+            name=f"parse-{collection_name[:8]}",
+            daemon=True
         )
-        add_session(session_info)
+        parser.start()
+
+        window = max(1, Config.EMBEDDING_BATCH_SIZE * Config.EMBEDDING_MAX_CONCURRENCY)
+        stage_seconds = {"embed": 0.0, "index": 0.0}
+        pending: List[DocumentChunk] = []
+        chunk_count = 0
+        chunks_indexed = 0
+
+        def index_batch(batch: List[DocumentChunk]) -> None:
+            """Embed a batch and add it to the collection; it becomes searchable immediately"""
+            nonlocal chunks_indexed
+            chunk_ids = [f"{doc_id}_{chunks_indexed + i}" for i in range(len(batch))]
+            documents = [chunk.content for chunk in batch]
+            metadatas = [
+                {
+                    "filename": filename,
+                    "chunk_id": chunks_indexed + i,
+                    "session_id": collection_name,
+                    "doc_id": doc_id,
+                    "page": chunk.page_number,
+                    "element_type": chunk.type,
+                    "position": chunk.metadata.get("position", 0),
+                    "document_type": "pdf"
+                }
+                for i, chunk in enumerate(batch)
+            ]
+            started = time.perf_counter()
+            embeddings = chroma.embedding_fn(documents)
+            stage_seconds["embed"] += time.perf_counter() - started
+            if not session_manager.update_document_sessions(collection_name, doc_id, chunks_embedded=chunks_indexed + len(batch)):
+                raise RuntimeError("Document was removed from all sessions during ingestion")
+
+            started = time.perf_counter()
+            collection.add(documents=documents, ids=chunk_ids, metadatas=metadatas, embeddings=embeddings)
+            # Saved once when the document is complete, not once per batch
+            lexical_store.add_documents(collection_name, chunk_ids, documents, persist=False)
+            stage_seconds["index"] += time.perf_counter() - started
+            chunks_indexed += len(batch)
+            if not session_manager.update_document_sessions(collection_name, doc_id, chunks_indexed=chunks_indexed):
+                raise RuntimeError("Document was removed from all sessions during ingestion")
+
+        while True:
+            item = chunk_queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            pages_parsed, range_chunks = item
+            pending.extend(range_chunks)
+            chunk_count += len(range_chunks)
+            if not session_manager.update_document_sessions(collection_name, doc_id, pages_parsed=pages_parsed, chunk_count=chunk_count):
+                raise RuntimeError("Document was removed from all sessions during ingestion")
+            while len(pending) >= window:
+                index_batch(pending[:window])
+                del pending[:window]
+
+        if pending:
+            index_batch(pending)
+        if not chunk_count:
+            raise ValueError("Failed to extract text from document")
+        lexical_store.flush(collection_name)
+
+        if not session_manager.update_document_sessions(collection_name, doc_id, status="active"):
+            raise RuntimeError("Document was removed from all sessions during ingestion")
+        query_cache = get_query_cache()
+        if query_cache is not None:
+            # Context cached before this document was indexed would leave it out
+            query_cache.invalidate(collection_name)
+
+        # The parser thread has finished, so its timings are complete
+        for stage, seconds in {**processor.timings, **stage_seconds}.items():
+            INGEST_STAGE_SECONDS.labels(stage).observe(seconds)
+        INGEST_DOCUMENTS.labels("active").inc()
 
         processing_time = time.time() - start_time
-        logger.info(f"Successfully processed {filename} in {processing_time:.2f}s")
-        
-        return session_id, len(chunks)
-        
+        logger.info(f"Successfully processed {filename} ({chunk_count} chunks) in {processing_time:.2f}s")
+
     except Exception as e:
         logger.error(f"Upload processing error for {filename}: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing document: {str(e)}"
+        INGEST_DOCUMENTS.labels("failed").inc()
+        get_document_registry().withdraw(collection_name)
+        updated = session_manager.update_document_sessions(
+            collection_name, doc_id, status="failed", error=f"Error processing document: {str(e)}"
         )
+        try:
+            if not get_document_registry().sessions(collection_name):
+                # Every session was removed while we were working; drop anything we indexed
+                delete_session_data(collection_name)
+            elif updated:
+                # Keep the session's other documents searchable without this one's partial chunks
+                remove_document_chunks(collection_name, doc_id)
+        except Exception as e:
+            logger.warning(f"Failed to clean up after ingestion error: {e}")
+    finally:
+        stop_parsing.set()
+        get_session_store().finish_job(collection_name, doc_id)
+        # The spooled upload is only needed while parsing
+        try:
+            os.unlink(file_path)
+        except OSError as e:
+            logger.warning(f"Failed to remove spooled upload {file_path}: {e}")
+
+async def process_upload(file_path: str, filename: str, content_hash: str) -> str:
+    """Register a new session and schedule its ingestion job, or point it at an identical document's index"""
+    session_id = str(uuid.uuid4())
+    if (await asyncio.to_thread(session_manager.count)) >= Config.MAX_SESSIONS:
+        # Eviction happens in the background, off the upload path
+        session_reaper.wake()
+
+    collection_name, needs_ingestion = await asyncio.to_thread(
+        session_manager.create, session_id, filename, content_hash
+    )
+
+    if not needs_ingestion:
+        logger.info(f"Reusing index {collection_name[:8]}... for identical upload, session {session_id[:8]}...")
+        try:
+            os.unlink(file_path)
+        except OSError as e:
+            logger.warning(f"Failed to remove spooled upload {file_path}: {e}")
+        return session_id
+
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(ingestion_executor, run_ingestion, collection_name, collection_name, file_path, filename)
+    return session_id
 
 @app.post("/upload", response_model=UploadResponse, responses={
     400: {"model": ErrorResponse},
     413: {"model": ErrorResponse},
     500: {"model": ErrorResponse}
-})
+}, openapi_extra=UPLOAD_REQUEST_BODY)
 @limiter.limit(f"{Config.RATE_LIMIT_REQUESTS}/minute")
-async def upload_file(request: Request, file: UploadFile):
-    """Upload and process PDF document with enhanced validation"""
+async def upload_file(request: Request):
+    """Upload a PDF (multipart field "file") and start processing it; poll /sessions/{id}/status for progress"""
     start_time = time.time()
     
-    # Validate file
-    if not file.filename:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No file provided"
-        )
-    
-    validate_file_type(file.filename)
-    
     try:
-        file_bytes = await file.read()
+        upload = await spool_upload(request)
         
-        # Validate file size and content
-        if len(file_bytes) == 0:
+        # Validate file content
+        if upload.size == 0:
+            os.unlink(upload.path)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File is empty"
             )
         
-        validate_file_size(file_bytes)
-        
-        session_id, chunk_count = await process_upload(file_bytes, file.filename)
+        session_id = await process_upload(upload.path, upload.filename, upload.content_hash)
         processing_time = time.time() - start_time
         
         return UploadResponse(
             session_id=session_id,
-            status="processed",
-            filename=file.filename,
-            chunk_count=chunk_count,
+            status="processing",
+            filename=upload.filename,
+            chunk_count=0,
             processing_time=processing_time
         )
         
@@ -316,120 +769,294 @@ async def upload_file(request: Request, file: UploadFile):
             detail=f"Failed to process upload: {str(e)}"
         )
 
+# Not rate limited: clients poll it during ingestion, and several uploads from one
+# address would otherwise exhaust RATE_LIMIT_REQUESTS on polling alone
+@app.get("/sessions/{session_id}/status", response_model=IngestionStatus, responses={
+    400: {"model": ErrorResponse},
+    404: {"model": ErrorResponse}
+})
+async def get_session_status(session_id: str):
+    """Report ingestion progress for a session"""
+    # Validate session_id format to prevent injection
+    if not re.match(UUID_PATTERN, session_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid session ID format"
+        )
+
+    session_info = await asyncio.to_thread(session_manager.get, session_id)
+    if session_info is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    return IngestionStatus(
+        session_id=session_id,
+        status=session_info.status,
+        pages_total=session_info.pages_total,
+        pages_parsed=session_info.pages_parsed,
+        chunk_count=session_info.chunk_count,
+        chunks_embedded=session_info.chunks_embedded,
+        chunks_indexed=session_info.chunks_indexed,
+        error=session_info.error,
+        elapsed=time.time() - session_info.created_at,
+        documents=list(session_info.documents.values())
+    )
+
+@app.post("/sessions/{session_id}/documents", response_model=DocumentUploadResponse, responses={
+    400: {"model": ErrorResponse},
+    404: {"model": ErrorResponse},
+    409: {"model": ErrorResponse},
+    413: {"model": ErrorResponse}
+}, openapi_extra=UPLOAD_REQUEST_BODY)
+@limiter.limit(f"{Config.RATE_LIMIT_REQUESTS}/minute")
+async def add_document(request: Request, session_id: str):
+    """Append a PDF (multipart field "file") to an existing session; it is indexed in the background"""
+    start_time = time.time()
+    if not re.match(UUID_PATTERN, session_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid session ID format"
+        )
+    session_info = await asyncio.to_thread(session_manager.get, session_id)
+    if session_info is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    if len(session_info.documents) >= Config.MAX_DOCUMENTS_PER_SESSION:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Session already holds the maximum of {Config.MAX_DOCUMENTS_PER_SESSION} documents"
+        )
+
+    upload = await spool_upload(request)
+    file_path, content_hash = upload.path, upload.content_hash
+    try:
+        if upload.size == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File is empty"
+            )
+
+        # The same file twice in one session would only duplicate its chunks
+        session_info = await asyncio.to_thread(session_manager.get, session_id)
+        existing = next((
+            document for document in (session_info.documents.values() if session_info else [])
+            if document.content_hash == content_hash and document.status in ("processing", "active")
+        ), None)
+        if existing is not None:
+            os.unlink(file_path)
+            return DocumentUploadResponse(
+                session_id=session_id,
+                doc_id=existing.doc_id,
+                status=existing.status,
+                filename=existing.filename,
+                processing_time=time.time() - start_time
+            )
+
+        doc_id = str(uuid.uuid4())
+        collection_name = await asyncio.to_thread(attach_document, session_id, DocumentInfo(
+            doc_id=doc_id, filename=upload.filename, status="processing", content_hash=content_hash
+        ))
+    except BaseException:
+        try:
+            os.unlink(file_path)
+        except OSError:
+            pass
+        raise
+
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(ingestion_executor, run_ingestion, collection_name, doc_id, file_path, upload.filename)
+    logger.info(f"Adding document {doc_id[:8]}... to session {session_id[:8]}...")
+
+    return DocumentUploadResponse(
+        session_id=session_id,
+        doc_id=doc_id,
+        status="processing",
+        filename=upload.filename,
+        processing_time=time.time() - start_time
+    )
+
+@app.delete("/sessions/{session_id}/documents/{doc_id}", responses={
+    400: {"model": ErrorResponse},
+    404: {"model": ErrorResponse},
+    409: {"model": ErrorResponse}
+})
+@limiter.limit("20/minute")
+async def remove_document(request: Request, session_id: str, doc_id: str):
+    """Remove one document and its chunks from a session"""
+    if not re.match(UUID_PATTERN, session_id) or not re.match(UUID_PATTERN, doc_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid session or document ID format"
+        )
+
+    session_info = await asyncio.to_thread(session_manager.get, session_id)
+    document = session_info.documents.get(doc_id) if session_info else None
+    if document is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+
+    # The removal is a status transition, so a concurrent ingestion or removal gets a 409
+    await asyncio.to_thread(detach_document, session_id, doc_id, document.status)
+    logger.info(f"Removed document {doc_id[:8]}... from session {session_id[:8]}...")
+    return {"message": "Document removed successfully"}
+
+def source_label(page: Optional[int], position: int) -> str:
+    """Citation label for a chunk: its page if known, otherwise its rank in the results"""
+    return f"Page {page}" if page else f"Section {position + 1}"
+
+def retrieve_context(chroma, collection, question: str, doc_ids: Optional[List[str]] = None,
+                     query_embedding: Optional[List[float]] = None) -> Optional[tuple[str, List[str]]]:
+    """Retrieve, filter and format document context for a question; None if nothing was found"""
+    # Strategy 1 (semantic) and strategy 2 (keyword), fused
+    retrieved = HybridRetriever(chroma.embedding_fn, get_lexical_index_store()).retrieve(
+        collection, question, doc_ids, query_embedding
+    )
+    all_contexts = retrieved.documents
+    all_metadatas = retrieved.metadatas
+    all_distances = retrieved.distances
+    important_words = retrieved.keywords
+
+    if not all_contexts:
+        return None
+
+    # Page and element provenance travel in each hit's metadata
+    all_sources = [source_label(metadata.get('page'), i) for i, metadata in enumerate(all_metadatas)]
+    # Pages are ambiguous once results span several documents of a session
+    if len({metadata.get('doc_id') for metadata in all_metadatas}) > 1:
+        all_sources = [
+            f"{metadata.get('filename', 'Document')}, {source}"
+            for metadata, source in zip(all_metadatas, all_sources)
+        ]
+    
+    # Enhanced relevance filtering with more lenient threshold
+    relevant_ids, relevant_contexts, sources = [], [], []
+    for i, (context, metadata, distance, keyword_match) in enumerate(
+        zip(all_contexts, all_metadatas, all_distances, retrieved.keyword_matches)
+    ):
+        # Use the new configurable distance threshold; keyword hits are kept on their lexical merit
+        if distance < Config.DISTANCE_THRESHOLD or keyword_match:
+            # Filter out very short chunks unless they're specifically relevant
+            if len(context.strip()) >= Config.MIN_CHUNK_LENGTH or any(word in context.lower() for word in important_words):
+                relevant_ids.append(retrieved.ids[i])
+                relevant_contexts.append(context.strip())
+                sources.append(all_sources[i])
+    
+    # Fallback: if strict filtering yields too few results, include more chunks
+    if len(relevant_contexts) < 2:
+        fallback = [
+            (chunk_id, ctx.strip(), source)
+            for chunk_id, ctx, source in zip(retrieved.ids[:5], all_contexts[:5], all_sources)
+            if len(ctx.strip()) >= Config.MIN_CHUNK_LENGTH
+        ]
+        relevant_ids = [chunk_id for chunk_id, _, _ in fallback]
+        relevant_contexts = [ctx for _, ctx, _ in fallback]
+        sources = [source for _, _, source in fallback]
+    
+    # Final fallback: include any content if we still have nothing
+    if not relevant_contexts:
+        relevant_ids = retrieved.ids[:3]
+        relevant_contexts = [ctx.strip() for ctx in all_contexts[:3]]
+        sources = all_sources[:3]
+
+    # Pack the best chunks into the token budget, sending overlapping neighbours once
+    with CHAT_STAGE_SECONDS.labels("context_assembly").time():
+        context = get_context_assembler().assemble([
+            ContextPiece(chunk_id, ctx, source)
+            for chunk_id, ctx, source in zip(relevant_ids, relevant_contexts, sources)
+        ])
+    
+    # Log context quality for debugging
+    logger.info(
+        f"Packed {context.chunks} of {len(relevant_contexts)} relevant chunks into {context.tokens} tokens "
+        f"({context.tokens_trimmed} overlap tokens trimmed) for question: {question[:50]}..."
+    )
+
+    # Sources to report - limit to 5 most relevant
+    return context.text, context.sources[:5]
+
 async def stream_chat_responses(chat_request: ChatRequest):
     """Generator for streaming chat responses using Server-Sent Events."""
     start_time = time.time()
+    end_details: Dict[str, Any] = {}  # Extra fields reported in the end event
+    ACTIVE_STREAMS.inc()
     
     try:
         logger.info(f"Streaming chat request for session {chat_request.session_id}: {chat_request.question[:100]}")
         
-        # 1. Enhanced multi-strategy retrieval
-        chroma = ChromaDB()
-        try:
-            collection = chroma.get_collection(chat_request.session_id)
-        except Exception:
-            # Yield an error event for the client
+        session_info = await asyncio.to_thread(session_manager.get, chat_request.session_id)
+        session_status = session_info.status if session_info else None
+        chunks_indexed = session_info.chunks_indexed if session_info else 0
+        # Identical uploads share one index, so retrieval and its cache are keyed by collection
+        collection_name = session_collection(session_info) if session_info else chat_request.session_id
+        unknown_docs = [
+            doc_id for doc_id in chat_request.doc_ids or []
+            if session_info is None or doc_id not in session_info.documents
+        ]
+        if session_info is not None:
+            await asyncio.to_thread(session_manager.touch, chat_request.session_id)
+        if unknown_docs:
+            error_message = json.dumps({"error": "Document not found in this session.", "status_code": 404})
+            yield f"event: error\ndata: {error_message}\n\n"
+            return
+        cache_scope = collection_name
+        if chat_request.doc_ids:
+            cache_scope = f"{collection_name}|{','.join(sorted(set(chat_request.doc_ids)))}"
+        if session_info is None:
             error_message = json.dumps({"error": "Document session not found. Please upload a document first before asking questions.", "status_code": 404})
             yield f"event: error\ndata: {error_message}\n\n"
             return
-
-        # Strategy 1: Direct semantic search with higher recall
-        primary_results = collection.query(
-            query_texts=[chat_request.question], 
-            n_results=Config.RETRIEVAL_TOP_K,
-            include=["documents", "metadatas", "distances"]
-        )
-        
-        # Strategy 2: Keyword-based search for specific terms
-        question_words = chat_request.question.lower().split()
-        important_words = [word for word in question_words if len(word) > 3 and word not in 
-                         ['what', 'when', 'where', 'which', 'about', 'does', 'have', 'this', 'that', 'with', 'from', 'they', 'them', 'were', 'been', 'said', 'each', 'then', 'their']]
-        
-        # Combine results from multiple strategies
-        all_contexts = []
-        all_metadatas = []
-        all_distances = []
-        seen_contexts = set()
-        
-        # Add primary results
-        if primary_results and primary_results.get("documents") and primary_results["documents"][0]:
-            for ctx, meta, dist in zip(
-                primary_results["documents"][0],
-                primary_results.get("metadatas", [[]])[0],
-                primary_results.get("distances", [[]])[0]
-            ):
-                if ctx not in seen_contexts:
-                    all_contexts.append(ctx)
-                    all_metadatas.append(meta)
-                    all_distances.append(dist)
-                    seen_contexts.add(ctx)
-        
-        # Add keyword-based results if we have important words
-        if important_words:
-            keyword_query = " ".join(important_words)
-            keyword_results = collection.query(
-                query_texts=[keyword_query], 
-                n_results=Config.RETRIEVAL_TOP_K // 2,
-                include=["documents", "metadatas", "distances"]
-            )
-            
-            if keyword_results and keyword_results.get("documents") and keyword_results["documents"][0]:
-                for ctx, meta, dist in zip(
-                    keyword_results["documents"][0],
-                    keyword_results.get("metadatas", [[]])[0],
-                    keyword_results.get("distances", [[]])[0]
-                ):
-                    if ctx not in seen_contexts and len(all_contexts) < Config.RETRIEVAL_TOP_K:
-                        all_contexts.append(ctx)
-                        all_metadatas.append(meta)
-                        all_distances.append(dist)
-                        seen_contexts.add(ctx)
-
-        if not all_contexts:
-            error_message = json.dumps({"error": "I couldn't find relevant information in the document to answer your question. Please try rephrasing your question or asking about different aspects of the document.", "status_code": 404})
+        if session_status == "failed" or (session_status == "processing" and chunks_indexed == 0):
+            detail = "Document processing failed. Please upload the document again." if session_status == "failed" \
+                else "Document is still being processed. Please try again shortly."
+            error_message = json.dumps({"error": detail, "status_code": 409})
             yield f"event: error\ndata: {error_message}\n\n"
             return
-        
-        # Enhanced relevance filtering with more lenient threshold
-        relevant_contexts, sources = [], []
-        for i, (context, metadata, distance) in enumerate(zip(all_contexts, all_metadatas, all_distances)):
-            # Use the new configurable distance threshold
-            if distance < Config.DISTANCE_THRESHOLD:
-                # Filter out very short chunks unless they're specifically relevant
-                if len(context.strip()) >= Config.MIN_CHUNK_LENGTH or any(word in context.lower() for word in important_words):
-                    relevant_contexts.append(context.strip())
-                    # Use page/section info if available, otherwise use position
-                    source_info = f"Page {metadata.get('page', i+1)}" if metadata.get('page') else f"Section {i+1}"
-                    sources.append(source_info)
-        
-        # Fallback: if strict filtering yields too few results, include more chunks
-        if len(relevant_contexts) < 2:
-            relevant_contexts = [ctx.strip() for ctx in all_contexts[:5] if len(ctx.strip()) >= Config.MIN_CHUNK_LENGTH]
-            sources = [f"Section {i+1}" for i in range(len(relevant_contexts))]
-        
-        # Final fallback: include any content if we still have nothing
-        if not relevant_contexts:
-            relevant_contexts = [ctx.strip() for ctx in all_contexts[:3]]
-            sources = [f"Section {i+1}" for i in range(len(relevant_contexts))]
-
-        # Create enhanced context with better structure
-        context_parts = []
-        for i, ctx in enumerate(relevant_contexts[:8]):  # Limit to 8 most relevant chunks for token efficiency
-            # Add source information to help LLM understand context
-            source_info = sources[i] if i < len(sources) else f"Section {i+1}"
-            context_parts.append(f"[{source_info}]\n{ctx.strip()}")
-        
-        context_str = "\n\n".join(context_parts)
-        
-        # Log context quality for debugging
-        logger.info(f"Retrieved {len(relevant_contexts)} relevant chunks for question: {chat_request.question[:50]}...")
-
-        # Yield sources found - limit to 5 most relevant
-        clean_sources = []
-        for source in sources[:5]:
-            if source not in clean_sources:  # Avoid duplicates
-                clean_sources.append(source)
-        
+
+        # 1. Enhanced multi-strategy retrieval, reusing cached context for repeated questions
+        query_cache = get_query_cache()
+        chroma = get_chroma()
+        cached = None
+        question_embedding = None
+        if query_cache is not None:
+            cached = query_cache.get(cache_scope, chat_request.question)
+            if cached is None and Config.QUERY_CACHE_SEMANTIC:
+                with CHAT_STAGE_SECONDS.labels("query_embedding").time():
+                    question_embedding = (await asyncio.to_thread(chroma.embedding_fn, [chat_request.question]))[0]
+                cached = query_cache.get_similar(cache_scope, question_embedding)
+
+        if cached is not None:
+            context_str, clean_sources = cached.context_str, cached.sources
+        else:
+            try:
+                collection = chroma.get_collection(collection_name)
+            except EmbeddingMismatchError as e:
+                logger.warning(str(e))
+                error_message = json.dumps({"error": "This document was indexed with a different embedding model. Please upload it again.", "status_code": 409})
+                yield f"event: error\ndata: {error_message}\n\n"
+                return
+
+            # Retrieval and context assembly run off the event loop
+            retrieved_context = await asyncio.to_thread(
+                retrieve_context, chroma, collection, chat_request.question, chat_request.doc_ids, question_embedding
+            )
+            if retrieved_context is None:
+                error_message = json.dumps({"error": "I couldn't find relevant information in the document to answer your question. Please try rephrasing your question or asking about different aspects of the document.", "status_code": 404})
+                yield f"event: error\ndata: {error_message}\n\n"
+                return
+            context_str, clean_sources = retrieved_context
+
+            # Partially ingested sessions would cache incomplete context
+            if query_cache is not None and session_status != "processing":
+                query_cache.put(
+                    cache_scope, chat_request.question,
+                    context_str, clean_sources, question_embedding
+                )
+
         sources_message = json.dumps(clean_sources)
         yield f"event: sources\ndata: {sources_message}\n\n"
 
@@ -452,14 +1079,9 @@ Instructions:
 
 Answer:"""
 
+        end_details["prompt_tokens"] = get_context_assembler().count(system_prompt + "\n" + user_prompt)
+
         # 3. Prepare OpenRouter request
-        headers = {
-            "Authorization": f"Bearer {Config.OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": Config.SITE_URL,
-            "X-Title": Config.SITE_NAME,
-        }
-        
         payload = {
             "model": Config.CHAT_MODEL,
             "messages": [
@@ -472,46 +1094,56 @@ Answer:"""
             "top_p": 0.9,  # Add top_p for better response quality
         }
 
-        # 4. Stream response from OpenRouter with timeout and error handling
+        # 4. Replay a cached answer for identical deterministic requests
+        answer_cache = get_answer_cache()
+        answer_cache_key = None
+        if answer_cache is not None and AnswerCache.is_cacheable(payload):
+            answer_cache_key = AnswerCache.make_key(payload)
+            cached_tokens = answer_cache.get(answer_cache_key)
+            end_details["answer_cache"] = {"hit": cached_tokens is not None, **answer_cache.stats()}
+            if cached_tokens is not None:
+                for token in cached_tokens:
+                    token_message = json.dumps({"token": token})
+                    yield f"event: token\ndata: {token_message}\n\n"
+                    if Config.ANSWER_CACHE_REPLAY_DELAY > 0:
+                        await asyncio.sleep(Config.ANSWER_CACHE_REPLAY_DELAY)
+                return
+
+        # 5. Stream response from OpenRouter over the shared async connection pool
         try:
-            response = requests.post(
-                f"{Config.OPENROUTER_API_BASE}chat/completions",
-                headers=headers,
-                json=payload,
-                stream=True,
-                timeout=(10, 60)  # (connect timeout, read timeout)
-            )
-        except requests.exceptions.Timeout:
+            answer_tokens = []
+            stream_started = first_token_at = time.perf_counter()
+            async for token in get_openrouter_client().stream_chat(payload):
+                if not answer_tokens:
+                    first_token_at = time.perf_counter()
+                    CHAT_STAGE_SECONDS.labels("first_token").observe(first_token_at - stream_started)
+                answer_tokens.append(token)
+                token_message = json.dumps({"token": token})
+                yield f"event: token\ndata: {token_message}\n\n"
+            generation_seconds = time.perf_counter() - first_token_at
+            if len(answer_tokens) > 1 and generation_seconds > 0:
+                # Stream deltas are not tokens; count the answer once instead of per delta
+                answer_token_count = get_context_assembler().count("".join(answer_tokens))
+                CHAT_TOKENS_PER_SECOND.observe(answer_token_count / generation_seconds)
+            if answer_cache_key is not None and answer_tokens:
+                answer_cache.put(answer_cache_key, answer_tokens)
+        except httpx.TimeoutException:
             error_message = json.dumps({"error": "Request timeout - please try again", "status_code": 408})
             yield f"event: error\ndata: {error_message}\n\n"
             return
-        except requests.exceptions.RequestException as e:
+        except httpx.RequestError:
             error_message = json.dumps({"error": "Network error - please try again", "status_code": 502})
             yield f"event: error\ndata: {error_message}\n\n"
             return
-        
-        if response.status_code != 200:
-            error_message = json.dumps({"error": f"OpenRouter API error: {response.status_code} - {response.text}", "status_code": response.status_code})
+        except OpenRouterAPIError as e:
+            error_message = json.dumps({"error": str(e), "status_code": e.status_code})
             yield f"event: error\ndata: {error_message}\n\n"
             return
 
-        # 5. Parse and yield streaming chunks
-        for line in response.iter_lines(decode_unicode=True):
-            if line and line.startswith("data: "):
-                data = line[6:]  # Remove "data: " prefix
-                if data == "[DONE]":
-                    break
-                try:
-                    chunk_data = json.loads(data)
-                    if "choices" in chunk_data and len(chunk_data["choices"]) > 0:
-                        delta = chunk_data["choices"][0].get("delta", {})
-                        if "content" in delta and delta["content"]:
-                            token_message = json.dumps({"token": delta["content"]})
-                            yield f"event: token\ndata: {token_message}\n\n"
-                            await asyncio.sleep(0.01)  # Small delay for smoother streaming
-                except json.JSONDecodeError:
-                    continue
-
+    except EmbeddingError as e:
+        logger.error(f"Embedding error during chat: {e}")
+        error_message = json.dumps({"error": "The embedding service failed. Please try again shortly.", "status_code": 502})
+        yield f"event: error\ndata: {error_message}\n\n"
     except Exception as e:
         logger.error(f"OpenRouter API error during stream: {str(e)}")
         error_message = json.dumps({"error": f"LLM API error: {e}", "status_code": 500})
@@ -521,9 +1153,11 @@ Answer:"""
         error_message = json.dumps({"error": f"Error processing chat: {e}", "status_code": 500})
         yield f"event: error\ndata: {error_message}\n\n"
     finally:
-        # 4. Signal end of stream
+        # 6. Signal end of stream
         processing_time = time.time() - start_time
-        end_message = json.dumps({"processing_time": processing_time})
+        ACTIVE_STREAMS.dec()
+        CHAT_STAGE_SECONDS.labels("stream").observe(processing_time)
+        end_message = json.dumps({"processing_time": processing_time, **end_details})
         yield f"event: end\ndata: {end_message}\n\n"
         logger.info(f"Chat stream finished in {processing_time:.2f}s for session {chat_request.session_id}")
 
@@ -542,21 +1176,26 @@ async def chat_endpoint(request: Request, chat_request: ChatRequest):
 
 @app.get("/sessions", response_model=List[SessionInfo])
 @limiter.limit("30/minute")
-async def list_sessions(request: Request):
-    """Get list of active sessions with privacy protection"""
-    with session_lock:
-        # Return sessions without exposing sensitive filename info
-        safe_sessions = []
-        for session in active_sessions.values():
-            safe_session = SessionInfo(
-                session_id=session.session_id,
-                filename=hashlib.md5(session.filename.encode()).hexdigest()[:8] + "_" + session.filename.split('.')[-1],  # Hash filename for privacy
-                created_at=session.created_at,
-                chunk_count=session.chunk_count,
-                status=session.status
-            )
-            safe_sessions.append(safe_session)
-        return safe_sessions
+async def list_sessions(request: Request, limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    """Get a page of sessions, newest first, with privacy protection"""
+    # Return sessions without exposing sensitive filename info
+    safe_sessions = []
+    for session in await asyncio.to_thread(session_manager.list, limit, offset):
+        safe_session = SessionInfo(
+            session_id=session.session_id,
+            filename=hashlib.md5(session.filename.encode()).hexdigest()[:8] + "_" + session.filename.split('.')[-1],  # Hash filename for privacy
+            created_at=session.created_at,
+            last_access=session.last_access,
+            chunk_count=session.chunk_count,
+            status=session.status,
+            pages_total=session.pages_total,
+            pages_parsed=session.pages_parsed,
+            chunks_embedded=session.chunks_embedded,
+            chunks_indexed=session.chunks_indexed,
+            error=session.error
+        )
+        safe_sessions.append(safe_session)
+    return safe_sessions
 
 @app.delete("/sessions/{session_id}")
 @limiter.limit("20/minute")
@@ -564,31 +1203,27 @@ async def delete_session(request: Request, session_id: str):
     """Delete a session and its data with validation"""
     try:
         # Validate session_id format to prevent injection
-        if not re.match(r'^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$', session_id):
+        if not re.match(UUID_PATTERN, session_id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid session ID format"
             )
         
-        with session_lock:
-            if session_id in active_sessions:
-                try:
-                    chroma = ChromaDB()
-                    chroma.delete_collection(session_id)
-                    del active_sessions[session_id]
-                    logger.info(f"Deleted session {session_id[:8]}...")  # Only log partial ID for privacy
-                    return {"message": "Session deleted successfully"}
-                except Exception as e:
-                    logger.error(f"Error deleting session data: {str(e)}")
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail="Error deleting session data"
-                    )
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Session not found"
-                )
+        try:
+            removed = await asyncio.to_thread(remove_session, session_id)
+        except Exception as e:
+            logger.error(f"Error deleting session data: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error deleting session data"
+            )
+        if not removed:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Session not found"
+            )
+        logger.info(f"Deleted session {session_id[:8]}...")  # Only log partial ID for privacy
+        return {"message": "Session deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
@@ -598,64 +1233,73 @@ async def delete_session(request: Request, session_id: str):
             detail="Internal server error"
         )
 
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    caches = {"embedding": get_embedding_cache(), "query": get_query_cache(), "answer": get_answer_cache()}
+    return {name: cache.stats() for name, cache in caches.items() if cache is not None}
+
+def cache_counter(field: str):
+    def collect() -> Dict[tuple, float]:
+        stats = cache_stats()
+        counts = {(name,): cache[field] for name, cache in stats.items()}
+        if field == "hits" and "query" in stats:
+            counts[("query_semantic",)] = stats["query"]["semantic_hits"]
+        return counts
+    return collect
+
+# Values other components already keep, read at scrape time so their hot paths stay untouched
+CallbackMetric("rag_cache_hits_total", "Cache hits; query_semantic counts near-duplicate questions", "counter",
+               cache_counter("hits"), ["cache"])
+CallbackMetric("rag_cache_misses_total", "Cache misses", "counter", cache_counter("misses"), ["cache"])
+CallbackMetric("rag_cache_entries", "Entries held by each cache", "gauge", cache_counter("entries"), ["cache"])
+CallbackMetric("rag_sessions", "Sessions in the session store", "gauge", lambda: session_manager.count())
+CallbackMetric("rag_sessions_reaped_total", "Sessions removed by the reaper, by reason", "counter",
+               lambda: {(reason,): session_reaper.stats()[reason] for reason in ("expired", "idle", "evicted")},
+               ["reason"])
+CallbackMetric("rag_dependency_up", "Whether the last readiness probe of a dependency succeeded", "gauge",
+               lambda: {(name,): int(result["status"] == "connected") for name, result in health_prober.results.items()},
+               ["service"])
+CallbackMetric("rag_dependency_probe_seconds", "Latency of the last readiness probe of a dependency", "gauge",
+               lambda: {(name,): result["latency_ms"] / 1000 for name, result in health_prober.results.items()
+                        if result["latency_ms"] is not None},
+               ["service"])
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of the API's metrics"""
+    if not Config.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return PlainTextResponse(await asyncio.to_thread(render_metrics), media_type=METRICS_CONTENT_TYPE)
+
+# Liveness is not rate limited: a throttled probe would look like a dead process
 @app.get("/health")
-@limiter.limit("10/minute")  # Rate limit health checks
-async def health_check(request: Request):
-    """Enhanced health check with security considerations"""
-    try:
-        # Check OpenRouter API (without exposing keys)
-        openrouter_status = "unknown"
-        try:
-            headers = {
-                "Authorization": f"Bearer {Config.OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": Config.SITE_URL,
-                "X-Title": Config.SITE_NAME,
-            }
-            
-            test_response = requests.get(
-                f"{Config.OPENROUTER_API_BASE}models",
-                headers=headers,
-                timeout=3  # Shorter timeout
-            )
-            openrouter_status = "connected" if test_response.status_code == 200 else "error"
-        except Exception:
-            openrouter_status = "error"
-        
-        # Check ChromaDB
-        chromadb_status = "unknown"
-        try:
-            chroma = ChromaDB()
-            chromadb_status = "connected"
-        except Exception:
-            chromadb_status = "error"
-        
-        # Clean up old sessions during health check
-        if len(active_sessions) > 50:  # If many sessions, cleanup
-            cleanup_old_sessions()
-        
-        return {
-            "status": "healthy" if all(s in ["connected", "unknown"] for s in [openrouter_status, chromadb_status]) else "degraded",
+async def health_check():
+    """Liveness: answers from memory without touching any dependency"""
+    return {
+        "status": "alive",
+        "timestamp": time.time(),
+        "version": "1.0.0",
+        "uptime": round(time.time() - STARTED_AT, 1)
+    }
+
+@app.get("/ready")
+@limiter.limit("60/minute")
+async def readiness_check(request: Request):
+    """Readiness from the background prober's cached results; 503 until critical services respond"""
+    readiness = health_prober.status()
+    session_count = await asyncio.to_thread(session_manager.count)
+    return JSONResponse(
+        status_code=503 if readiness in ("starting", "unavailable") else 200,
+        content={
+            "status": readiness,
             "timestamp": time.time(),
+            "checked_at": health_prober.last_probe_at,
             "version": "1.0.0",
-            "services": {
-                "openrouter": openrouter_status,
-                "chromadb": chromadb_status,
-                "sessions": len(active_sessions),
-                "memory_usage": "normal" if len(active_sessions) < MAX_SESSIONS * 0.8 else "high"
-            }
+            "services": health_prober.results,
+            "sessions": session_count,
+            "memory_usage": "normal" if session_count < Config.MAX_SESSIONS * 0.8 else "high",
+            "session_reaper": session_reaper.stats()
         }
-    except Exception as e:
-        # Don't expose internal error details
-        logger.error(f"Health check failed: {str(e)}")
-        return JSONResponse(
-            status_code=503,
-            content={
-                "status": "unhealthy",
-                "timestamp": time.time(),
-                "error": "Internal health check error"
-            }
-        )
+    )
 
 if __name__ == "__main__":
     import uvicorn
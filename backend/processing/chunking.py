@@ -1,38 +1,153 @@
-from models.schemas import DocumentChunk
-from typing import List
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+
+# Preferred places to end a chunk, strongest first; a chunk may end where group 1 ends
+PARAGRAPH_BREAK = re.compile(r"()\n\s*\n")
+SENTENCE_BREAK = re.compile(r"([.!?][\"')\]]*)\s")
+WORD_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+Spans = Tuple[Sequence[int], Sequence[int]]  # Token start offsets, token end offsets
+
+class CharacterTokenizer:
+    """Every character is one unit; sizes match the historical character-based settings"""
+    name = "chars"
+
+    def spans(self, text: str) -> Spans:
+        # range objects index and bisect like arrays without allocating per character
+        return range(len(text)), range(1, len(text) + 1)
+
+    def count(self, text: str) -> int:
+        return len(text)
+
+class WordTokenizer:
+    """Words and punctuation marks, a cheap approximation of subword token counts"""
+    name = "words"
+
+    def spans(self, text: str) -> Spans:
+        starts, ends = array("I"), array("I")
+        for match in WORD_TOKEN.finditer(text):
+            starts.append(match.start())
+            ends.append(match.end())
+        return starts, ends
+
+    def count(self, text: str) -> int:
+        return sum(1 for _ in WORD_TOKEN.finditer(text))
+
+class TiktokenTokenizer:
+    """Exact BPE token counts via tiktoken (optional dependency)"""
+
+    def __init__(self, encoding_name: str):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.name = f"tiktoken:{encoding_name}"
+
+    def spans(self, text: str) -> Spans:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if not tokens:
+            return array("I"), array("I")
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        starts = array("I", offsets)
+        ends = array("I", offsets[1:])
+        ends.append(len(text))
+        return starts, ends
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+def get_tokenizer(name: str):
+    """Tokenizer for a CHUNK_TOKENIZER setting: chars, words or tiktoken:<encoding>"""
+    if name == "chars":
+        return CharacterTokenizer()
+    if name == "words":
+        return WordTokenizer()
+    if name.startswith("tiktoken:"):
+        return TiktokenTokenizer(name.split(":", 1)[1])
+    raise ValueError(f"Unknown chunk tokenizer: {name}")
+
+class Chunker:
+    """Single-pass chunker over token offsets with exact overlap
+
+    Chunks are at most `chunk_size` tokens and end at the last paragraph break,
+    else the last sentence break, in the second half of the window, else at the
+    window edge. Consecutive chunks share exactly `overlap` tokens. Chunk text is
+    sliced from the input, never rebuilt.
+    """
+
+    def __init__(self, tokenizer, chunk_size: int, overlap: int):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be non-negative and smaller than chunk_size")
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def _break_points(self, pattern: re.Pattern, text: str, ends: Sequence[int]) -> List[int]:
+        """Token counts at which a chunk may end for each match of the pattern, ascending"""
+        positions = np.fromiter((match.end(1) for match in pattern.finditer(text)), dtype=np.int64)
+        if isinstance(ends, range):
+            # Character spans: the token count ending at a position is the position itself
+            points = np.minimum(positions, len(ends))
+        else:
+            points = np.searchsorted(np.frombuffer(ends, dtype=np.uint32), positions, side="right")
+        return np.unique(points).tolist()
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) character offsets of each chunk"""
+        starts, ends = self.tokenizer.spans(text)
+        token_count = len(starts)
+        if not token_count:
+            return
+        if token_count <= self.chunk_size:
+            yield starts[0], ends[-1]
+            return
+
+        break_levels = [
+            self._break_points(PARAGRAPH_BREAK, text, ends),
+            self._break_points(SENTENCE_BREAK, text, ends),
+        ]
+        min_fill = self.chunk_size // 2
+        start = 0
+        while True:
+            limit = start + self.chunk_size
+            if limit >= token_count:
+                yield starts[start], ends[token_count - 1]
+                return
+            end = self._last_break(break_levels, start + min_fill, limit) or limit
+            yield starts[start], ends[end - 1]
+            start = max(end - self.overlap, start + 1)
 
-class ChunkProcessor:
     @staticmethod
-    def create_chunks(elements, image_paths: List[str]) -> List[DocumentChunk]:
-        chunks = []
-        page_number = 1
-        
-        for element in elements:
-            metadata = {
-                "type": element.category,
-                "page_number": page_number,
-                "coordinates": element.metadata.coordinates
-            }
-            
-            if element.category == "Image":
-                img_data = DocumentProcessor.image_to_base64(
-                    next(p for p in image_paths if f"_page_{page_number}" in p)
+    def _last_break(break_levels: List[List[int]], low: int, high: int) -> Optional[int]:
+        for points in break_levels:
+            i = bisect_right(points, high) - 1
+            if i >= 0 and points[i] > low:
+                return points[i]
+        return None
+
+    def split(self, text: str) -> List[str]:
+        chunks = (text[start:end].strip() for start, end in self.spans(text))
+        return [chunk for chunk in chunks if chunk]
+
+_chunker: Optional[Chunker] = None
+_chunker_lock = threading.Lock()
+
+def get_chunker() -> Chunker:
+    """Return the chunker configured by CHUNK_TOKENIZER, CHUNK_SIZE and CHUNK_OVERLAP"""
+    global _chunker
+    if _chunker is None:
+        with _chunker_lock:
+            if _chunker is None:
+                _chunker = Chunker(
+                    get_tokenizer(Config.CHUNK_TOKENIZER),
+                    Config.CHUNK_SIZE,
+                    Config.CHUNK_OVERLAP
                 )
-                chunks.append(DocumentChunk(
-                    content=img_data,
-                    type="image",
-                    metadata=metadata,
-                    page_number=page_number
-                ))
-            else:
-                chunks.append(DocumentChunk(
-                    content=str(element),
-                    type=element.category.lower(),
-                    metadata=metadata,
-                    page_number=page_number
-                ))
-                
-            if element.metadata.page_number != page_number:
-                page_number = element.metadata.page_number
-                
-        return chunks
\ No newline at end of file
+    return _chunker
@@ -1,12 +1,18 @@
 from unstructured.partition.pdf import partition_pdf
 from unstructured.documents.elements import CompositeElement, Table
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.schemas.schemas import DocumentChunk
+from processing.chunking import get_chunker
 from config import Config
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import os
 import tempfile
+import threading
+import time
 import logging
 import PyPDF2
-from io import BytesIO
 # You might need a simple HTML to text converter for tables
 # from bs4 import BeautifulSoup # Example, install if used
 
@@ -15,6 +21,8 @@ logger = logging.getLogger(__name__)
 class PDFProcessor:
     def __init__(self):
         os.makedirs(Config.PDF_UPLOAD_DIR, exist_ok=True)
+        # Seconds spent extracting text and splitting it, including parse workers' share
+        self.timings = {"parse": 0.0, "chunk": 0.0}
         
     def _clean_table_html(self, html_content: str) -> str:
         """Basic HTML to text conversion for tables"""
@@ -24,27 +32,28 @@ class PDFProcessor:
         clean_text = re.sub(r'\s+', ' ', clean_text)
         return clean_text.strip()
 
-    def _extract_text_with_pypdf2(self, file_bytes: bytes) -> List[str]:
+    def count_pages(self, file_path: str) -> int:
+        """Return the number of pages in the PDF, or 0 if it cannot be read"""
+        try:
+            return len(PyPDF2.PdfReader(file_path).pages)
+        except Exception as e:
+            logger.warning(f"Failed to count PDF pages: {e}")
+            return 0
+
+    def _extract_text_with_pypdf2(self, file_path: str, starting_page_number: int = 1) -> List[DocumentChunk]:
         """Fallback text extraction using PyPDF2"""
         try:
             logger.info("Attempting text extraction with PyPDF2 fallback")
-            pdf_file = BytesIO(file_bytes)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            pdf_reader = PyPDF2.PdfReader(file_path)
             
             text_chunks = []
             for page_num, page in enumerate(pdf_reader.pages):
+                page_number = starting_page_number + page_num
                 try:
                     text = page.extract_text()
-                    if text.strip():
-                        # Split long pages into chunks
-                        words = text.split()
-                        if len(words) > 200:  # If page is too long, split it
-                            for i in range(0, len(words), 200):
-                                chunk = ' '.join(words[i:i+200])
-                                if chunk.strip():
-                                    text_chunks.append(chunk.strip())
-                        else:
-                            text_chunks.append(text.strip())
+                    # Split long pages into chunks
+                    for chunk in self._chunk_text(text or ""):
+                        text_chunks.append(self._make_chunk(chunk, "text", page_number))
                 except Exception as e:
                     logger.warning(f"Failed to extract text from page {page_num}: {e}")
                     continue
@@ -55,162 +64,163 @@ class PDFProcessor:
             logger.error(f"PyPDF2 fallback failed: {e}")
             return []
 
+    def _make_chunk(self, text: str, element_type: str, page_number: int) -> DocumentChunk:
+        return DocumentChunk(content=text, type=element_type, metadata={}, page_number=page_number)
+
     def _chunk_text(self, text: str) -> List[str]:
-        """Split text into smaller chunks with better semantic preservation"""
-        if len(text) <= Config.CHUNK_SIZE:
-            return [text]
-        
-        chunks = []
-        
-        # First, try to split by paragraphs
-        paragraphs = text.split('\n\n')
-        current_chunk = []
-        current_length = 0
+        """Split text into chunks of at most CHUNK_SIZE tokens with exact CHUNK_OVERLAP"""
+        started = time.perf_counter()
+        chunks = get_chunker().split(text)
+        self.timings["chunk"] += time.perf_counter() - started
+        if len(chunks) <= 1:
+            return chunks
+        # Drop fragments too short to be useful on their own
+        return [chunk for chunk in chunks if len(chunk) > Config.MIN_CHUNK_LENGTH] or chunks
+
+    def _partition_chunks(self, file_path: str, starting_page_number: int = 1) -> List[DocumentChunk]:
+        """Partition a PDF with unstructured and convert its elements to chunks"""
+        elements = partition_pdf(
+            filename=file_path,
+            strategy="fast",
+            max_characters=Config.CHUNK_SIZE,
+            new_after_n_chars=Config.CHUNK_SIZE,
+            combine_text_under_n_chars=Config.CHUNK_OVERLAP,
+            infer_table_structure=True,
+            starting_page_number=starting_page_number
+        )
         
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
-            if not paragraph:
-                continue
-                
-            # If adding this paragraph would exceed chunk size
-            if current_length + len(paragraph) + 2 > Config.CHUNK_SIZE and current_chunk:
-                # Add overlap from previous chunk if possible
-                chunk_text = '\n\n'.join(current_chunk)
-                if len(chunk_text) > Config.MIN_CHUNK_LENGTH:  # Only add if substantial
-                    chunks.append(chunk_text)
-                
-                # Start new chunk, potentially with overlap
-                if Config.CHUNK_OVERLAP > 0 and current_chunk:
-                    # Take last part of previous chunk for overlap
-                    last_para = current_chunk[-1]
-                    overlap_words = last_para.split()[-Config.CHUNK_OVERLAP//10:]  # Rough word estimate
-                    overlap_text = ' '.join(overlap_words)
-                    current_chunk = [overlap_text, paragraph] if len(overlap_text) > 20 else [paragraph]
-                    current_length = len(overlap_text) + len(paragraph) + 2
-                else:
-                    current_chunk = [paragraph]
-                    current_length = len(paragraph)
-            else:
-                # If paragraph itself is too long, split by sentences
-                if len(paragraph) > Config.CHUNK_SIZE:
-                    sentence_chunks = self._split_by_sentences(paragraph)
-                    for sentence_chunk in sentence_chunks:
-                        if current_length + len(sentence_chunk) + 2 > Config.CHUNK_SIZE and current_chunk:
-                            chunk_text = '\n\n'.join(current_chunk)
-                            if len(chunk_text) > Config.MIN_CHUNK_LENGTH:
-                                chunks.append(chunk_text)
-                            current_chunk = [sentence_chunk]
-                            current_length = len(sentence_chunk)
-                        else:
-                            current_chunk.append(sentence_chunk)
-                            current_length += len(sentence_chunk) + 2
+        processed_chunks = []
+        for el in elements:
+            try:
+                # Elements without page metadata inherit the range's first page
+                page_number = getattr(el.metadata, "page_number", None) or starting_page_number
+                if isinstance(el, CompositeElement):
+                    text = el.text.strip()
+                    if text:
+                        # Further chunk if needed
+                        chunks = self._chunk_text(text)
+                        processed_chunks.extend(self._make_chunk(chunk, "text", page_number) for chunk in chunks)
+                elif isinstance(el, Table):
+                    # Handle table elements
+                    if hasattr(el, 'metadata') and getattr(el.metadata, 'text_as_html', None):
+                        table_text = self._clean_table_html(el.metadata.text_as_html)
+                        if table_text:
+                            processed_chunks.append(self._make_chunk(f"[Table] {table_text}", "table", page_number))
+                    elif el.text:
+                        processed_chunks.append(self._make_chunk(f"[Table] {el.text.strip()}", "table", page_number))
                 else:
-                    current_chunk.append(paragraph)
-                    current_length += len(paragraph) + 2
-        
-        # Add remaining chunk
-        if current_chunk:
-            chunk_text = '\n\n'.join(current_chunk)
-            if len(chunk_text) > Config.MIN_CHUNK_LENGTH:
-                chunks.append(chunk_text)
-            
-        return chunks if chunks else [text]  # Fallback to original text
-    
-    def _split_by_sentences(self, text: str) -> List[str]:
-        """Split text by sentences, trying to preserve meaning"""
-        import re
-        
-        # Simple sentence splitting - can be enhanced with NLTK if needed
-        sentences = re.split(r'[.!?]+\s+', text)
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
+                    # Handle other element types
+                    if hasattr(el, 'text') and el.text:
+                        text = el.text.strip()
+                        if text:
+                            chunks = self._chunk_text(text)
+                            processed_chunks.extend(self._make_chunk(chunk, "text", page_number) for chunk in chunks)
+            except Exception as e:
+                logger.warning(f"Error processing element: {e}")
                 continue
-                
-            if current_length + len(sentence) + 1 > Config.CHUNK_SIZE and current_chunk:
-                chunks.append('. '.join(current_chunk) + '.')
-                current_chunk = [sentence]
-                current_length = len(sentence)
-            else:
-                current_chunk.append(sentence)
-                current_length += len(sentence) + 1
         
-        if current_chunk:
-            chunks.append('. '.join(current_chunk) + '.')
-            
+        # Filter out empty chunks
+        return [chunk for chunk in processed_chunks if chunk.content.strip()]
+
+    def _extract_chunks(self, file_path: str, starting_page_number: int = 1) -> List[DocumentChunk]:
+        """Extract chunks with unstructured, falling back to PyPDF2"""
+        started, chunk_seconds = time.perf_counter(), self.timings["chunk"]
+        try:
+            return self._extract_chunks_timed(file_path, starting_page_number)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.timings["parse"] += elapsed - (self.timings["chunk"] - chunk_seconds)
+
+    def _extract_chunks_timed(self, file_path: str, starting_page_number: int) -> List[DocumentChunk]:
+        # Try unstructured first
+        try:
+            processed_chunks = self._partition_chunks(file_path, starting_page_number)
+            if processed_chunks:
+                logger.info(f"Unstructured extracted {len(processed_chunks)} chunks")
+                return self._number_positions(processed_chunks)
+            logger.warning("Unstructured extraction returned no chunks, trying fallback")
+        except Exception as e:
+            logger.warning(f"Unstructured processing failed: {e}, trying fallback")
+        
+        # Fallback to PyPDF2
+        fallback_chunks = self._extract_text_with_pypdf2(file_path, starting_page_number)
+        if fallback_chunks:
+            logger.info(f"PyPDF2 fallback extracted {len(fallback_chunks)} chunks")
+        return self._number_positions(fallback_chunks)
+
+    def _number_positions(self, chunks: List[DocumentChunk]) -> List[DocumentChunk]:
+        """Record each chunk's reading-order position within its page"""
+        positions: Dict[int, int] = {}
+        for chunk in chunks:
+            position = positions.get(chunk.page_number, 0)
+            chunk.metadata["position"] = position
+            positions[chunk.page_number] = position + 1
         return chunks
 
-    def process_pdf(self, file_bytes: bytes, filename: str) -> List[str]:
-        """Process PDF with robust error handling and fallback methods"""
-        temp_file = None
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        """Split [0, page_count) into (start, end) ranges of PDF_PAGE_RANGE_SIZE pages"""
+        size = max(1, Config.PDF_PAGE_RANGE_SIZE)
+        return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+    def _use_parallel(self, page_count: int) -> bool:
+        return Config.PDF_PARSE_WORKERS > 1 and page_count >= Config.PDF_PARALLEL_MIN_PAGES
+
+    def iter_chunks(self, file_path: str, filename: str) -> Iterator[Tuple[int, List[DocumentChunk]]]:
+        """Yield (pages parsed so far, chunks) per page range, in page order"""
+        page_count = self.count_pages(file_path)
+        if page_count < Config.PDF_PARALLEL_MIN_PAGES:
+            yield page_count, self._extract_chunks(file_path)
+            return
+
+        ranges = self._page_ranges(page_count)
+        logger.info(f"Parsing {page_count} pages of {filename} in {len(ranges)} ranges")
+        if not self._use_parallel(page_count):
+            for start, end in ranges:
+                yield end, self._add_timings(_extract_page_range(file_path, start, end))
+            return
+
+        # Keep at most one task per worker in flight so parsed text never piles up
+        # ahead of the consumer; results are still yielded in page order
+        pool = get_parse_pool()
+        remaining = iter(ranges)
+        pending = deque()
+
+        def submit_next() -> None:
+            page_range = next(remaining, None)
+            if page_range is not None:
+                start, end = page_range
+                pending.append((end, pool.submit(_extract_page_range, file_path, start, end)))
+
         try:
-            # Create temporary file for processing
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(file_bytes)
-                temp_file_path = temp_file.name
-            
-            logger.info(f"Processing PDF: {filename} (size: {len(file_bytes)} bytes)")
-            
-            # Try unstructured first
-            try:
-                elements = partition_pdf(
-                    filename=temp_file_path,
-                    strategy="fast",
-                    max_characters=Config.CHUNK_SIZE,
-                    new_after_n_chars=Config.CHUNK_SIZE,
-                    combine_text_under_n_chars=Config.CHUNK_OVERLAP,
-                    infer_table_structure=True
-                )
-                
-                processed_chunks = []
-                for el in elements:
-                    try:
-                        if isinstance(el, CompositeElement):
-                            text = el.text.strip()
-                            if text:
-                                # Further chunk if needed
-                                chunks = self._chunk_text(text)
-                                processed_chunks.extend(chunks)
-                        elif isinstance(el, Table):
-                            # Handle table elements
-                            if hasattr(el, 'metadata') and hasattr(el.metadata, 'text_as_html'):
-                                table_text = self._clean_table_html(el.metadata.text_as_html)
-                                if table_text:
-                                    processed_chunks.append(f"[Table] {table_text}")
-                            elif el.text:
-                                processed_chunks.append(f"[Table] {el.text.strip()}")
-                        else:
-                            # Handle other element types
-                            if hasattr(el, 'text') and el.text:
-                                text = el.text.strip()
-                                if text:
-                                    chunks = self._chunk_text(text)
-                                    processed_chunks.extend(chunks)
-                    except Exception as e:
-                        logger.warning(f"Error processing element: {e}")
-                        continue
-                
-                # Filter out empty chunks
-                processed_chunks = [chunk for chunk in processed_chunks if chunk.strip()]
-                
-                if processed_chunks:
-                    logger.info(f"Unstructured extracted {len(processed_chunks)} chunks")
-                    return processed_chunks
-                else:
-                    logger.warning("Unstructured extraction returned no chunks, trying fallback")
-                    
-            except Exception as e:
-                logger.warning(f"Unstructured processing failed: {e}, trying fallback")
+            for _ in range(Config.PDF_PARSE_WORKERS):
+                submit_next()
+            while pending:
+                end, future = pending.popleft()
+                range_chunks = self._add_timings(future.result())
+                submit_next()
+                yield end, range_chunks
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def _add_timings(self, result: Tuple[List[DocumentChunk], Dict[str, float]]) -> List[DocumentChunk]:
+        """Fold a page range's timings into this processor's and return its chunks"""
+        range_chunks, timings = result
+        for stage, seconds in timings.items():
+            self.timings[stage] += seconds
+        return range_chunks
+
+    def process_pdf(self, file_path: str, filename: str) -> List[DocumentChunk]:
+        """Process a PDF already on disk with robust error handling and fallback methods"""
+        try:
+            logger.info(f"Processing PDF: {filename} (size: {os.path.getsize(file_path)} bytes)")
             
-            # Fallback to PyPDF2
-            fallback_chunks = self._extract_text_with_pypdf2(file_bytes)
-            if fallback_chunks:
-                logger.info(f"PyPDF2 fallback extracted {len(fallback_chunks)} chunks")
-                return fallback_chunks
+            chunks = []
+            for _, range_chunks in self.iter_chunks(file_path, filename):
+                chunks.extend(range_chunks)
+
+            if chunks:
+                return chunks
             
             # If all methods fail, raise an error
             raise ValueError("No text could be extracted from the PDF document")
@@ -218,10 +228,50 @@ class PDFProcessor:
         except Exception as e:
             logger.error(f"PDF processing failed for {filename}: {e}")
             raise ValueError(f"Failed to extract text from document: {str(e)}")
-        finally:
-            # Clean up temporary file
-            if temp_file and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except Exception as e:
-                    logger.warning(f"Failed to clean up temp file: {e}")
\ No newline at end of file
+
+def _write_page_range(file_path: str, start: int, end: int) -> str:
+    """Copy pages [start, end) of a PDF into a temporary file and return its path"""
+    reader = PyPDF2.PdfReader(file_path)
+    writer = PyPDF2.PdfWriter()
+    for page_index in range(start, end):
+        writer.add_page(reader.pages[page_index])
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(file_path) or None,
+        suffix=f".p{start + 1}-{end}.pdf",
+        delete=False
+    ) as range_file:
+        writer.write(range_file)
+        return range_file.name
+
+def _extract_page_range(file_path: str, start: int, end: int) -> Tuple[List[DocumentChunk], Dict[str, float]]:
+    """Parse worker entry point: extract chunks for pages [start, end) of a PDF, with stage timings"""
+    range_path = _write_page_range(file_path, start, end)
+    try:
+        processor = PDFProcessor()
+        return processor._extract_chunks(range_path, starting_page_number=start + 1), processor.timings
+    finally:
+        os.unlink(range_path)
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Return the shared PDF parse process pool, creating it on first use"""
+    global _parse_pool
+    if _parse_pool is None:
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                # spawn: forking a process that already runs ingestion and HTTP threads is unsafe
+                _parse_pool = ProcessPoolExecutor(
+                    max_workers=Config.PDF_PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _parse_pool
+
+def shutdown_parse_pool() -> None:
+    """Stop the parse worker processes"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
@@ -0,0 +1,61 @@
+"""Fixtures shared by the endpoint tests
+
+The backend reads its settings when config is first imported, so the environment
+below is set at collection time: every path under a temporary directory, and both
+upstream APIs pointed at the local stand-ins from benchmarks.fake_services.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from benchmarks.fake_services import FakeServices
+
+_services = FakeServices(embedding_latency=0, ttft=0, tokens_per_second=0, answer_tokens=5)
+_workdir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.update(_services.environment())
+os.environ.update({
+    "CHROMA_PATH": os.path.join(_workdir, "chroma"),
+    "PDF_UPLOAD_DIR": os.path.join(_workdir, "uploads"),
+    "PDF_PARSE_WORKERS": "1",
+})
+
+@pytest.fixture(scope="session")
+def client():
+    """The app with its lifespan running against the fake upstream APIs
+
+    The lifespan shuts down process-wide executors, so it runs once per test session.
+    """
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with _services, TestClient(main.app, base_url="http://localhost") as test_client:
+        yield test_client
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def pdf_file(tmp_path_factory):
+    from benchmarks.synthetic_pdf import write_pdf
+
+    return write_pdf(str(tmp_path_factory.mktemp("pdfs") / "doc.pdf"), pages=2)
+
+@pytest.fixture
+def upload(client):
+    """Upload a PDF as a new session, or as a document of an existing one, and wait for ingestion"""
+    def upload(path: str, session_id: str = None, filename: str = "doc.pdf") -> dict:
+        url = f"/sessions/{session_id}/documents" if session_id else "/upload"
+        with open(path, "rb") as pdf:
+            response = client.post(url, files={"file": (filename, pdf, "application/pdf")})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            status = client.get(f"/sessions/{body['session_id']}/status").json()
+            if status["status"] != "processing":
+                return {**body, "status": status["status"]}
+            time.sleep(0.05)
+        raise AssertionError(f"Session {body['session_id']} still processing")
+    return upload
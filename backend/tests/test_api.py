@@ -0,0 +1,20 @@
+import main
+from benchmarks.synthetic_pdf import write_pdf
+
+def collection_of(session_id: str) -> str:
+    return main.session_manager.get(session_id).collection_name
+
+def test_changing_a_shared_session_keeps_the_index_reusable(client, upload, pdf_file, tmp_path):
+    first = upload(pdf_file)
+    second = upload(pdf_file)
+    assert first["status"] == second["status"] == "active"
+    shared = collection_of(first["session_id"])
+    assert collection_of(second["session_id"]) == shared
+
+    added = upload(write_pdf(str(tmp_path / "other.pdf"), pages=1, seed=1), session_id=second["session_id"])
+    assert collection_of(second["session_id"]) != shared
+    response = client.delete(f"/sessions/{second['session_id']}/documents/{added['doc_id']}")
+    assert response.status_code == 200, response.text
+
+    third = upload(pdf_file)
+    assert collection_of(third["session_id"]) == shared
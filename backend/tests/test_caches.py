@@ -0,0 +1,97 @@
+import pytest
+
+from app.services import query_cache as query_cache_module
+from app.services.answer_cache import AnswerCache
+from app.services.query_cache import QueryResultCache, normalize_question
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache_module.time, "time", clock)
+    return clock
+
+def cache(**overrides) -> QueryResultCache:
+    settings = {"max_entries_per_session": 2, "max_sessions": 2, "ttl": 60, "similarity_threshold": 0.9}
+    settings.update(overrides)
+    return QueryResultCache(**settings)
+
+def test_questions_are_normalised():
+    assert normalize_question("  What is  the Encoder?! ") == "what is the encoder"
+
+def test_hit_on_a_normalised_question(clock):
+    results = cache()
+    results.put("s", "What is the encoder?", "context", ["Page 1"])
+    assert results.get("s", "what is the ENCODER").context_str == "context"
+    assert results.get("other", "what is the encoder") is None
+    assert results.stats()["hits"] == 1 and results.stats()["misses"] == 1
+
+def test_entries_expire_after_the_ttl(clock):
+    results = cache()
+    results.put("s", "question", "context", [])
+    clock.now += 59
+    assert results.get("s", "question") is not None
+    clock.now += 2
+    assert results.get("s", "question") is None
+
+def test_least_recently_used_entries_and_sessions_are_evicted(clock):
+    results = cache()
+    results.put("s", "one", "1", [])
+    results.put("s", "two", "2", [])
+    results.get("s", "one")
+    results.put("s", "three", "3", [])
+    assert results.get("s", "two") is None
+    assert results.get("s", "one") is not None
+
+    results.put("t", "q", "t", [])
+    results.put("u", "q", "u", [])
+    assert results.get("s", "one") is None
+    assert results.get("u", "q") is not None
+
+def test_invalidate_drops_document_filtered_scopes(clock):
+    results = cache(max_sessions=10)
+    results.put("s", "q", "all", [])
+    results.put("s|doc", "q", "filtered", [])
+    results.put("sx", "q", "other session", [])
+    results.invalidate("s")
+    assert results.get("s", "q") is None
+    assert results.get("s|doc", "q") is None
+    assert results.get("sx", "q") is not None
+
+def test_similar_questions_hit_above_the_threshold(clock):
+    results = cache()
+    results.put("s", "what is the encoder", "context", [], embedding=[1.0, 0.0])
+    assert results.get_similar("s", [0.95, 0.05]).context_str == "context"
+    assert results.get_similar("s", [0.5, 0.5]) is None
+    clock.now += 61
+    assert results.get_similar("s", [1.0, 0.0]) is None
+
+def test_answer_cache_evicts_least_recently_used():
+    answers = AnswerCache(max_entries=2, max_bytes=1024)
+    answers.put("a", ["one"])
+    answers.put("b", ["two"])
+    assert answers.get("a") == ["one"]
+    answers.put("c", ["three"])
+    assert answers.get("b") is None
+    assert answers.get("a") == ["one"] and answers.get("c") == ["three"]
+    assert answers.stats()["evictions"] == 1
+
+def test_answer_cache_is_bounded_by_bytes():
+    answers = AnswerCache(max_entries=10, max_bytes=10)
+    answers.put("a", ["12345"])
+    answers.put("b", ["123456"])
+    assert answers.get("a") is None
+    assert answers.stats()["bytes"] == 6
+    answers.put("huge", ["x" * 11])
+    assert answers.get("huge") is None
+
+def test_answer_cache_key_ignores_unrelated_fields():
+    payload = {"model": "m", "messages": [{"role": "user", "content": "q"}], "temperature": 0, "stream": True}
+    assert AnswerCache.make_key(payload) == AnswerCache.make_key({**payload, "stream": False})
+    assert AnswerCache.make_key(payload) != AnswerCache.make_key({**payload, "temperature": 0.5})
@@ -0,0 +1,58 @@
+import pytest
+
+from processing.chunking import CharacterTokenizer, Chunker, WordTokenizer
+
+def words(count: int) -> str:
+    return " ".join(f"w{i}" for i in range(count))
+
+def test_short_text_is_one_chunk():
+    assert Chunker(CharacterTokenizer(), 100, 10).split("A short text.") == ["A short text."]
+
+def test_empty_text_has_no_chunks():
+    assert Chunker(CharacterTokenizer(), 100, 10).split("") == []
+    assert Chunker(WordTokenizer(), 100, 10).split("   ") == []
+
+@pytest.mark.parametrize("chunk_size, overlap", [(0, 0), (10, 10), (10, -1)])
+def test_rejects_invalid_sizes(chunk_size, overlap):
+    with pytest.raises(ValueError):
+        Chunker(CharacterTokenizer(), chunk_size, overlap)
+
+def test_chunks_never_exceed_chunk_size():
+    text = ("Sentence number one is here. " * 40 + "\n\n") * 5
+    chunker = Chunker(CharacterTokenizer(), 300, 50)
+    spans = list(chunker.spans(text))
+    assert len(spans) > 1
+    assert all(end - start <= 300 for start, end in spans)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+
+def test_consecutive_chunks_share_exactly_the_overlap():
+    # No sentence or paragraph breaks, so every chunk ends at the window edge
+    text = words(100)
+    chunker = Chunker(WordTokenizer(), 10, 3)
+    chunks = [chunk.split() for chunk in chunker.split(text)]
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    for previous, following in zip(chunks, chunks[1:]):
+        assert previous[-3:] == following[:3]
+    assert chunks[-1][-1] == "w99"
+
+def test_chunks_cover_the_whole_text():
+    text = words(57)
+    chunks = Chunker(WordTokenizer(), 10, 2).split(text)
+    covered = {word for chunk in chunks for word in chunk.split()}
+    assert covered == set(text.split())
+
+def test_prefers_a_paragraph_break_in_the_second_half_of_the_window():
+    first = "a" * 70 + ". " + "b" * 10
+    text = first + "\n\n" + "c" * 200
+    chunks = Chunker(CharacterTokenizer(), 100, 0).split(text)
+    assert chunks[0] == first
+
+def test_falls_back_to_a_sentence_break():
+    text = "x" * 60 + ". " + "y" * 200
+    chunks = Chunker(CharacterTokenizer(), 100, 0).split(text)
+    assert chunks[0] == "x" * 60 + "."
+
+def test_ignores_breaks_in_the_first_half_of_the_window():
+    text = "x" * 10 + ". " + "y" * 200
+    chunks = Chunker(CharacterTokenizer(), 100, 0).split(text)
+    assert len(chunks[0]) == 100
@@ -0,0 +1,73 @@
+from app.services import context_assembler as context_assembler_module
+from app.services.context_assembler import ContextAssembler, ContextPiece, chunk_position, overlap_length
+from processing.chunking import WordTokenizer
+
+def sentence(label: str, count: int) -> str:
+    return " ".join(f"{label}{i}" for i in range(count))
+
+def assembler(budget: int) -> ContextAssembler:
+    return ContextAssembler(WordTokenizer(), budget)
+
+def test_chunk_position_parses_only_numbered_ids():
+    assert chunk_position("doc-1_7") == ("doc-1", 7)
+    assert chunk_position("doc") is None
+    assert chunk_position("doc_x") is None
+
+def test_overlap_length_finds_the_shared_suffix():
+    shared = "the shared overlap between chunks"
+    assert overlap_length("first part " + shared, shared + " second part") == len(shared)
+    assert overlap_length("short", "short") == 0
+    assert overlap_length("a" * 30 + " no overlap here", "completely different text here") == 0
+
+def test_packs_best_first_within_the_budget():
+    pieces = [ContextPiece(f"d_{i * 10}", sentence(f"c{i}x", 40), f"Page {i}") for i in range(5)]
+    result = assembler(100).assemble(pieces)
+    assert result.tokens <= 100
+    assert result.sources == ["Page 0", "Page 1"]
+    assert result.chunks == 2
+
+def test_skips_a_chunk_that_does_not_fit_for_a_smaller_one():
+    pieces = [
+        ContextPiece("d_0", sentence("a", 40), "Page 1"),
+        ContextPiece("d_10", sentence("b", 80), "Page 2"),
+        ContextPiece("d_20", sentence("c", 20), "Page 3"),
+    ]
+    result = assembler(80).assemble(pieces)
+    assert result.sources == ["Page 1", "Page 3"]
+    assert "b0" not in result.text
+
+def test_truncates_a_top_chunk_larger_than_the_budget():
+    result = assembler(30).assemble([ContextPiece("d_0", sentence("a", 100), "Page 1")])
+    assert result.chunks == 1
+    assert result.tokens <= 30
+    assert result.text.startswith("[Page 1]\na0 a1")
+
+def test_merges_neighbouring_chunks_and_sends_their_overlap_once():
+    overlap = sentence("shared", 10)
+    first = sentence("first", 20) + " " + overlap
+    second = overlap + " " + sentence("second", 20)
+    result = assembler(1000).assemble([
+        ContextPiece("doc_1", second, "Page 2"),
+        ContextPiece("doc_0", first, "Page 1"),
+    ])
+    assert result.text.count("shared0") == 1
+    assert result.text.startswith("[Page 1; Page 2]\nfirst0")  # Labels in document order
+    assert result.text.index("first19") < result.text.index("shared0") < result.text.index("second0")
+    assert result.tokens_trimmed == 10
+    assert result.sources == ["Page 2", "Page 1"]
+
+def test_chunks_of_different_documents_stay_separate():
+    result = assembler(1000).assemble([
+        ContextPiece("a_0", sentence("a", 10), "a.pdf, Page 1"),
+        ContextPiece("b_1", sentence("b", 10), "b.pdf, Page 1"),
+    ])
+    assert result.text.count("\n\n") == 1
+    assert result.tokens_trimmed == 0
+
+def test_an_unloadable_tokenizer_falls_back_to_words(monkeypatch):
+    def offline(name):
+        raise OSError("could not download the encoding")
+
+    monkeypatch.setattr(context_assembler_module, "get_tokenizer", offline)
+    monkeypatch.setattr(context_assembler_module, "_context_assembler", None)
+    assert isinstance(context_assembler_module.get_context_assembler().tokenizer, WordTokenizer)
@@ -0,0 +1,74 @@
+import pytest
+
+from app.services import embedding_cache as embedding_cache_module
+from app.services.embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        self.now += 1
+        return self.now
+
+class CountingProvider:
+    """Embeds a text as [its length], recording every text it was asked for"""
+
+    def __init__(self, model_name: str = "text-embedding-004", task_type: str = "RETRIEVAL_DOCUMENT"):
+        self.model_name = model_name
+        self.task_type = task_type
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch) -> EmbeddingCache:
+    # Every access gets a later timestamp, so recency is unambiguous
+    monkeypatch.setattr(embedding_cache_module.time, "time", Clock())
+    return EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), max_entries=2)
+
+def test_least_recently_used_entries_are_evicted(cache):
+    cache.put_many({"a": [1.0], "b": [2.0]})
+    assert cache.get_many(["a"]) == {"a": [1.0]}
+    cache.put_many({"c": [3.0]})
+    assert cache.get_many(["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+    assert cache.stats()["evictions"] == 1 and cache.stats()["entries"] == 2
+
+def test_hits_and_misses_are_counted_per_distinct_key(cache):
+    cache.put_many({"a": [1.0]})
+    cache.get_many(["a", "a", "b"])
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["hit_rate"] == 0.5
+
+def test_entries_survive_reopening(cache):
+    cache.put_many({"a": [0.5, -0.25]})
+    reopened = EmbeddingCache(cache.path, max_entries=2)
+    assert reopened.get_many(["a"]) == {"a": [0.5, -0.25]}
+    assert reopened.stats()["entries"] == 1
+
+def test_keys_separate_models_and_task_types():
+    key = EmbeddingCache.make_key("text-embedding-004", "RETRIEVAL_DOCUMENT", "text")
+    assert key == EmbeddingCache.make_key("text-embedding-004", "RETRIEVAL_DOCUMENT", "text")
+    assert key != EmbeddingCache.make_key("embedding-001", "RETRIEVAL_DOCUMENT", "text")
+    assert key != EmbeddingCache.make_key("text-embedding-004", "RETRIEVAL_QUERY", "text")
+    # Parts are delimited, so shifting characters between them changes the key
+    assert EmbeddingCache.make_key("ab", "c", "d") != EmbeddingCache.make_key("a", "bc", "d")
+
+def test_only_missing_texts_reach_the_provider_once_each(cache):
+    provider = CountingProvider()
+    cached = CachedEmbeddingFunction(provider, cache)
+    assert cached(["one", "three", "one"]) == [[3.0], [5.0], [3.0]]
+    assert provider.calls == [["one", "three"]]
+    assert cached(["three", "one"]) == [[5.0], [3.0]]
+    assert len(provider.calls) == 1
+
+def test_another_model_or_task_type_misses_the_cache(cache):
+    CachedEmbeddingFunction(CountingProvider(), cache)(["text"])
+    other_model = CountingProvider(model_name="embedding-001")
+    other_task = CountingProvider(task_type="RETRIEVAL_QUERY")
+    CachedEmbeddingFunction(other_model, cache)(["text"])
+    CachedEmbeddingFunction(other_task, cache)(["text"])
+    assert other_model.calls == [["text"]] and other_task.calls == [["text"]]
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import urllib3.util.retry
+
+from app.services.embedding_provider import (
+    EmbeddingError, GoogleEmbeddingFunction, embedding_tag, same_embedding_space
+)
+from config import Config
+
+class Response:
+    def __init__(self, status_code: int, vectors=()):
+        self.status_code = status_code
+        self.text = "error"
+        self.vectors = vectors
+
+    def json(self):
+        return {"embeddings": [{"values": vector} for vector in self.vectors]}
+
+def provider(monkeypatch, *responses) -> GoogleEmbeddingFunction:
+    fn = GoogleEmbeddingFunction(api_key="key", model_name="models/text-embedding-004")
+    calls = iter(responses)
+    monkeypatch.setattr(fn.session, "post", lambda *args, **kwargs: next(calls))
+    return fn
+
+class EchoSession:
+    """Answers batchEmbedContents with [batch number, position] vectors, after an optional per-batch delay"""
+
+    def __init__(self, delay=lambda batch: 0.0):
+        self.delay = delay
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, params, data, timeout):
+        texts = [request["content"]["parts"][0]["text"] for request in json.loads(data)["requests"]]
+        with self.lock:
+            batch = len(self.batches)
+            self.batches.append(texts)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay(batch))
+        with self.lock:
+            self.in_flight -= 1
+        return Response(200, [[float(text.split()[1])] for text in texts])
+
+def batched_provider(monkeypatch, session: EchoSession, batch_size: int, concurrency: int) -> GoogleEmbeddingFunction:
+    monkeypatch.setattr(Config, "EMBEDDING_BATCH_SIZE", batch_size)
+    monkeypatch.setattr(Config, "EMBEDDING_MAX_CONCURRENCY", concurrency)
+    fn = GoogleEmbeddingFunction(api_key="key", model_name="models/text-embedding-004")
+    fn.session = session
+    return fn
+
+def texts(count: int) -> list:
+    return [f"text {i}" for i in range(count)]
+
+def test_inputs_are_split_into_batches_of_the_configured_size(monkeypatch):
+    session = EchoSession()
+    fn = batched_provider(monkeypatch, session, batch_size=2, concurrency=1)
+    fn(texts(5))
+    assert sorted(len(batch) for batch in session.batches) == [1, 2, 2]
+    fn(texts(2))
+    assert len(session.batches) == 4
+
+def test_batches_run_concurrently_up_to_the_limit(monkeypatch):
+    session = EchoSession(delay=lambda batch: 0.05)
+    fn = batched_provider(monkeypatch, session, batch_size=1, concurrency=3)
+    started = time.perf_counter()
+    fn(texts(6))
+    assert session.max_in_flight == 3
+    assert time.perf_counter() - started < 6 * 0.05
+
+def test_embeddings_keep_input_order_across_batches(monkeypatch):
+    # Earlier batches answer last
+    session = EchoSession(delay=lambda batch: 0.05 * (3 - batch) if batch < 3 else 0.0)
+    fn = batched_provider(monkeypatch, session, batch_size=2, concurrency=4)
+    assert [list(vector) for vector in fn(texts(7))] == [[float(i)] for i in range(7)]
+
+def test_dimension_comes_from_the_first_response_without_a_probe(monkeypatch):
+    fn = provider(monkeypatch, Response(200, [[0.1, 0.2, 0.3]]))
+    assert fn.dimension is None
+    assert embedding_tag(fn) == "google-generative-ai/text-embedding-004"
+    fn(["question"])
+    assert fn.dimension == 3
+    assert embedding_tag(fn) == "google-generative-ai/text-embedding-004/3"
+
+def test_failed_requests_raise_embedding_errors(monkeypatch):
+    fn = provider(monkeypatch, Response(500))
+    with pytest.raises(EmbeddingError):
+        fn(["question"])
+
+def test_tags_compare_dimensions_only_where_both_know_them():
+    assert same_embedding_space("google-generative-ai/text-embedding-004/768", "google-generative-ai/text-embedding-004")
+    assert not same_embedding_space("google-generative-ai/text-embedding-004/768",
+                                    "google-generative-ai/text-embedding-004/3072")
+    assert not same_embedding_space("sentence-transformers/all-MiniLM-L6-v2/384",
+                                    "google-generative-ai/text-embedding-004/384")
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        statuses = self.server.statuses
+        status = statuses.pop(0) if statuses else 200
+        self.server.requests += 1
+        body = json.dumps({"embeddings": [{"values": [1.0, 0.0]}]} if status == 200 else {"error": "busy"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def flaky_api(monkeypatch):
+    """Local embedding endpoint answering with queued error statuses before succeeding"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyHandler)
+    server.statuses, server.requests = [], 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(Config, "GOOGLE_API_BASE", f"http://127.0.0.1:{server.server_address[1]}/v1beta/")
+    monkeypatch.setattr(Config, "EMBEDDING_BACKOFF_FACTOR", 0.01)
+    sleeps = []
+    monkeypatch.setattr(urllib3.util.retry, "time", types.SimpleNamespace(sleep=sleeps.append, time=time.time))
+    server.sleeps = sleeps
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_throttled_and_failed_batches_are_retried_with_backoff(monkeypatch, flaky_api):
+    monkeypatch.setattr(Config, "EMBEDDING_MAX_RETRIES", 5)
+    flaky_api.statuses = [429, 503, 500]
+    fn = GoogleEmbeddingFunction(api_key="key", model_name="models/text-embedding-004")
+    assert [list(vector) for vector in fn(["question"])] == [[1.0, 0.0]]
+    assert flaky_api.requests == 4
+    # Exponential: no wait before the first retry, then backoff_factor * 2 ** (n - 1)
+    assert flaky_api.sleeps == pytest.approx([0.02, 0.04])
+
+def test_retries_give_up_after_the_configured_count(monkeypatch, flaky_api):
+    monkeypatch.setattr(Config, "EMBEDDING_MAX_RETRIES", 2)
+    flaky_api.statuses = [503] * 10
+    fn = GoogleEmbeddingFunction(api_key="key", model_name="models/text-embedding-004")
+    with pytest.raises(EmbeddingError, match="503"):
+        fn(["question"])
+    assert flaky_api.requests == 3
+
+def test_client_errors_are_not_retried(monkeypatch, flaky_api):
+    flaky_api.statuses = [400]
+    fn = GoogleEmbeddingFunction(api_key="key", model_name="models/text-embedding-004")
+    with pytest.raises(EmbeddingError, match="400"):
+        fn(["question"])
+    assert flaky_api.requests == 1
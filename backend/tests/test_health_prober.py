@@ -0,0 +1,68 @@
+import asyncio
+
+import main
+from app.services.health_prober import HealthProber
+
+class Dependency:
+    """A check that fails while `up` is false and counts how often it ran"""
+
+    def __init__(self, up: bool = True, delay: float = 0):
+        self.up = up
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if not self.up:
+            raise ConnectionError("refused")
+
+def prober_for(**checks) -> HealthProber:
+    return HealthProber(checks, critical=("store",), interval=60, timeout=0.1)
+
+def test_status_is_starting_until_the_first_probe():
+    prober = prober_for(store=Dependency())
+    assert prober.status() == "starting"
+    assert prober.results["store"]["status"] == "unknown"
+    asyncio.run(prober.probe())
+    assert prober.status() == "ready"
+
+def test_a_failure_is_cached_until_the_next_probe_sees_recovery():
+    store, api = Dependency(), Dependency(up=False)
+    prober = prober_for(store=store, api=api)
+    asyncio.run(prober.probe())
+    assert prober.results["api"]["status"] == "error"
+    assert prober.results["api"]["error"] == "ConnectionError"
+    assert prober.status() == "degraded"
+
+    # Recovery is invisible until the prober runs again
+    api.up = True
+    assert prober.status() == "degraded"
+    asyncio.run(prober.probe())
+    assert (prober.results["api"]["status"], prober.results["api"]["error"]) == ("connected", None)
+    assert prober.status() == "ready"
+
+    store.up = False
+    asyncio.run(prober.probe())
+    assert prober.status() == "unavailable"
+
+def test_a_slow_check_counts_as_failed_after_the_timeout():
+    prober = prober_for(store=Dependency(delay=1))
+    asyncio.run(prober.probe())
+    assert prober.results["store"]["status"] == "error"
+    assert prober.results["store"]["error"] == "Timed out after 0.1s"
+    assert prober.status() == "unavailable"
+
+def test_ready_reads_the_cached_results_without_probing(client, monkeypatch):
+    checks = {name: Dependency() for name in main.health_prober.checks}
+    monkeypatch.setattr(main.health_prober, "checks", checks)
+    cached = {**main.health_prober.results["openrouter"], "status": "error", "error": "ConnectionError"}
+    monkeypatch.setitem(main.health_prober.results, "openrouter", cached)
+
+    for _ in range(3):
+        response = client.get("/ready")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "degraded"
+        assert body["services"]["openrouter"]["error"] == "ConnectionError"
+    assert [check.calls for check in checks.values()] == [0] * len(checks)
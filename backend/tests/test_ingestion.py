@@ -0,0 +1,89 @@
+import os
+import queue
+import threading
+import time
+
+import main
+from benchmarks.synthetic_pdf import write_pdf
+from config import Config
+
+class FakeProcessor:
+    """Yields one page range at a time and counts how many it has produced"""
+
+    def __init__(self, ranges: int, fail_at: int = None):
+        self.ranges = ranges
+        self.fail_at = fail_at
+        self.produced = 0
+
+    def iter_chunks(self, file_path, filename):
+        for i in range(self.ranges):
+            if i == self.fail_at:
+                raise ValueError("corrupt page")
+            self.produced += 1
+            yield i + 1, [f"chunk {i}"]
+
+def start_parser(processor: FakeProcessor, chunk_queue: queue.Queue, stop: threading.Event) -> threading.Thread:
+    parser = threading.Thread(
+        target=main._parse_into_queue, args=(processor, "doc.pdf", "doc.pdf", chunk_queue, stop), daemon=True
+    )
+    parser.start()
+    return parser
+
+def test_the_parser_blocks_on_a_full_queue_until_stopped():
+    processor, chunk_queue, stop = FakeProcessor(ranges=20), queue.Queue(maxsize=2), threading.Event()
+    parser = start_parser(processor, chunk_queue, stop)
+    parser.join(timeout=0.3)
+    assert parser.is_alive()
+    # One range beyond the queue waits in the parser for room
+    assert chunk_queue.qsize() == 2 and processor.produced == 3
+
+    stop.set()
+    parser.join(timeout=2)
+    assert not parser.is_alive()
+    assert processor.produced == 3
+
+def test_a_slow_consumer_holds_the_parser_back():
+    processor, chunk_queue = FakeProcessor(ranges=10), queue.Queue(maxsize=2)
+    parser = start_parser(processor, chunk_queue, threading.Event())
+    consumed = 0
+    while chunk_queue.get(timeout=5) is not None:
+        consumed += 1
+        time.sleep(0.02)
+        assert processor.produced - consumed <= chunk_queue.maxsize + 1
+    parser.join(timeout=2)
+    assert consumed == 10 and not parser.is_alive()
+
+def test_a_parser_error_ends_the_stream():
+    processor, chunk_queue = FakeProcessor(ranges=10, fail_at=2), queue.Queue(maxsize=2)
+    parser = start_parser(processor, chunk_queue, threading.Event())
+    items = [chunk_queue.get(timeout=5) for _ in range(3)]
+    parser.join(timeout=2)
+    assert [item[0] for item in items[:2]] == [1, 2]
+    assert isinstance(items[2], ValueError)
+    assert not parser.is_alive() and chunk_queue.empty()
+
+def test_a_parser_error_fails_the_document_and_removes_its_chunks(upload, monkeypatch, tmp_path):
+    iter_chunks = main.PDFProcessor.iter_chunks
+
+    def fail_after_first_range(self, file_path, filename):
+        for item in iter_chunks(self, file_path, filename):
+            yield item
+            raise ValueError("corrupt page")
+
+    monkeypatch.setattr(main.PDFProcessor, "iter_chunks", fail_after_first_range)
+    # Index every chunk as soon as it is parsed, so the failure leaves some behind
+    monkeypatch.setattr(Config, "EMBEDDING_BATCH_SIZE", 1)
+    monkeypatch.setattr(Config, "EMBEDDING_MAX_CONCURRENCY", 1)
+
+    uploaded = upload(write_pdf(str(tmp_path / "broken.pdf"), pages=1, seed=2))
+    assert uploaded["status"] == "failed"
+    session = main.session_manager.get(uploaded["session_id"])
+    assert "corrupt page" in session.error
+    # The status turns failed before the job cleans up; the spooled file goes last
+    spool_dir = os.path.join(Config.PDF_UPLOAD_DIR, "spool")
+    deadline = time.time() + 10
+    while os.listdir(spool_dir) and time.time() < deadline:
+        time.sleep(0.05)
+    assert os.listdir(spool_dir) == []
+    collection = main.get_chroma().get_collection(session.collection_name)
+    assert collection.get(where={"doc_id": session.collection_name})["ids"] == []
@@ -0,0 +1,63 @@
+from app.services.lexical_index import BM25Index, LexicalIndexStore, tokenize
+
+def build() -> BM25Index:
+    index = BM25Index()
+    index.add(
+        ["a", "b", "c"],
+        ["the encoder maps tokens", "encoder encoder decoder stack", "unrelated text about cooking"]
+    )
+    return index
+
+def test_tokenize_drops_single_characters_and_case():
+    assert tokenize("The Encoder, a 2-layer STACK") == ["the", "encoder", "layer", "stack"]
+
+def test_search_ranks_by_term_frequency():
+    results = build().search("encoder", 10)
+    assert [doc_id for doc_id, _ in results] == ["b", "a"]
+    assert results[0][1] > results[1][1] > 0
+
+def test_search_only_returns_positive_scores_up_to_limit():
+    index = build()
+    assert index.search("cooking", 10) == [("c", index.search("cooking", 10)[0][1])]
+    assert len(index.search("encoder decoder cooking", 2)) == 2
+    assert index.search("missing", 10) == []
+
+def test_remove_tombstones_documents():
+    index = build()
+    index.remove(["b"])
+    assert len(index) == 2
+    assert [doc_id for doc_id, _ in index.search("encoder", 10)] == ["a"]
+    assert index.search("decoder", 10) == []
+
+def test_readding_an_id_replaces_it():
+    index = build()
+    index.add(["a"], ["now about cooking only"])
+    assert len(index) == 3
+    assert "a" not in [doc_id for doc_id, _ in index.search("encoder", 10)]
+    assert {doc_id for doc_id, _ in index.search("cooking", 10)} == {"a", "c"}
+
+def test_accept_filters_results():
+    results = build().search("encoder", 10, accept=lambda doc_id: doc_id != "b")
+    assert [doc_id for doc_id, _ in results] == ["a"]
+
+def test_save_and_load_keep_scores_and_drop_tombstones(tmp_path):
+    index = build()
+    index.remove(["c"])
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 2
+    assert loaded.search("encoder decoder", 10) == index.search("encoder decoder", 10)
+
+def test_store_defers_saves_until_flush(tmp_path):
+    store = LexicalIndexStore(str(tmp_path), cache_size=4)
+    store.add_documents("session", ["a"], ["encoder layers"], persist=False)
+    assert not (tmp_path / "session.npz").exists()
+    store.flush("session")
+    assert BM25Index.load(str(tmp_path / "session.npz")).search("encoder", 1)[0][0] == "a"
+
+def test_store_saves_deferred_changes_on_eviction(tmp_path):
+    store = LexicalIndexStore(str(tmp_path), cache_size=1)
+    store.add_documents("first", ["a"], ["encoder layers"], persist=False)
+    store.add_documents("second", ["b"], ["decoder layers"])
+    assert store.search("first", "encoder", 1)[0][0] == "a"
@@ -0,0 +1,17 @@
+from app.services.metrics import INGEST_DOCUMENTS, CallbackMetric, render
+
+def test_render_includes_instrumented_and_callback_metrics():
+    INGEST_DOCUMENTS.labels("active").inc()
+    CallbackMetric("rag_test_entries", "Entries of a test cache", "gauge",
+                   lambda: {("query",): 3, ("answer",): 1}, ["cache"])
+    text = render().decode()
+    assert 'rag_ingest_documents_total{status="active"}' in text
+    assert 'rag_test_entries{cache="answer"} 1.0' in text
+    assert 'rag_test_entries{cache="query"} 3.0' in text
+
+def test_a_failing_callback_is_skipped():
+    def broken():
+        raise RuntimeError("store unavailable")
+
+    CallbackMetric("rag_test_broken", "A metric whose source is down", "gauge", broken)
+    assert "rag_test_broken" not in render().decode()
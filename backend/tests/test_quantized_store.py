@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services.quantized_store import QuantizedVectorStore, quantize
+
+DIMENSION = 64
+
+def corpus(count: int = 500, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def exact(vectors: np.ndarray, query: np.ndarray, k: int) -> list:
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return [f"c{i}" for i in np.argsort(distances, kind="stable")[:k]]
+
+def open_collection(tmp_path, dtype: str, rescore: bool, vectors: np.ndarray):
+    collection = QuantizedVectorStore(str(tmp_path), dtype, rescore, 4).open("session")
+    collection.add(
+        ids=[f"c{i}" for i in range(len(vectors))],
+        embeddings=vectors.tolist(),
+        documents=[f"text {i}" for i in range(len(vectors))],
+        metadatas=[{"doc_id": "even" if i % 2 == 0 else "odd", "page": i} for i in range(len(vectors))],
+    )
+    return collection
+
+def test_int8_quantization_round_trips_closely():
+    vectors = corpus(10)
+    codes, scales = quantize(vectors, "int8")
+    assert codes.dtype == np.int8
+    assert np.abs(codes * scales[:, None] - vectors).max() < 0.01
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_rescored_results_match_exact_float32_search(tmp_path, dtype):
+    vectors = corpus()
+    collection = open_collection(tmp_path, dtype, True, vectors)
+    for query in corpus(20, seed=1):
+        result = collection.query(query_embeddings=[query.tolist()], n_results=10)
+        assert result["ids"][0] == exact(vectors, query, 10)
+        expected = ((vectors[[int(i[1:]) for i in result["ids"][0]]] - query) ** 2).sum(axis=1)
+        assert np.allclose(result["distances"][0], expected, atol=1e-5)
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantized_results_recall_exact_search(tmp_path, dtype):
+    vectors = corpus()
+    collection = open_collection(tmp_path, dtype, False, vectors)
+    recalls = []
+    for query in corpus(20, seed=1):
+        found = collection.query(query_embeddings=[query.tolist()], n_results=10)["ids"][0]
+        recalls.append(len(set(found) & set(exact(vectors, query, 10))) / 10)
+    assert np.mean(recalls) >= 0.9
+
+def test_query_filters_by_document_and_returns_records(tmp_path):
+    vectors = corpus()
+    collection = open_collection(tmp_path, "int8", True, vectors)
+    result = collection.query(query_embeddings=[vectors[3].tolist()], n_results=5,
+                              where={"doc_id": {"$in": ["odd"]}}, include=["documents", "metadatas", "distances"])
+    assert result["ids"][0][0] == "c3"
+    assert result["documents"][0][0] == "text 3"
+    assert all(metadata["doc_id"] == "odd" for metadata in result["metadatas"][0])
+
+def test_get_and_delete_by_document(tmp_path):
+    vectors = corpus(10)
+    collection = open_collection(tmp_path, "int8", True, vectors)
+    even = collection.get(where={"doc_id": "even"}, include=[])["ids"]
+    assert even == ["c0", "c2", "c4", "c6", "c8"]
+    collection.delete(ids=even)
+    assert collection.count() == 5
+    assert "c0" not in collection.query(query_embeddings=[vectors[0].tolist()], n_results=3)["ids"][0]
+
+def test_get_pages_and_returns_stored_embeddings(tmp_path):
+    vectors = corpus(10)
+    collection = open_collection(tmp_path, "float16", True, vectors)
+    page = collection.get(limit=3, offset=2, include=["documents", "metadatas", "embeddings"])
+    assert page["ids"] == ["c2", "c3", "c4"]
+    assert np.allclose(page["embeddings"], vectors[2:5])
+
+def test_collections_persist_across_reopening(tmp_path):
+    vectors = corpus(50)
+    open_collection(tmp_path, "int8", False, vectors).modify(metadata={"embedding": "fake/model/64"})
+    store = QuantizedVectorStore(str(tmp_path), "float16", True, 4)
+    reopened = store.open("session")
+    assert reopened.dtype == "int8" and not reopened.rescore  # Fixed at creation
+    assert reopened.metadata == {"embedding": "fake/model/64"}
+    assert reopened.query(query_embeddings=[vectors[7].tolist()], n_results=1)["ids"][0] == ["c7"]
+    assert store.names() == ["session"]
+    assert store.delete("session") and not store.exists("session")
+
+INT8_ROW_BYTES = 8 + DIMENSION  # Norm and scale, then one byte per dimension
+
+def vector_files(tmp_path) -> dict:
+    directory = tmp_path / "session"
+    return {name: os.path.getsize(directory / name) for name in os.listdir(directory)
+            if name.startswith(("vectors", "full"))}
+
+@pytest.mark.parametrize("rescore", [False, True])
+def test_deletes_past_the_ratio_compact_the_files(tmp_path, rescore):
+    vectors = corpus(100)
+    collection = open_collection(tmp_path, "int8", rescore, vectors)
+    collection.delete(ids=[f"c{i}" for i in range(20)])
+    expected = {"vectors.bin": 100 * INT8_ROW_BYTES}
+    if rescore:
+        expected["full.bin"] = 100 * 4 * DIMENSION
+    assert vector_files(tmp_path) == expected
+    collection.delete(ids=[f"c{i}" for i in range(20, 40)])  # 40% deleted passes the default 25%
+    expected = {"vectors.1.bin": 60 * INT8_ROW_BYTES}
+    if rescore:
+        expected["full.1.bin"] = 60 * 4 * DIMENSION
+    assert vector_files(tmp_path) == expected
+
+    for i in (40, 77, 99):
+        assert collection.query(query_embeddings=[vectors[i].tolist()], n_results=1)["ids"][0] == [f"c{i}"]
+    page = collection.get(ids=["c41"], include=["embeddings"])
+    assert np.allclose(page["embeddings"][0], vectors[41], atol=0.01)
+
+    collection.add(ids=["new"], embeddings=[vectors[0].tolist()], documents=["new text"])
+    assert collection.query(query_embeddings=[vectors[0].tolist()], n_results=1)["ids"][0] == ["new"]
+    (tmp_path / "session" / "vectors.2.bin").write_bytes(b"left by an interrupted compaction")
+    reopened = QuantizedVectorStore(str(tmp_path), "int8", rescore, 4).open("session")
+    assert reopened.count() == 61
+    assert "vectors.2.bin" not in vector_files(tmp_path)
+    assert reopened.query(query_embeddings=[vectors[77].tolist()], n_results=1)["ids"][0] == ["c77"]
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from app.services.lexical_index import LexicalIndexStore
+from app.services.retrieval import (
+    HybridRetriever, doc_filter, doc_id_of, extract_keywords, reciprocal_rank_fusion
+)
+from config import Config
+
+def test_rrf_favours_items_found_by_both_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]])
+    assert fused[0] == "c"
+    assert set(fused) == {"a", "b", "c", "d"}
+
+def test_rrf_keeps_a_single_ranking_in_order():
+    assert reciprocal_rank_fusion([["x", "y", "z"]]) == ["x", "y", "z"]
+
+def test_rrf_breaks_equal_ranks_by_rank_position():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "a"], ["a"]])
+    assert fused == ["a", "b"]
+
+def test_keywords_skip_stop_words_and_short_words():
+    assert extract_keywords("What does the encoder do with tokens") == ["encoder", "tokens"]
+
+def test_chunk_ids_map_to_documents():
+    assert doc_id_of("9c0cdad9-f8a9_12") == "9c0cdad9-f8a9"
+    assert doc_filter(None) is None
+    assert doc_filter(["a", "b"]) == {"doc_id": {"$in": ["a", "b"]}}
+
+class FakeCollection:
+    """Chroma collection stand-in whose semantic query returns a fixed ranking"""
+
+    name = "session"
+
+    def __init__(self, chunks, nearest):
+        self.chunks = chunks
+        self.nearest = nearest
+
+    def query(self, query_embeddings, n_results, where, include):
+        ids = self.nearest[:n_results]
+        return {
+            "ids": [ids],
+            "documents": [[self.chunks[chunk_id][0] for chunk_id in ids]],
+            "metadatas": [[{} for _ in ids]],
+            "distances": [[0.0 for _ in ids]],
+        }
+
+    def get(self, ids=None, include=None):
+        ids = [chunk_id for chunk_id in (ids or sorted(self.chunks)) if chunk_id in self.chunks]
+        return {
+            "ids": ids,
+            "documents": [self.chunks[chunk_id][0] for chunk_id in ids],
+            "metadatas": [{} for _ in ids],
+            "embeddings": np.array([self.chunks[chunk_id][1] for chunk_id in ids]) if ids else np.empty((0, 2)),
+        }
+
+@pytest.fixture
+def retriever(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "RETRIEVAL_MODE", "fused")
+    monkeypatch.setattr(Config, "RETRIEVAL_TOP_K", 4)
+    return HybridRetriever(lambda texts: [[1.0, 0.0] for _ in texts], LexicalIndexStore(str(tmp_path), cache_size=4))
+
+def test_keyword_hits_missing_from_the_collection_are_skipped(retriever):
+    collection = FakeCollection(
+        {"d_0": ("cooking recipes", [1.0, 0.0]), "d_1": ("encoder tokens", [0.0, 1.0])}, nearest=["d_0"]
+    )
+    retriever.lexical_store.add_documents("session", ["gone_0", "d_1"], ["encoder encoder", "encoder tokens"])
+    retrieved = retriever.retrieve(collection, "what does the encoder do")
+    assert retrieved.ids == ["d_0", "d_1"]
+    assert retrieved.keyword_matches == [False, True]
+    assert retrieved.distances[1] == pytest.approx(2.0)
+
+def test_only_stale_keyword_hits_leave_the_vector_results(retriever):
+    collection = FakeCollection({"d_0": ("cooking recipes", [1.0, 0.0])}, nearest=["d_0"])
+    retriever.lexical_store.add_documents("session", ["gone_0"], ["encoder layers"])
+    retrieved = retriever.retrieve(collection, "what does the encoder do")
+    assert retrieved.ids == ["d_0"]
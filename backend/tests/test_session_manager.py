@@ -0,0 +1,117 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from app.schemas.schemas import DocumentInfo
+from app.services.document_registry import DocumentRegistry
+from app.services.session_manager import InvalidTransition, SessionManager
+from app.services.session_store import SessionStore
+
+@pytest.fixture
+def manager(tmp_path) -> SessionManager:
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    return SessionManager(store, DocumentRegistry(store, dedup_enabled=True))
+
+def test_new_upload_needs_ingestion(manager):
+    collection, needs_ingestion = manager.create("s1", "a.pdf", "hash-a")
+    assert (collection, needs_ingestion) == ("s1", True)
+    session = manager.get("s1")
+    assert session.status == "processing"
+    assert list(session.documents) == ["s1"]
+
+def test_identical_upload_reuses_the_index_and_its_progress(manager):
+    manager.create("s1", "a.pdf", "hash-a")
+    manager.update_document_sessions("s1", "s1", chunk_count=5, chunks_indexed=5, status="active")
+    collection, needs_ingestion = manager.create("s2", "a.pdf", "hash-a")
+    assert (collection, needs_ingestion) == ("s1", False)
+    session = manager.get("s2")
+    assert session.status == "active" and session.chunks_indexed == 5
+
+def test_progress_updates_reach_every_sharing_session(manager):
+    manager.create("s1", "a.pdf", "hash-a")
+    manager.create("s2", "a.pdf", "hash-a")
+    assert manager.update_document_sessions("s1", "s1", pages_parsed=3, chunk_count=7)
+    assert manager.get("s1").chunk_count == manager.get("s2").chunk_count == 7
+
+def test_document_status_follows_the_state_machine(manager):
+    manager.create("s1", "a.pdf", "hash-a")
+    assert manager.update_document("s1", "s1", status="active")
+    assert manager.update_document("s1", "s1", status="removing")
+    assert manager.get("s1").status == "active"  # A document being removed still answers
+    assert manager.update_document("s1", "s1", status="active")
+    with pytest.raises(InvalidTransition):
+        manager.update_document("s1", "s1", status="processing")
+    assert not manager.update_document("s1", "missing", status="active")
+
+def test_session_status_and_totals_follow_its_documents(manager):
+    manager.create("s1", "a.pdf", "hash-a")
+    manager.update_document("s1", "s1", status="active", chunk_count=4)
+    assert manager.add_document("s1", DocumentInfo(doc_id="d2", filename="b.pdf", status="processing"), "s1")
+    assert manager.get("s1").status == "processing"
+    manager.update_document("s1", "d2", status="failed", chunk_count=3, error="bad pdf")
+    session = manager.get("s1")
+    assert session.status == "active" and session.chunk_count == 7 and session.error == "bad pdf"
+    manager.drop_document("s1", "s1")
+    assert manager.get("s1").status == "failed"
+
+def test_remove_reports_indexes_left_without_references(manager):
+    manager.create("s1", "a.pdf", "hash-a")
+    manager.create("s2", "a.pdf", "hash-a")
+    assert manager.remove(["s1"]) == (["s1"], [])
+    assert manager.remove(["s2", "missing"]) == (["s2"], ["s1"])
+    assert manager.get("s2") is None and manager.count() == 0
+
+def test_move_releases_the_old_index(manager):
+    manager.create("s1", "a.pdf", "hash-a")
+    manager.create("s2", "a.pdf", "hash-a")
+    manager.registry.create("fork", "s2")
+    assert manager.move("s2", "s1", "fork") is False
+    assert manager.get("s2").collection_name == "fork"
+    assert manager.move("gone", "s1", "fork2") is None
+
+def test_reads_do_not_wait_for_concurrent_writers_and_deleters(manager):
+    manager.create("reader", "a.pdf", None)
+    stop = threading.Event()
+    created = []
+    counter = itertools.count()
+
+    def write():
+        while not stop.is_set():
+            session_id = f"w{next(counter)}"
+            manager.create(session_id, "b.pdf", None)
+            manager.update_document(session_id, session_id, status="active", chunk_count=3)
+            created.append(session_id)
+
+    def delete():
+        while not stop.is_set():
+            if created:
+                manager.remove([created.pop(0)])
+            else:
+                time.sleep(0.001)
+
+    def hold_write_lock():
+        # A slow writer: reads must be served from the last committed snapshot meanwhile
+        while not stop.is_set():
+            with manager.store.transaction():
+                time.sleep(0.5)
+
+    threads = [threading.Thread(target=target) for target in (write, write, delete, delete, hold_write_lock)]
+    for thread in threads:
+        thread.start()
+    latencies = []
+    try:
+        deadline = time.perf_counter() + 1.5
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            assert manager.get("reader") is not None
+            manager.list(20)
+            manager.count()
+            latencies.append(time.perf_counter() - started)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert len(latencies) > 10
+    assert max(latencies) < 0.25
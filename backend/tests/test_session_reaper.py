@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import main
+from app.services.document_registry import DocumentRegistry
+from app.services.session_manager import SessionManager
+from app.services.session_reaper import SessionReaper
+from app.services.session_store import SessionStore
+from config import Config
+
+class Clock:
+    def __init__(self):
+        self.now = 10_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def manager(tmp_path) -> SessionManager:
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    return SessionManager(store, DocumentRegistry(store, dedup_enabled=False))
+
+def add_session(manager: SessionManager, session_id: str, created_at: float, last_access: float = None) -> None:
+    manager.create(session_id, "a.pdf", None)
+    with manager.store.transaction() as tx:
+        tx.execute(
+            "UPDATE sessions SET created_at = ?, last_access = ? WHERE session_id = ?",
+            (created_at, last_access if last_access is not None else created_at, session_id)
+        )
+
+def reaper_for(manager: SessionManager, clock: Clock, removed: list, **settings) -> SessionReaper:
+    def remove_sessions(session_ids):
+        gone, orphans = manager.remove(session_ids)
+        removed.extend(gone)
+        return gone, len(orphans)
+
+    options = {"ttl": 1000, "idle_ttl": 0, "max_sessions": 100, "interval": 3600, "batch_size": 2}
+    options.update(settings)
+    return SessionReaper(manager.store, remove_sessions, clock=clock, **options)
+
+def test_expired_sessions_go_oldest_first_in_batches(manager):
+    clock, removed = Clock(), []
+    for i, age in enumerate([1500, 1100, 900, 1300, 2000]):
+        add_session(manager, f"s{i}", clock.now - age)
+    reaper = reaper_for(manager, clock, removed)
+    assert reaper.reap() == {"expired": 4, "idle": 0, "evicted": 0}
+    assert removed == ["s4", "s0", "s3", "s1"]
+    assert manager.count() == 1 and manager.get("s2") is not None
+
+    clock.now += 200
+    assert reaper.reap()["expired"] == 1
+    assert reaper.stats()["expired"] == 5 and reaper.stats()["runs"] == 2
+
+def test_idle_sessions_expire_by_last_access(manager):
+    clock, removed = Clock(), []
+    add_session(manager, "idle", clock.now - 100, last_access=clock.now - 60)
+    add_session(manager, "active", clock.now - 100, last_access=clock.now - 10)
+    reaper = reaper_for(manager, clock, removed, idle_ttl=30)
+    assert reaper.reap() == {"expired": 0, "idle": 1, "evicted": 0}
+    assert removed == ["idle"]
+
+def test_eviction_removes_least_recently_used_down_to_the_cap(manager):
+    clock, removed = Clock(), []
+    for i, last_access in enumerate([50, 10, 40, 20, 30]):
+        add_session(manager, f"s{i}", clock.now - 100, last_access=clock.now - last_access)
+    reaper = reaper_for(manager, clock, removed, max_sessions=2)
+    assert reaper.reap() == {"expired": 0, "idle": 0, "evicted": 3}
+    assert removed == ["s0", "s2", "s4"]
+    assert sorted(session.session_id for session in manager.list(10)) == ["s1", "s3"]
+
+def test_wake_runs_a_pass_without_waiting_for_the_interval(manager):
+    clock, removed = Clock(), []
+    reaper = reaper_for(manager, clock, removed, max_sessions=1, interval=3600)
+
+    async def scenario():
+        task = asyncio.create_task(reaper.run())
+        while reaper._loop is None:
+            await asyncio.sleep(0.01)
+        add_session(manager, "s0", clock.now - 20)
+        add_session(manager, "s1", clock.now - 10)
+        # Uploads wake the reaper from worker threads as well as the loop
+        threading.Thread(target=reaper.wake).start()
+        deadline = time.monotonic() + 5
+        while reaper.stats()["runs"] == 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert reaper.stats()["runs"] == 1
+    assert removed == ["s0"]
+
+def test_an_upload_into_a_full_store_wakes_the_reaper(client, upload, pdf_file, monkeypatch):
+    monkeypatch.setattr(Config, "MAX_SESSIONS", main.session_manager.count())
+    monkeypatch.setattr(main.session_reaper, "max_sessions", 1_000_000)
+    runs = main.session_reaper.stats()["runs"]
+    upload(pdf_file)
+    deadline = time.monotonic() + 5
+    while main.session_reaper.stats()["runs"] == runs and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert main.session_reaper.stats()["runs"] == runs + 1
@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import main
+from config import Config
+
+BOUNDARY = "test-boundary"
+
+def multipart(filename: str, content: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+class StreamedRequest:
+    """A request whose body arrives in the given chunks, recording how many were read"""
+
+    def __init__(self, chunks, content_length: int = None):
+        self.chunks = list(chunks)
+        self.received = 0
+        headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        self.request = Request({"type": "http", "method": "POST", "path": "/upload", "headers": headers}, self.receive)
+
+    async def receive(self) -> dict:
+        if self.received == len(self.chunks):
+            return {"type": "http.request", "body": b"", "more_body": False}
+        self.received += 1
+        return {"type": "http.request", "body": self.chunks[self.received - 1], "more_body": True}
+
+def split(body: bytes, size: int) -> list:
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch) -> str:
+    monkeypatch.setattr(Config, "PDF_UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "MAX_FILE_SIZE", 1)
+    return str(tmp_path / "spool")
+
+def test_an_upload_is_spooled_and_hashed_in_one_pass(spool_dir):
+    content = os.urandom(300 * 1024)
+    streamed = StreamedRequest(split(multipart("doc.pdf", content), 64 * 1024))
+    upload = asyncio.run(main.spool_upload(streamed.request))
+    assert (upload.filename, upload.size) == ("doc.pdf", len(content))
+    assert upload.content_hash == hashlib.sha256(content).hexdigest()
+    with open(upload.path, "rb") as spooled:
+        assert spooled.read() == content
+
+def test_an_oversized_stream_is_cut_off_at_the_limit_and_its_spool_file_removed(spool_dir):
+    # No declared length: the limit can only be enforced while reading
+    chunks = split(multipart("doc.pdf", b"x" * (4 * 1024 * 1024)), 256 * 1024)
+    streamed = StreamedRequest(chunks)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.spool_upload(streamed.request))
+    assert error.value.status_code == 413
+    assert streamed.received < len(chunks) / 2
+    assert os.listdir(spool_dir) == []
+
+def test_a_declared_oversized_length_is_rejected_before_reading(spool_dir):
+    body = multipart("doc.pdf", b"x" * (2 * 1024 * 1024))
+    streamed = StreamedRequest(split(body, 256 * 1024), content_length=len(body))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.spool_upload(streamed.request))
+    assert error.value.status_code == 413
+    assert streamed.received == 0
+    assert not os.path.exists(spool_dir) or os.listdir(spool_dir) == []
+
+def test_a_rejected_file_type_leaves_no_spool_file(spool_dir):
+    streamed = StreamedRequest([multipart("notes.txt", b"plain text")])
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.spool_upload(streamed.request))
+    assert error.value.status_code == 400
+    assert os.listdir(spool_dir) == []
+
+def test_the_upload_endpoint_answers_413_for_an_oversized_file(client, spool_dir):
+    response = client.post(
+        "/upload", content=multipart("doc.pdf", b"x" * (2 * 1024 * 1024)),
+        headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    )
+    assert response.status_code == 413
+    assert "exceeds maximum allowed size" in response.json()["detail"]
+    assert not os.path.exists(spool_dir) or os.listdir(spool_dir) == []
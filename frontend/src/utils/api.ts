@@ -26,6 +26,22 @@ interface SessionInfo {
   status: string;
 }
 
+interface IngestionStatus {
+  session_id: string;
+  status: string;
+  pages_total: number;
+  pages_parsed: number;
+  chunk_count: number;
+  chunks_embedded: number;
+  chunks_indexed: number;
+  error: string | null;
+  elapsed: number;
+}
+
+// Status polls back off from the first interval to the last while a document is processing
+const STATUS_POLL_INITIAL_MS = 500;
+const STATUS_POLL_MAX_MS = 5000;
+
 // Type for the streaming data callbacks
 interface StreamCallbacks {
   onToken: (token: string) => void;
@@ -49,13 +65,36 @@ export const uploadDocument = async (file: File): Promise<UploadResponse> => {
       const errorData = await response.json();
       throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
     }
-    return response.json();
+    const upload: UploadResponse = await response.json();
+
+    // Ingestion runs in the background; wait until the document is indexed
+    let ingestion = await getSessionStatus(upload.session_id);
+    let pollInterval = STATUS_POLL_INITIAL_MS;
+    while (ingestion.status === 'processing') {
+      await new Promise(resolve => setTimeout(resolve, pollInterval));
+      pollInterval = Math.min(pollInterval * 2, STATUS_POLL_MAX_MS);
+      ingestion = await getSessionStatus(upload.session_id);
+    }
+    if (ingestion.status === 'failed') {
+      throw new Error(ingestion.error || 'Document processing failed');
+    }
+    return {
+      ...upload,
+      status: ingestion.status,
+      chunk_count: ingestion.chunk_count,
+      processing_time: ingestion.elapsed,
+    };
   } catch (error) {
      console.error('Upload error:', error);
      throw error;
   }
 };
 
+export const getSessionStatus = async (sessionId: string): Promise<IngestionStatus> => {
+  const response = await apiClient.get(`/sessions/${sessionId}/status`);
+  return response.data;
+};
+
 export const sendChatMessage = async (
   question: string,
   sessionId: string,
@@ -134,22 +173,12 @@ export const deleteSession = async (sessionId: string): Promise<void> => {
   await apiClient.delete(`/sessions/${sessionId}`);
 };
 
-export const checkHealth = async () => {
-  try {
-    const response = await apiClient.get('/health');
-    return response.data;
-  } catch (error) {
-    console.error('Health check failed:', error);
-    return { status: 'unhealthy' };
-  }
-};
-
 const api = {
   uploadDocument,
   sendChatMessage,
+  getSessionStatus,
   getSessions,
   deleteSession,
-  checkHealth,
 };
 
 export default api; 
\ No newline at end of file